@@ -0,0 +1,302 @@
+import hashlib
+import itertools
+import logging
+import tempfile
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.conf import settings
+from django.core.files.base import File
+from django.db.models import F, Count, Max
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.common.models import DataExportPartition
+from apps.order.models import Order, BookOrder, OrderWindow
+from apps.package.models import SchoolPackage, InstitutionPackage, PublisherPackage, CourierPackage
+from apps.payment.models import Payment
+
+logger = logging.getLogger(__name__)
+
+
+def get_geography_annotations(user_prefix):
+    """
+    Location of the school/institution user (eg: user_prefix=created_by__)
+    """
+    return {
+        f'{location}{suffix}': Coalesce(
+            f'{user_prefix}school__{location}{lookup}',
+            f'{user_prefix}institution__{location}{lookup}',
+        )
+        for location in ['province', 'district', 'municipality']
+        for suffix, lookup in [('_id', ''), ('_name', '__name')]
+    }
+
+
+def get_municipality_geography_annotations(municipality_field):
+    return {
+        'province_id': F(f'{municipality_field}__province'),
+        'province_name': F(f'{municipality_field}__province__name'),
+        'district_id': F(f'{municipality_field}__district'),
+        'district_name': F(f'{municipality_field}__district__name'),
+        'municipality_id': F(municipality_field),
+        'municipality_name': F(f'{municipality_field}__name'),
+    }
+
+
+# Parquet column type by the django field type (Others are exported as string)
+ARROW_TYPE_BY_FIELD_TYPE = {
+    'AutoField': pa.int64(),
+    'BigAutoField': pa.int64(),
+    'SmallIntegerField': pa.int64(),
+    'IntegerField': pa.int64(),
+    'BigIntegerField': pa.int64(),
+    'PositiveSmallIntegerField': pa.int64(),
+    'PositiveIntegerField': pa.int64(),
+    'PositiveBigIntegerField': pa.int64(),
+    'FloatField': pa.float64(),
+    'BooleanField': pa.bool_(),
+    'DateField': pa.date32(),
+    'DateTimeField': pa.timestamp('us', tz='UTC'),
+}
+
+
+def get_arrow_type(field):
+    # Foreign keys are exported as the id of the related row
+    while field.is_relation:
+        field = field.target_field
+    return ARROW_TYPE_BY_FIELD_TYPE.get(field.get_internal_type(), pa.string())
+
+
+class DataExportTable():
+    """
+    Table exported as one file per order window (partition)
+    """
+    def __init__(self, name, queryset, order_window_field, fields, annotations, updated_at_fields):
+        self.name = name
+        self.queryset = queryset
+        # Lookup of the order window (None for the tables without order window, exported as a single partition)
+        self.order_window_field = order_window_field
+        self.fields = fields
+        self.annotations = annotations
+        # Auto updated timestamps of the table (and of the related tables which values are exported)
+        self.updated_at_fields = updated_at_fields
+
+    @property
+    def headers(self):
+        return [*self.fields, *self.annotations.keys()]
+
+    def get_partition_qs(self, order_window_id):
+        if self.order_window_field:
+            # NOTE: Orders without order window are exported as order_window=none partition
+            return self.queryset.filter(**{self.order_window_field: order_window_id})
+        return self.queryset
+
+    def get_watermark(self, order_window_id):
+        """
+        Cheap aggregate of the partition (No export joins/annotations), changes on row add/remove/update
+        NOTE: Changes of the other related tables (eg: names, location) are only exported with force
+        """
+        data = self.get_partition_qs(order_window_id).order_by().aggregate(
+            count=Count('id'),
+            max_id=Max('id'),
+            **{
+                f'max_{field}': Max(field)
+                for field in self.updated_at_fields
+            },
+        )
+        return '-'.join(
+            str(data[key] or 0)
+            for key in ['count', 'max_id', *(f'max_{field}' for field in self.updated_at_fields)]
+        )
+
+    def get_arrow_schema(self):
+        query = self.queryset.annotate(**self.annotations).query
+        return pa.schema([
+            pa.field(header, get_arrow_type(query.resolve_ref(header).output_field))
+            for header in self.headers
+        ])
+
+    def get_rows(self, order_window_id):
+        return self.get_partition_qs(order_window_id).annotate(
+            **self.annotations
+        ).order_by('id').values_list(*self.headers)
+
+
+DATA_EXPORT_TABLES = [
+    DataExportTable(
+        'orders',
+        Order.objects.all(),
+        'assigned_order_window',
+        [
+            'id', 'order_code', 'status', 'created_at', 'created_by', 'created_by__user_type',
+            'total_price', 'total_quantity', 'distinct_book_count',
+        ],
+        get_geography_annotations('created_by__'),
+        ['updated_at'],
+    ),
+    DataExportTable(
+        'book_orders',
+        BookOrder.objects.all(),
+        'order__assigned_order_window',
+        [
+            'id', 'order', 'order__status', 'book', 'title', 'isbn', 'edition', 'publisher', 'publisher__name',
+            'grade', 'language', 'price', 'quantity', 'total_price',
+        ],
+        get_geography_annotations('order__created_by__'),
+        # Order status is exported with the book orders
+        ['updated_at', 'order__updated_at'],
+    ),
+    DataExportTable(
+        'publisher_packages',
+        PublisherPackage.objects.all(),
+        'order_window',
+        [
+            'id', 'package_id', 'status', 'publisher', 'publisher__name', 'total_price', 'total_quantity',
+            'incentive', 'incentive_quantity', 'incentive_price',
+        ],
+        {},
+        ['updated_at'],
+    ),
+    DataExportTable(
+        'courier_packages',
+        CourierPackage.objects.all(),
+        'order_window',
+        [
+            'id', 'package_id', 'status', 'type', 'total_price', 'total_quantity', 'is_eligible_for_incentive',
+        ],
+        get_municipality_geography_annotations('municipality'),
+        ['updated_at'],
+    ),
+    DataExportTable(
+        'school_packages',
+        SchoolPackage.objects.all(),
+        'order_window',
+        [
+            'id', 'package_id', 'status', 'school', 'courier_package', 'total_price', 'total_quantity',
+            'is_eligible_for_incentive', 'incentive_quantity', 'incentive_price',
+        ],
+        get_geography_annotations('school__'),
+        ['updated_at'],
+    ),
+    DataExportTable(
+        'institution_packages',
+        InstitutionPackage.objects.all(),
+        'order_window',
+        [
+            'id', 'package_id', 'status', 'institution', 'courier_package', 'total_price', 'total_quantity',
+        ],
+        get_geography_annotations('institution__'),
+        ['updated_at'],
+    ),
+    DataExportTable(
+        'payments',
+        Payment.objects.all(),
+        None,
+        [
+            'id', 'transaction_type', 'payment_type', 'status', 'amount', 'created_at', 'paid_by',
+            'paid_by__user_type',
+        ],
+        get_geography_annotations('paid_by__'),
+        # NOTE: Payment.created_at is auto updated
+        ['created_at'],
+    ),
+]
+
+
+class DataExport():
+    """
+    Export tables as parquet files partitioned by order window (<table>/order_window=<id>/<table>.parquet)
+    Rows are streamed using server side cursor and written as a row group per chunk,
+    so memory usage doesn't depend on the row count.
+    Incremental: Partition is only scanned when it's watermark has changed and the file is only written
+    when it's content has changed since the last export.
+    """
+    ITERATOR_CHUNK_SIZE = 2000
+
+    def __init__(self, tables=None, order_window_ids=None, force=False):
+        self.tables = [
+            table
+            for table in DATA_EXPORT_TABLES
+            if tables is None or table.name in tables
+        ]
+        self.order_window_ids = order_window_ids
+        self.force = force
+
+    def get_order_window_ids(self):
+        if self.order_window_ids is not None:
+            return list(self.order_window_ids)
+        # Rows without order window (None) are exported as a separate partition
+        return [*OrderWindow.objects.order_by('id').values_list('id', flat=True), None]
+
+    @staticmethod
+    def get_arrow_table(rows, schema):
+        columns = []
+        for values, field in zip(zip(*rows), schema):
+            if field.type == pa.string():
+                # eg: UUID
+                values = [value if value is None else str(value) for value in values]
+            columns.append(pa.array(values, type=field.type))
+        return pa.Table.from_arrays(columns, schema=schema)
+
+    def write_partition(self, table, order_window_id, export_file):
+        """
+        Write rows to the export_file, returns (checksum, row_count)
+        NOTE: Checksum is of the rows, parquet output is not used as it includes the writer metadata
+        """
+        checksum = hashlib.sha256()
+        row_count = 0
+        schema = table.get_arrow_schema()
+        rows = table.get_rows(order_window_id).iterator(chunk_size=self.ITERATOR_CHUNK_SIZE)
+        with pq.ParquetWriter(export_file, schema) as writer:
+            while True:
+                chunk = list(itertools.islice(rows, self.ITERATOR_CHUNK_SIZE))
+                if not chunk:
+                    break
+                for row in chunk:
+                    checksum.update(repr(row).encode())
+                writer.write_table(self.get_arrow_table(chunk, schema), row_group_size=len(chunk))
+                row_count += len(chunk)
+        return checksum.hexdigest(), row_count
+
+    def export_partition(self, table, order_window_id):
+        """
+        Returns True if the partition file was written
+        """
+        partition, _ = DataExportPartition.objects.get_or_create(
+            table=table.name,
+            order_window_id=order_window_id,
+        )
+        watermark = table.get_watermark(order_window_id)
+        if not self.force and partition.file and partition.watermark == watermark:
+            return False
+        with tempfile.TemporaryFile(dir=settings.TEMP_DIR) as export_file:
+            checksum, row_count = self.write_partition(table, order_window_id, export_file)
+            if not self.force and partition.file and partition.checksum == checksum:
+                partition.watermark = watermark
+                partition.save(update_fields=('watermark',))
+                return False
+            export_file.seek(0)
+            # Keep same path for the partition
+            partition.file.delete(save=False)
+            partition.file.save(f'{table.name}.parquet', File(export_file), save=False)
+        partition.checksum = checksum
+        partition.watermark = watermark
+        partition.row_count = row_count
+        partition.exported_at = timezone.now()
+        partition.save(update_fields=('file', 'checksum', 'watermark', 'row_count', 'exported_at'))
+        return True
+
+    def run(self):
+        """
+        Returns number of written partitions by table name
+        """
+        order_window_ids = self.get_order_window_ids()
+        written_partitions_by_table = {}
+        for table in self.tables:
+            written_partitions_by_table[table.name] = 0
+            for order_window_id in (order_window_ids if table.order_window_field else [None]):
+                if self.export_partition(table, order_window_id):
+                    written_partitions_by_table[table.name] += 1
+            logger.info(f'Data export: {table.name}: {written_partitions_by_table[table.name]} partitions written')
+        return written_partitions_by_table
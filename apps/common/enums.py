@@ -0,0 +1,15 @@
+from utils.graphene.enums import (
+    convert_enum_to_graphene_enum,
+    get_enum_name_from_django_field,
+)
+
+from .models import ReportExport
+
+ReportExportStatusEnum = convert_enum_to_graphene_enum(ReportExport.Status, name='ReportExportStatusEnum')
+
+enum_map = {
+    get_enum_name_from_django_field(field): enum
+    for field, enum in (
+        (ReportExport.status, ReportExportStatusEnum),
+    )
+}
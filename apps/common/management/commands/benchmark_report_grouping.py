@@ -0,0 +1,60 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from apps.common.reports import group_books_per_publisher_per_category
+
+
+def group_books_per_publisher_per_category_by_name(rows):
+    """
+    Previous implementation (Nested loop over publisher names x rows), used as baseline
+    """
+    publishers = []
+    for item in rows:
+        publishers.append(item['publisher__name'])
+    result = []
+    for publisher in list(set(publishers)):
+        result.append({'publisher_name': publisher, 'categories': []})
+    for publisher in result:
+        for row in rows:
+            if publisher['publisher_name'] == row['publisher__name']:
+                publisher['publisher_id'] = row['publisher_id']
+                publisher['categories'].append({
+                    'number_of_books': row['number_of_books'],
+                    'category': row['categories__name'],
+                    'category_id': row['categories__id'],
+                })
+    return result
+
+
+class Command(BaseCommand):
+    help = 'Benchmark grouping used by the books per publisher per category report (No database access)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--publishers', type=int, default=200, help='Number of publishers')
+        parser.add_argument('--categories', type=int, default=50, help='Number of categories per publisher')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of runs (Best is reported)')
+
+    def get_rows(self, publisher_count, category_count):
+        # Same shape/order as get_books_per_publisher_per_category query rows
+        return [
+            {
+                'publisher_id': publisher_id,
+                'publisher__name': f'Publisher {publisher_id}',
+                'categories__id': category_id,
+                'categories__name': f'Category {category_id}',
+                'number_of_books': (publisher_id * category_id) % 17 + 1,
+            }
+            for publisher_id in range(1, publisher_count + 1)
+            for category_id in range(1, category_count + 1)
+        ]
+
+    def handle(self, *args, **options):
+        rows = self.get_rows(options['publishers'], options['categories'])
+        self.stdout.write(f"Rows: {len(rows)} ({options['publishers']} publishers x {options['categories']} categories)")
+        for label, func in [
+            ('Nested loop (by name)', group_books_per_publisher_per_category_by_name),
+            ('Single pass (by id)', group_books_per_publisher_per_category),
+        ]:
+            best = min(timeit.repeat(lambda: func(rows), number=1, repeat=max(options['repeat'], 1)))
+            self.stdout.write(self.style.SUCCESS(f'{label}: {best * 1000:.2f} ms'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from apps.common.data_export import DataExport, DATA_EXPORT_TABLES
+
+
+class Command(BaseCommand):
+    help = 'Export order, package and payment tables as files partitioned by order window (Only changed partitions)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tables', nargs='+', choices=[table.name for table in DATA_EXPORT_TABLES],
+            help='Tables to export (Default: all)',
+        )
+        parser.add_argument('--order-windows', nargs='+', type=int, help='Order window ids to export (Default: all)')
+        parser.add_argument('--force', action='store_true', help='Write partitions even if they are unchanged')
+
+    def handle(self, *_, **options):
+        written_partitions_by_table = DataExport(
+            tables=options['tables'],
+            order_window_ids=options['order_windows'],
+            force=options['force'],
+        ).run()
+        for table, written_partitions in written_partitions_by_table.items():
+            self.stdout.write(f'{table}: {written_partitions} partitions written')
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.16 on 2026-10-19 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0004_auto_20220302_1008'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(choices=[('users_per_district', 'Users per district'), ('books_ordered_and_incentives_per_district', 'Books ordered and incentives per district'), ('deliveries_per_district', 'Deliveries per district'), ('payment_per_order_window', 'Payment per order window'), ('books_per_publisher', 'Books per publisher'), ('books_per_category', 'Books per category'), ('books_per_grade', 'Books per grade'), ('books_per_language', 'Books per language'), ('books_per_publisher_per_category', 'Books per publisher per category'), ('book_grades_per_order_window', 'Book grades per order window')], max_length=100, unique=True, verbose_name='Key')),
+                ('data', models.JSONField(default=list, verbose_name='Data')),
+                ('refreshed_at', models.DateTimeField(verbose_name='Refreshed at')),
+            ],
+            options={
+                'verbose_name': 'Report snapshot',
+                'verbose_name_plural': 'Report snapshots',
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.16 on 2026-10-19 15:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('order', '0014_bookorderfact'),
+        ('common', '0005_reportsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportExport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('started', 'Started'), ('success', 'Success'), ('failed', 'Failed')], default='pending', max_length=40, verbose_name='Status')),
+                ('file', models.FileField(blank=True, default=None, max_length=255, null=True, upload_to='report/exports/', verbose_name='File')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Started at')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Finished at')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Created by')),
+                ('order_window', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='order.orderwindow', verbose_name='Order window')),
+            ],
+            options={
+                'verbose_name': 'Report export',
+                'verbose_name_plural': 'Report exports',
+            },
+        ),
+    ]
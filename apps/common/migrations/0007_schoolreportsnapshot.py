@@ -0,0 +1,29 @@
+# Generated by Django 3.2.16 on 2026-10-19 16:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('common', '0006_reportexport'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchoolReportSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.JSONField(default=dict, verbose_name='Data')),
+                ('refreshed_at', models.DateTimeField(verbose_name='Refreshed at')),
+                ('school', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='School')),
+            ],
+            options={
+                'verbose_name': 'School report snapshot',
+                'verbose_name_plural': 'School report snapshots',
+            },
+        ),
+    ]
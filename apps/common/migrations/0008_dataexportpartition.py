@@ -0,0 +1,33 @@
+# Generated by Django 3.2.16 on 2026-10-19 17:05
+
+import apps.common.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0014_bookorderfact'),
+        ('common', '0007_schoolreportsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataExportPartition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(max_length=100, verbose_name='Table')),
+                ('file', models.FileField(blank=True, default=None, max_length=255, null=True, upload_to=apps.common.models.data_export_partition_path, verbose_name='File')),
+                ('checksum', models.CharField(blank=True, max_length=64, verbose_name='Checksum')),
+                ('row_count', models.PositiveIntegerField(default=0, verbose_name='Row count')),
+                ('exported_at', models.DateTimeField(blank=True, null=True, verbose_name='Exported at')),
+                ('order_window', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='order.orderwindow', verbose_name='Order window')),
+            ],
+            options={
+                'verbose_name': 'Data export partition',
+                'verbose_name_plural': 'Data export partitions',
+                'unique_together': {('table', 'order_window')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-19 19:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0008_dataexportpartition'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataexportpartition',
+            name='watermark',
+            field=models.CharField(blank=True, max_length=255, verbose_name='Watermark'),
+        ),
+    ]
@@ -105,3 +105,138 @@ class BaseActivityLog(models.Model):
 
     class Meta:
         abstract = True
+
+
+class ReportSnapshot(models.Model):
+    """
+    Precomputed report aggregate (One row per aggregate, see apps.common.reports)
+    """
+    class Key(models.TextChoices):
+        USERS_PER_DISTRICT = 'users_per_district', _('Users per district')
+        BOOKS_ORDERED_AND_INCENTIVES_PER_DISTRICT = (
+            'books_ordered_and_incentives_per_district', _('Books ordered and incentives per district')
+        )
+        DELIVERIES_PER_DISTRICT = 'deliveries_per_district', _('Deliveries per district')
+        PAYMENT_PER_ORDER_WINDOW = 'payment_per_order_window', _('Payment per order window')
+        BOOKS_PER_PUBLISHER = 'books_per_publisher', _('Books per publisher')
+        BOOKS_PER_CATEGORY = 'books_per_category', _('Books per category')
+        BOOKS_PER_GRADE = 'books_per_grade', _('Books per grade')
+        BOOKS_PER_LANGUAGE = 'books_per_language', _('Books per language')
+        BOOKS_PER_PUBLISHER_PER_CATEGORY = 'books_per_publisher_per_category', _('Books per publisher per category')
+        BOOK_GRADES_PER_ORDER_WINDOW = 'book_grades_per_order_window', _('Book grades per order window')
+
+    key = models.CharField(max_length=100, choices=Key.choices, unique=True, verbose_name=_('Key'))
+    data = models.JSONField(default=list, verbose_name=_('Data'))
+    refreshed_at = models.DateTimeField(verbose_name=_('Refreshed at'))
+
+    class Meta:
+        verbose_name = _('Report snapshot')
+        verbose_name_plural = _('Report snapshots')
+
+    def __str__(self):
+        return self.key
+
+
+class SchoolReportSnapshot(models.Model):
+    """
+    Precomputed school report aggregates of a school user (see apps.common.reports.SchoolReportQuerySets)
+    """
+    school = models.OneToOneField(
+        'user.User',
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name=_('School'),
+    )
+    # {<aggregate key>: <aggregate data>}
+    data = models.JSONField(default=dict, verbose_name=_('Data'))
+    refreshed_at = models.DateTimeField(verbose_name=_('Refreshed at'))
+
+    class Meta:
+        verbose_name = _('School report snapshot')
+        verbose_name_plural = _('School report snapshots')
+
+    def __str__(self):
+        return str(self.school_id)
+
+
+class ReportExport(models.Model):
+    """
+    Report (see apps.common.reports) exported as a XLSX file by a celery task
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending', _('Pending')
+        STARTED = 'started', _('Started')
+        SUCCESS = 'success', _('Success')
+        FAILED = 'failed', _('Failed')
+
+    # Export only the order window's slice of the report (Whole report if not provided)
+    order_window = models.ForeignKey(
+        'order.OrderWindow',
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='+',
+        verbose_name=_('Order window'),
+    )
+    status = models.CharField(
+        max_length=40,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name=_('Status'),
+    )
+    file = models.FileField(
+        upload_to='report/exports/', max_length=255, null=True, blank=True, default=None,
+        verbose_name=_('File'),
+    )
+    created_by = models.ForeignKey(
+        'user.User',
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name=_('Created by'),
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Created at'))
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Started at'))
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Finished at'))
+
+    class Meta:
+        verbose_name = _('Report export')
+        verbose_name_plural = _('Report exports')
+
+    def __str__(self):
+        return f'{self.id} - {self.status}'
+
+
+def data_export_partition_path(instance, filename):
+    return f'data-exports/{instance.table}/order_window={instance.order_window_id or "none"}/{filename}'
+
+
+class DataExportPartition(models.Model):
+    """
+    Exported file of a table's order window (see apps.common.data_export)
+    """
+    table = models.CharField(max_length=100, verbose_name=_('Table'))
+    # Null for the tables without order window
+    order_window = models.ForeignKey(
+        'order.OrderWindow',
+        on_delete=models.CASCADE,
+        null=True, blank=True,
+        related_name='+',
+        verbose_name=_('Order window'),
+    )
+    file = models.FileField(
+        upload_to=data_export_partition_path, max_length=255, null=True, blank=True, default=None,
+        verbose_name=_('File'),
+    )
+    # Checksum of the exported rows, used to skip unchanged partitions
+    checksum = models.CharField(max_length=64, blank=True, verbose_name=_('Checksum'))
+    # Row count, max id and max updated_at of the partition when exported, partition is only scanned if it changes
+    watermark = models.CharField(max_length=255, blank=True, verbose_name=_('Watermark'))
+    row_count = models.PositiveIntegerField(default=0, verbose_name=_('Row count'))
+    exported_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Exported at'))
+
+    class Meta:
+        unique_together = ('table', 'order_window')
+        verbose_name = _('Data export partition')
+        verbose_name_plural = _('Data export partitions')
+
+    def __str__(self):
+        return f'{self.table} - {self.order_window_id}'
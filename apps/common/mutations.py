@@ -8,9 +8,9 @@ from utils.graphene.mutation import (
 from config.permissions import UserPermissions
 
 from apps.user.models import User
-from apps.common.models import ActivityLogFile
-from apps.common.schema import ActivityFileType
-from apps.common.serializers import ActivityLogFileSerializer
+from apps.common.models import ActivityLogFile, ReportExport
+from apps.common.schema import ActivityFileType, ReportExportType
+from apps.common.serializers import ActivityLogFileSerializer, ReportExportSerializer
 
 
 ActivityLogFileInputType = generate_input_type_for_serializer(
@@ -44,6 +44,29 @@ class DeleteActivityLogFile(BaseActivityLogFileMutationMixin, DeleteMutation):
     permissions = [UserPermissions.Permission.ACTIVITY_LOG_FILE]
 
 
+ReportExportInputType = generate_input_type_for_serializer(
+    'ReportExportInputType',
+    serializer_class=ReportExportSerializer
+)
+
+
+class RequestReportExport(CreateUpdateGrapheneMutation):
+    class Arguments:
+        data = ReportExportInputType(required=True)
+    model = ReportExport
+    serializer_class = ReportExportSerializer
+    result = graphene.Field(ReportExportType)
+
+    @classmethod
+    def check_permissions(cls, *args, **_):
+        # Only allowed for moderator (See ModeratorMutationType)
+        return True
+
+
+class ModeratorMutation():
+    request_report_export = RequestReportExport.Field()
+
+
 class Mutation(graphene.ObjectType):
     create_activity_log_file = CreateActivityLogFile.Field()
     delete_activity_log_file = DeleteActivityLogFile.Field()
@@ -0,0 +1,536 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Sum, Count, F, Q
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from apps.common.models import District, ReportSnapshot, SchoolReportSnapshot
+from apps.user.models import User
+from apps.book.models import Book
+from apps.order.models import Order, OrderWindow, BookOrderFact
+from apps.package.models import SchoolPackage
+
+
+def group_books_per_publisher_per_category(rows, categories_field='categories'):
+    """
+    Group (publisher, category) rows by publisher id in a single pass
+    rows: [{publisher_id, publisher__name, categories__id, categories__name, number_of_books}]
+    NOTE: Grouped by id, publishers with same name are not merged
+    """
+    publisher_name_by_id = {}
+    categories_by_publisher_id = defaultdict(list)
+    for row in rows:
+        publisher_id = row['publisher_id']
+        publisher_name_by_id[publisher_id] = row['publisher__name']
+        categories_by_publisher_id[publisher_id].append({
+            'number_of_books': row['number_of_books'],
+            'category': row[f'{categories_field}__name'],
+            'category_id': row[f'{categories_field}__id'],
+        })
+    return [
+        {
+            'publisher_id': publisher_id,
+            'publisher_name': publisher_name_by_id[publisher_id],
+            'categories': categories,
+        }
+        for publisher_id, categories in categories_by_publisher_id.items()
+    ]
+
+
+def get_books_per_publisher_per_category(book_qs):
+    books_per_publishers = book_qs.values(
+        'publisher_id',
+        'publisher__name',
+        'categories__id',
+        'categories__name',
+    ).annotate(
+        number_of_books=Count('id'),
+    ).order_by('publisher_id', 'categories__id')
+    return group_books_per_publisher_per_category(books_per_publishers)
+
+
+def get_book_order_fact_books_per_publisher_per_category(fact_qs):
+    """
+    Same as get_books_per_publisher_per_category, using the quantity of the ordered books
+    """
+    books_per_publishers = fact_qs.values(
+        'publisher_id',
+        'publisher__name',
+        'book__categories__id',
+        'book__categories__name',
+    ).annotate(
+        number_of_books=Sum('quantity'),
+    ).order_by('publisher_id', 'book__categories__id')
+    return group_books_per_publisher_per_category(books_per_publishers, categories_field='book__categories')
+
+
+def get_book_grades_per_order_window(fact_qs, order_window_qs):
+    order_window_title_by_id = {
+        _id: title
+        for _id, title in order_window_qs.values_list('id', 'title').order_by('id')
+    }
+
+    fact_qs = fact_qs.filter(
+        grade__isnull=False,
+    ).values(
+        'order_window',
+        'grade',
+    ).annotate(
+        number_of_books=Sum('quantity'),
+    ).values_list(
+        'order_window',
+        'grade',
+        'number_of_books',
+    ).order_by(
+        'order_window',
+        'grade',
+    )
+
+    # Group grades by order_window (Grades are sorted from db)
+    grades_by_order_window_id = defaultdict(list)
+    for od_id, grade, number_of_books in fact_qs:
+        grades_by_order_window_id[od_id].append(dict(
+            grade=grade,  # Enum value, see format_book_grades_per_order_window
+            number_of_books=number_of_books,
+        ))
+
+    return [
+        # Order Window
+        dict(
+            order_window_id=order_window_id,
+            title=order_window_title,
+            grades=grades_by_order_window_id.get(order_window_id, []),
+        )
+        for order_window_id, order_window_title in order_window_title_by_id.items()
+    ]
+
+
+def get_book_order_fact_counts(fact_qs, field):
+    """
+    Number of books ordered per value of the field (eg: grade, language)
+    """
+    return [
+        {
+            field: record[field],
+            'number_of_books': record['number_of_books'],
+        } for record in fact_qs.filter(**{f'{field}__isnull': False}).values(field).annotate(
+            number_of_books=Sum('quantity'),
+        ).order_by(field)
+    ]
+
+
+def get_book_grade_qs(book_qs):
+    grade_data = book_qs.filter(grade__isnull=False).values('grade').annotate(
+        number_of_books=Count('id'),
+    ).order_by('grade')
+    # Enum values, see format_book_grades
+    number_of_books_by_grade = defaultdict(int)
+    for record in grade_data:
+        number_of_books_by_grade[record['grade']] += record['number_of_books'] or 0
+    return [
+        {
+            'grade': grade,
+            'number_of_books': number_of_books,
+        } for grade, number_of_books in number_of_books_by_grade.items()
+    ]
+
+
+def get_book_languages(book_qs):
+    languages_data = book_qs.filter(language__isnull=False).values('language').annotate(
+        number_of_books=Count('id'),
+    ).order_by('language')
+    # Enum values, see format_book_languages
+    number_of_books_by_language = defaultdict(int)
+    for record in languages_data:
+        number_of_books_by_language[record['language']] += record['number_of_books'] or 0
+    return [
+        {
+            'language': language,
+            'number_of_books': number_of_books,
+        } for language, number_of_books in number_of_books_by_language.items()
+    ]
+
+
+# NOTE: Labels are added while resolving so that they are translated for the request (and snapshots can store values)
+def format_book_grades(grade_data):
+    formatted_grade_data = [
+        {
+            'grade': Book.Grade(record['grade']).label,
+            'number_of_books': record['number_of_books']
+        } for record in grade_data
+    ]
+    return sorted(formatted_grade_data, key=lambda x: x['grade'])
+
+
+def format_book_languages(languages_data):
+    formatted_languages_data = [
+        {
+            'language': Book.LanguageType(record['language']).label,
+            'number_of_books': record['number_of_books']
+        } for record in languages_data
+    ]
+    return sorted(formatted_languages_data, key=lambda x: x['language'])
+
+
+def format_book_grades_per_order_window(order_windows):
+    return [
+        dict(
+            order_window,
+            grades=[
+                dict(grade, grade=Book.Grade(grade['grade']).label)  # Sending label instead of ENUM value
+                for grade in order_window['grades']
+            ],
+        )
+        for order_window in order_windows
+    ]
+
+
+class ReportQuerySets():
+    """
+    Base querysets shared by the report fields (Created once for the reports field of a request)
+    Aggregates listed in SNAPSHOT_AGGREGATES are read from ReportSnapshot when available.
+    With order_window, order/package based values are limited to the order window (Snapshots are not used).
+    NOTE: User and catalog (published books) based values are not limited by the order window.
+    """
+    SNAPSHOT_AGGREGATES = {
+        ReportSnapshot.Key.USERS_PER_DISTRICT.value: 'get_users_per_district',
+        ReportSnapshot.Key.BOOKS_ORDERED_AND_INCENTIVES_PER_DISTRICT.value: 'get_books_ordered_and_incentives_per_district',
+        ReportSnapshot.Key.DELIVERIES_PER_DISTRICT.value: 'get_deliveries_per_district',
+        ReportSnapshot.Key.PAYMENT_PER_ORDER_WINDOW.value: 'get_payment_per_order_window',
+        ReportSnapshot.Key.BOOKS_PER_PUBLISHER.value: 'get_books_per_publisher',
+        ReportSnapshot.Key.BOOKS_PER_CATEGORY.value: 'get_books_per_category',
+        ReportSnapshot.Key.BOOKS_PER_GRADE.value: 'get_books_per_grade',
+        ReportSnapshot.Key.BOOKS_PER_LANGUAGE.value: 'get_books_per_language',
+        ReportSnapshot.Key.BOOKS_PER_PUBLISHER_PER_CATEGORY.value: 'get_books_per_publisher_per_category',
+        ReportSnapshot.Key.BOOK_GRADES_PER_ORDER_WINDOW.value: 'get_book_grades_per_order_window',
+    }
+
+    def __init__(self, order_window=None):
+        self.order_window = order_window
+
+    def get_order_window_filters(self, prefix=''):
+        """
+        Filters for the order window of the orders (Use prefix for related orders, eg: order__)
+        """
+        if self.order_window is None:
+            return {}
+        return {f'{prefix}assigned_order_window': self.order_window}
+
+    def get_district_package_filters(self):
+        if self.order_window is None:
+            return {}
+        return {'schools__school_user__school_packages__order_window': self.order_window}
+
+    @cached_property
+    def user_qs(self):
+        return User.objects.filter(is_deactivated=False)
+
+    @cached_property
+    def school_user_qs(self):
+        return self.user_qs.filter(user_type=User.UserType.SCHOOL_ADMIN.value)
+
+    @cached_property
+    def book_qs(self):
+        return Book.objects.filter(is_published=True)
+
+    @cached_property
+    def order_qs(self):
+        return Order.objects.filter(
+            status=Order.Status.COMPLETED.value,
+            **self.get_order_window_filters(),
+        )
+
+    @cached_property
+    def fact_qs(self):
+        qs = BookOrderFact.objects.filter(status=Order.Status.COMPLETED.value)
+        if self.order_window is not None:
+            return qs.filter(order_window=self.order_window)
+        return qs
+
+    @cached_property
+    def school_package_qs(self):
+        qs = SchoolPackage.objects.filter(status=SchoolPackage.Status.DELIVERED.value)
+        if self.order_window is not None:
+            return qs.filter(order_window=self.order_window)
+        return qs
+
+    @cached_property
+    def district_qs(self):
+        return District.objects.all()
+
+    @cached_property
+    def order_window_qs(self):
+        if self.order_window is not None:
+            return OrderWindow.objects.filter(pk=self.order_window.pk)
+        return OrderWindow.objects.all()
+
+    @cached_property
+    def snapshots(self):
+        return {
+            snapshot.key: snapshot
+            for snapshot in ReportSnapshot.objects.all()
+        }
+
+    @property
+    def data_as_of(self):
+        """
+        Refresh time of the oldest snapshot (None if the snapshots are not generated yet or not used)
+        """
+        if self.order_window is not None or len(self.snapshots) < len(self.SNAPSHOT_AGGREGATES):
+            return None
+        return min(snapshot.refreshed_at for snapshot in self.snapshots.values())
+
+    def compute_aggregate(self, key):
+        return getattr(self, self.SNAPSHOT_AGGREGATES[key])()
+
+    def get_aggregate(self, key):
+        if self.order_window is not None:
+            # Snapshots are of the whole report
+            return self.compute_aggregate(key)
+        snapshot = self.snapshots.get(key)
+        if snapshot is not None:
+            return snapshot.data
+        # Not refreshed yet
+        return self.compute_aggregate(key)
+
+    # Aggregates (JSON serializable for ReportSnapshot)
+    def get_users_per_district(self):
+        return list(
+            self.district_qs.filter(
+                schools__school_user__isnull=False, schools__school_user__is_deactivated=False
+            ).values('name').annotate(
+                district_id=F('id'),
+                verified_users=Count('schools__school_user', filter=Q(schools__school_user__is_verified=True)),
+                unverified_users=Count('schools__school_user', filter=Q(schools__school_user__is_verified=False)),
+            )
+        )
+
+    def get_books_ordered_and_incentives_per_district(self):
+        return list(
+            self.district_qs.filter(
+                schools__school_user__school_packages__isnull=False,
+                **self.get_district_package_filters(),
+            ).values('name').annotate(
+                no_of_books_ordered=Sum('schools__school_user__school_packages__total_quantity'),
+                no_of_incentive_books=Sum(
+                    SchoolPackage.incentive_query_generator(prefix='schools__school_user__school_packages__')
+                ),
+                district_id=F('id')
+            )
+        )
+
+    def get_deliveries_per_district(self):
+        return list(
+            self.district_qs.filter(
+                schools__school_user__school_packages__isnull=False,
+                **self.get_district_package_filters(),
+            ).values('name').annotate(
+                school_delivered=Count('schools__school_user__school_packages'),
+                district_id=F('id')
+            )
+        )
+
+    def get_payment_per_order_window(self):
+        return list(
+            self.fact_qs.values('order_window__title').annotate(
+                payment=Sum('value'),
+                order_window_id=F('order_window'),
+                title=F('order_window__title'),
+            ).order_by('order_window')
+        )
+
+    def get_books_per_publisher(self):
+        return list(
+            self.book_qs.values('publisher__name').annotate(
+                number_of_books=Count('id'),
+                publisher_name=F('publisher__name'),
+                publisher_id=F('publisher__id')
+            )
+        )
+
+    def get_books_per_category(self):
+        return list(
+            self.book_qs.values('categories__name').annotate(
+                number_of_books=Count('id'),
+                category=F('categories__name'),
+                category_id=F('categories__id'),
+            )
+        )
+
+    def get_books_per_grade(self):
+        return get_book_grade_qs(self.book_qs)
+
+    def get_books_per_language(self):
+        return get_book_languages(self.book_qs)
+
+    def get_books_per_publisher_per_category(self):
+        return get_books_per_publisher_per_category(self.book_qs)
+
+    def get_book_grades_per_order_window(self):
+        return get_book_grades_per_order_window(self.fact_qs, self.order_window_qs)
+
+
+class SchoolReportQuerySets():
+    """
+    Base querysets shared by the school report fields (Created once for the reports field of a request)
+    Aggregates are read from SchoolReportSnapshot of the school when available.
+    """
+    SNAPSHOT_AGGREGATES = {
+        'number_of_books_ordered': 'get_number_of_books_ordered',
+        'number_of_incentive_books': 'get_number_of_incentive_books',
+        'payment_per_order_window': 'get_payment_per_order_window',
+        'books_per_publisher': 'get_books_per_publisher',
+        'books_per_category': 'get_books_per_category',
+        'books_per_grade': 'get_books_per_grade',
+        'books_per_language': 'get_books_per_language',
+        'books_per_publisher_per_category': 'get_books_per_publisher_per_category',
+    }
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def order_qs(self):
+        return Order.objects.filter(created_by=self.user, status=Order.Status.COMPLETED.value)
+
+    @cached_property
+    def order_fact_qs(self):
+        return BookOrderFact.objects.filter(created_by=self.user, status=Order.Status.COMPLETED.value)
+
+    @cached_property
+    def fact_qs(self):
+        # Book aggregates only include published books
+        return self.order_fact_qs.filter(book__is_published=True)
+
+    @cached_property
+    def school_package_qs(self):
+        return SchoolPackage.objects.filter(
+            status=SchoolPackage.Status.DELIVERED.value,
+            school=self.user
+        )
+
+    @cached_property
+    def snapshot(self):
+        return SchoolReportSnapshot.objects.filter(school=self.user).first()
+
+    @property
+    def data_as_of(self):
+        """
+        Refresh time of the snapshot (None if the snapshot is not generated yet)
+        """
+        if self.snapshot is None:
+            return None
+        return self.snapshot.refreshed_at
+
+    def compute_aggregate(self, key):
+        return getattr(self, self.SNAPSHOT_AGGREGATES[key])()
+
+    def get_aggregate(self, key):
+        if self.snapshot is not None and key in self.snapshot.data:
+            return self.snapshot.data[key]
+        # Not refreshed yet
+        return self.compute_aggregate(key)
+
+    # Aggregates (JSON serializable for SchoolReportSnapshot)
+    def get_number_of_books_ordered(self):
+        return self.order_qs.aggregate(total=Sum('total_quantity'))['total']
+
+    def get_number_of_incentive_books(self):
+        return self.school_package_qs.aggregate(
+            total_incentive_books=Sum(
+                SchoolPackage.incentive_query_generator()
+            ),
+        )['total_incentive_books']
+
+    def get_payment_per_order_window(self):
+        return list(
+            self.order_fact_qs.values('order_window__title').annotate(
+                payment=Sum('value'),
+                order_window_id=F('order_window'),
+                title=F('order_window__title'),
+            ).order_by('order_window')
+        )
+
+    def get_books_per_publisher(self):
+        return list(
+            self.fact_qs.values('publisher').annotate(
+                number_of_books=Sum('quantity'),
+                publisher_name=F('publisher__name'),
+                publisher_id=F('publisher'),
+            ).order_by('publisher')
+        )
+
+    def get_books_per_category(self):
+        # NOTE: Grouped from the facts, so each ordered book is counted once per category
+        # Books without category are grouped as null category (LEFT JOIN)
+        return list(
+            self.fact_qs.values('book__categories').annotate(
+                number_of_books=Sum('quantity'),
+                category=F('book__categories__name'),
+                category_id=F('book__categories'),
+            ).order_by('book__categories')
+        )
+
+    def get_books_per_grade(self):
+        return get_book_order_fact_counts(self.fact_qs, 'grade')
+
+    def get_books_per_language(self):
+        return get_book_order_fact_counts(self.fact_qs, 'language')
+
+    def get_books_per_publisher_per_category(self):
+        return get_book_order_fact_books_per_publisher_per_category(self.fact_qs)
+
+
+def refresh_report_snapshots(keys=None):
+    """
+    Recompute report snapshots (All if keys is not provided)
+    NOTE: Aggregates are computed before the write transaction, so readers are never blocked by a refresh
+    """
+    keys = keys or list(ReportQuerySets.SNAPSHOT_AGGREGATES.keys())
+    report = ReportQuerySets()
+    refreshed_at = timezone.now()
+    data_by_key = {
+        key: report.compute_aggregate(key)
+        for key in keys
+    }
+    with transaction.atomic():
+        for key, data in data_by_key.items():
+            ReportSnapshot.objects.update_or_create(
+                key=key,
+                defaults=dict(data=data, refreshed_at=refreshed_at),
+            )
+
+
+SCHOOL_REPORT_SNAPSHOT_REFRESH_CHUNK_SIZE = 500
+
+
+def refresh_school_report_snapshots(user_ids=None):
+    """
+    Recompute report snapshots of the provided school users (All, chunk by chunk, if user_ids is not provided)
+    """
+    if user_ids is None:
+        all_user_ids = list(
+            User.objects.filter(
+                user_type=User.UserType.SCHOOL_ADMIN.value,
+            ).order_by('id').values_list('id', flat=True)
+        )
+        for index in range(0, len(all_user_ids), SCHOOL_REPORT_SNAPSHOT_REFRESH_CHUNK_SIZE):
+            refresh_school_report_snapshots(
+                all_user_ids[index:index + SCHOOL_REPORT_SNAPSHOT_REFRESH_CHUNK_SIZE]
+            )
+        return
+    data_by_user_id = {}
+    for user in User.objects.filter(id__in=user_ids, user_type=User.UserType.SCHOOL_ADMIN.value):
+        report = SchoolReportQuerySets(user)
+        data_by_user_id[user.pk] = {
+            key: report.compute_aggregate(key)
+            for key in SchoolReportQuerySets.SNAPSHOT_AGGREGATES
+        }
+    refreshed_at = timezone.now()
+    with transaction.atomic():
+        for user_id, data in data_by_user_id.items():
+            SchoolReportSnapshot.objects.update_or_create(
+                school_id=user_id,
+                defaults=dict(data=data, refreshed_at=refreshed_at),
+            )
@@ -1,22 +1,28 @@
-from collections import defaultdict
-
 import graphene
 from graphene_django import DjangoObjectType
 from graphene_django_extras import DjangoObjectField, PageGraphqlPagination
-from django.db.models import Sum, Count, F, Q
+from django.db.models import Sum, Count, F
 
 from utils.graphene.types import CustomDjangoListObjectType, FileFieldType
 from utils.graphene.fields import DjangoPaginatedListObjectField
+from utils.graphene.enums import EnumDescription
 
-from apps.common.models import District, Province, Municipality, ActivityLogFile
+from apps.common.models import District, Province, Municipality, ActivityLogFile, ReportSnapshot, ReportExport
+from apps.common.enums import ReportExportStatusEnum
 from apps.common.filters import (
     DistrictFilter,
     ProvinceFilter,
     MunicipalityFilter,
 )
+from apps.common.reports import (
+    ReportQuerySets,
+    SchoolReportQuerySets,
+    format_book_grades,
+    format_book_languages,
+    format_book_grades_per_order_window,
+)
 from apps.user.models import User
-from apps.book.models import Book
-from apps.order.models import Order, BookOrder, OrderWindow
+from apps.order.models import Order, BookOrder
 from apps.package.models import SchoolPackage
 
 
@@ -72,6 +78,22 @@ class ActivityFileType(DjangoObjectType):
     file = graphene.Field(FileFieldType)
 
 
+class ReportExportType(DjangoObjectType):
+    status = graphene.Field(ReportExportStatusEnum, required=True)
+    status_display = EnumDescription(source='get_status_display')
+    file = graphene.Field(FileFieldType)
+
+    @staticmethod
+    def get_custom_queryset(queryset, info):
+        return ReportExport.objects.filter(created_by=info.context.user)
+
+    class Meta:
+        model = ReportExport
+        fields = (
+            'id', 'order_window', 'status', 'file', 'created_at', 'started_at', 'finished_at',
+        )
+
+
 class Query(graphene.ObjectType):
     province = DjangoObjectField(ProvinceType)
     provinces = DjangoPaginatedListObjectField(
@@ -141,8 +163,9 @@ class BooksPerPublisherType(graphene.ObjectType):
 
 
 class BooksPerCategoryType(graphene.ObjectType):
-    category_id = graphene.NonNull(graphene.ID)
-    category = graphene.NonNull(graphene.String)
+    # NOTE: Null for books without category
+    category_id = graphene.ID()
+    category = graphene.String()
     number_of_books = graphene.NonNull(graphene.Int)
 
 
@@ -231,6 +254,140 @@ class ReportType(graphene.ObjectType):
         BookCategoriesPerOrderWindowType,
         description='Number of grades books ordered per order window'
     )
+    data_as_of = graphene.DateTime(description='Refresh time of the precomputed aggregates')
+
+    # NOTE: Root is ReportQuerySets, each field is computed only when selected
+    @staticmethod
+    def resolve_number_of_schools_registered(root, info, **kwargs):
+        return root.school_user_qs.count()
+
+    @staticmethod
+    def resolve_number_of_schools_verified(root, info, **kwargs):
+        return root.school_user_qs.filter(is_verified=True).count()
+
+    @staticmethod
+    def resolve_number_of_schools_unverified(root, info, **kwargs):
+        return root.school_user_qs.filter(is_verified=False).count()
+
+    @staticmethod
+    def resolve_number_of_publishers(root, info, **kwargs):
+        return root.user_qs.filter(user_type=User.UserType.PUBLISHER.value).count()
+
+    @staticmethod
+    def resolve_number_of_books_on_the_platform(root, info, **kwargs):
+        return root.book_qs.count()
+
+    @staticmethod
+    def resolve_number_of_incentive_books(root, info, **kwargs):
+        return root.school_package_qs.aggregate(
+            total_incentive_books=Sum(
+                SchoolPackage.incentive_query_generator()
+            )
+        )['total_incentive_books']
+
+    @staticmethod
+    def resolve_number_of_books_ordered(root, info, **kwargs):
+        return root.order_qs.aggregate(total=Sum('total_quantity'))['total']
+
+    @staticmethod
+    def resolve_number_of_districts_reached(root, info, **kwargs):
+        return root.school_user_qs.filter(
+            order__isnull=False,
+            **root.get_order_window_filters('order__'),
+        ).values('school__district').annotate(total=Count('school__district')).order_by('total').count()
+
+    @staticmethod
+    def resolve_number_of_municipalities(root, info, **kwargs):
+        return root.school_user_qs.filter(
+            order__isnull=False,
+            order__status=Order.Status.COMPLETED.value,
+            **root.get_order_window_filters('order__'),
+        ).values('school__municipality').distinct().count()
+
+    @staticmethod
+    def resolve_number_of_schools_reached(root, info, **kwargs):
+        return root.school_user_qs.filter(
+            order__status=Order.Status.COMPLETED.value,
+            **root.get_order_window_filters('order__'),
+        ).distinct().count()
+
+    @staticmethod
+    def resolve_top_selling_books(root, info, **kwargs):
+        return BookOrder.objects.filter(
+            order__status=Order.Status.COMPLETED.value,
+            **root.get_order_window_filters('order__'),
+        ).values('title').annotate(
+            sold_count=Count('title'),
+            book_id=F('book_id'),
+        ).order_by('-sold_count')[:5]
+
+    @staticmethod
+    def resolve_top_schools(root, info, **kwargs):
+        return root.school_user_qs.filter(
+            order__status=Order.Status.COMPLETED.value,
+            **root.get_order_window_filters('order__'),
+        ).annotate(
+            book_ordered_count=Sum('order__total_quantity'),
+            school_name=F('school__name'),
+        ).order_by('-book_ordered_count')[:5].values('school_name', 'school_id', 'book_ordered_count')
+
+    @staticmethod
+    def resolve_users_per_district(root, info, **kwargs):
+        return root.get_aggregate(ReportSnapshot.Key.USERS_PER_DISTRICT.value)
+
+    @staticmethod
+    def resolve_books_ordered_and_incentives_per_district(root, info, **kwargs):
+        return root.get_aggregate(ReportSnapshot.Key.BOOKS_ORDERED_AND_INCENTIVES_PER_DISTRICT.value)
+
+    @staticmethod
+    def resolve_deliveries_per_district(root, info, **kwargs):
+        return root.get_aggregate(ReportSnapshot.Key.DELIVERIES_PER_DISTRICT.value)
+
+    @staticmethod
+    def resolve_payment_per_order_window(root, info, **kwargs):
+        return root.get_aggregate(ReportSnapshot.Key.PAYMENT_PER_ORDER_WINDOW.value)
+
+    @staticmethod
+    def resolve_books_per_publisher(root, info, **kwargs):
+        return root.get_aggregate(ReportSnapshot.Key.BOOKS_PER_PUBLISHER.value)
+
+    @staticmethod
+    def resolve_books_per_category(root, info, **kwargs):
+        return root.get_aggregate(ReportSnapshot.Key.BOOKS_PER_CATEGORY.value)
+
+    @staticmethod
+    def resolve_books_per_grade(root, info, **kwargs):
+        return format_book_grades(root.get_aggregate(ReportSnapshot.Key.BOOKS_PER_GRADE.value))
+
+    @staticmethod
+    def resolve_books_per_language(root, info, **kwargs):
+        return format_book_languages(root.get_aggregate(ReportSnapshot.Key.BOOKS_PER_LANGUAGE.value))
+
+    @staticmethod
+    def resolve_books_per_publisher_per_category(root, info, **kwargs):
+        return root.get_aggregate(ReportSnapshot.Key.BOOKS_PER_PUBLISHER_PER_CATEGORY.value)
+
+    @staticmethod
+    def resolve_books_and_cost_per_school(root, info, **kwargs):
+        return root.school_user_qs.filter(
+            order__status=Order.Status.COMPLETED.value,
+            **root.get_order_window_filters('order__'),
+        ).values('school__name').annotate(
+            number_of_books_ordered=Sum('order__total_quantity'),
+            school_name=F('school__name'),
+            school_id=F('school__id'),
+            total_cost=Sum('order__total_price')
+        )
+
+    @staticmethod
+    def resolve_book_grades_per_order_window(root, info, **kwargs):
+        return format_book_grades_per_order_window(
+            root.get_aggregate(ReportSnapshot.Key.BOOK_GRADES_PER_ORDER_WINDOW.value)
+        )
+
+    @staticmethod
+    def resolve_data_as_of(root, info, **kwargs):
+        return root.data_as_of
 
 
 class SchoolReportType(graphene.ObjectType):
@@ -260,248 +417,53 @@ class SchoolReportType(graphene.ObjectType):
         BooksPerPublisherPerCategory,
         description='Number of books per category for each publisher',
     )
+    data_as_of = graphene.DateTime(description='Refresh time of the precomputed aggregates')
 
+    # NOTE: Root is SchoolReportQuerySets, the school's snapshot is read once for all the fields
+    @staticmethod
+    def resolve_number_of_books_ordered(root, info, **kwargs):
+        return root.get_aggregate('number_of_books_ordered')
 
-def get_books_per_publisher_per_category(book_qs, school_report=False):
-    if school_report:
-        books_per_publishers = book_qs.values('publisher__name').annotate(
-            publisher_name=F('publisher__name'),
-            number_of_books=Sum('ordered_book__quantity'),
-            category=F('categories__name'),
-            category_id=F('categories__id'),
-            publisher_id=F('publisher__id')
-        )
-    else:
-        books_per_publishers = book_qs.values('publisher__name').annotate(
-            publisher_name=F('publisher__name'),
-            number_of_books=Count('id'),
-            category=F('categories__name'),
-            category_id=F('categories__id'),
-            publisher_id=F('publisher__id')
-        )
-    publishers = []
-    for item in books_per_publishers:
-        publishers.append(item['publisher_name'])
-    result = []
-    for publisher in list(set(publishers)):
-        result.append({'publisher_name': publisher, 'categories': []})
-    for publisher in result:
-        for books_per_publisher in books_per_publishers:
-            if publisher['publisher_name'] == books_per_publisher['publisher_name']:
-                publisher['publisher_id'] = books_per_publisher['publisher_id']
-                publisher['categories'].append(
-                    {
-                        'number_of_books': books_per_publisher['number_of_books'],
-                        'category': books_per_publisher['category'],
-                        'category_id': books_per_publisher['category_id'],
-                    }
-                )
-    return result
-
-
-def get_book_grades_per_order_window(order_qs, order_window_qs):
-    order_window_title_by_id = {
-        _id: title
-        for _id, title in order_window_qs.values_list('id', 'title').order_by('id')
-    }
-
-    order_qs = order_qs.filter(
-        book_order__book__grade__isnull=False,
-    ).values(
-        'assigned_order_window',
-        'book_order__book__grade',
-    ).annotate(
-        number_of_books=Sum('book_order__quantity'),
-    ).values_list(
-        'assigned_order_window',
-        'book_order__book__grade',
-        'number_of_books',
-    ).order_by(
-        'assigned_order_window',
-        'book_order__book__grade',
-    )
+    @staticmethod
+    def resolve_number_of_incentive_books(root, info, **kwargs):
+        return root.get_aggregate('number_of_incentive_books')
 
-    # Group grades by order_window (Grades are sorted from db)
-    grades_by_order_window_id = defaultdict(list)
-    for od_id, grade, number_of_books in order_qs:
-        grades_by_order_window_id[od_id].append(dict(
-            grade=Book.Grade(grade).label,  # Sending label instead of ENUM value
-            number_of_books=number_of_books,
-        ))
-
-    return [
-        # Order Window
-        dict(
-            order_window_id=order_window_id,
-            title=order_window_title,
-            grades=grades_by_order_window_id.get(order_window_id, []),
-        )
-        for order_window_id, order_window_title in order_window_title_by_id.items()
-    ]
+    @staticmethod
+    def resolve_payment_per_order_window(root, info, **kwargs):
+        return root.get_aggregate('payment_per_order_window')
 
+    @staticmethod
+    def resolve_books_per_publisher(root, info, **kwargs):
+        return root.get_aggregate('books_per_publisher')
 
-def get_book_grade_qs(book_qs, school_report=False):
-    if school_report:
-        grade_data = book_qs.filter(grade__isnull=False).values('grade').annotate(
-            number_of_books=Sum('ordered_book__quantity')
-        )
-    else:
-        grade_data = book_qs.filter(grade__isnull=False).values('grade').annotate(
-            number_of_books=Count('id')
-        )
-    formatted_grade_data = [
-        {
-            'grade': Book.Grade(record['grade']).label,
-            'number_of_books': record['number_of_books']
-        } for record in grade_data
-    ]
-    return sorted(formatted_grade_data, key=lambda x: x['grade'])
-
-
-def get_book_languages(book_qs, school_report=False):
-    if school_report:
-        languages_data = book_qs.filter(language__isnull=False).values('language').annotate(
-            number_of_books=Sum('ordered_book__quantity')
-        )
-    else:
-        languages_data = book_qs.filter(language__isnull=False).values('language').annotate(
-            number_of_books=Count('id')
-        )
-    formatted_languages_data = [
-        {
-            'language': Book.LanguageType(record['language']).label,
-            'number_of_books': record['number_of_books']
-        } for record in languages_data
-    ]
-    return sorted(formatted_languages_data, key=lambda x: x['language'])
+    @staticmethod
+    def resolve_books_per_category(root, info, **kwargs):
+        return root.get_aggregate('books_per_category')
+
+    @staticmethod
+    def resolve_books_per_grade(root, info, **kwargs):
+        return format_book_grades(root.get_aggregate('books_per_grade'))
+
+    @staticmethod
+    def resolve_books_per_language(root, info, **kwargs):
+        return format_book_languages(root.get_aggregate('books_per_language'))
+
+    @staticmethod
+    def resolve_books_per_publisher_per_category(root, info, **kwargs):
+        return root.get_aggregate('books_per_publisher_per_category')
+
+    @staticmethod
+    def resolve_data_as_of(root, info, **kwargs):
+        return root.data_as_of
 
 
 class ReportQuery(graphene.ObjectType):
     reports = graphene.Field(ReportType)
+    report_export = DjangoObjectField(ReportExportType)
 
     @staticmethod
     def resolve_reports(root, info, **kwargs):
-        user_qs = User.objects.filter(is_deactivated=False)
-        book_qs = Book.objects.filter(is_published=True)
-        order_qs = Order.objects.filter(status=Order.Status.COMPLETED.value)
-        school_package_qs = SchoolPackage.objects.filter(status=SchoolPackage.Status.DELIVERED.value)
-        district_qs = District.objects.all()
-        order_window_qs = OrderWindow.objects.all()
-
-        return {
-            'number_of_schools_registered': user_qs.filter(user_type=User.UserType.SCHOOL_ADMIN.value).count(),
-
-            'number_of_schools_verified': user_qs.filter(
-                user_type=User.UserType.SCHOOL_ADMIN.value, is_verified=True, is_deactivated=False
-            ).count(),
-
-            'number_of_schools_unverified': user_qs.filter(
-                user_type=User.UserType.SCHOOL_ADMIN.value, is_verified=False, is_deactivated=False
-            ).count(),
-
-            'number_of_publishers': user_qs.filter(user_type=User.UserType.PUBLISHER.value).count(),
-
-            'number_of_books_on_the_platform': book_qs.count(),
-
-            'number_of_incentive_books': school_package_qs.aggregate(
-                total_incentive_books=Sum(
-                    SchoolPackage.incentive_query_generator()
-                )
-            )['total_incentive_books'],
-
-            'number_of_books_ordered': order_qs.aggregate(total=Sum('book_order__quantity'))['total'],
-
-            'number_of_districts_reached': user_qs.filter(
-                user_type=User.UserType.SCHOOL_ADMIN.value, order__isnull=False
-            ).values('school__district').annotate(total=Count('school__district')).order_by('total').count(),
-
-            'number_of_municipalities': user_qs.filter(
-                user_type=User.UserType.SCHOOL_ADMIN.value,
-                order__isnull=False,
-                order__status=Order.Status.COMPLETED.value
-            ).values('school__municipality').distinct().count(),
-
-
-            'number_of_schools_reached': user_qs.filter(
-                user_type=User.UserType.SCHOOL_ADMIN.value,
-                order__status=Order.Status.COMPLETED.value
-            ).distinct().count(),
-
-            'top_selling_books': BookOrder.objects.filter(
-                order__status=Order.Status.COMPLETED.value
-            ).values('title').annotate(
-                sold_count=Count('title'),
-                book_id=F('book_id'),
-            ).order_by('-sold_count')[:5],
-
-            'top_schools': user_qs.filter(
-                user_type=User.UserType.SCHOOL_ADMIN.value,
-                order__status=Order.Status.COMPLETED.value,
-            ).annotate(
-                book_ordered_count=Sum('order__book_order__quantity'),
-                school_name=F('school__name'),
-            ).order_by('-book_ordered_count')[:5].values('school_name', 'school_id', 'book_ordered_count'),
-
-            'users_per_district': district_qs.filter(
-                schools__school_user__isnull=False, schools__school_user__is_deactivated=False
-            ).values('name').annotate(
-                district_id=F('id'),
-                verified_users=Count('schools__school_user', filter=Q(schools__school_user__is_verified=True)),
-                unverified_users=Count('schools__school_user', filter=Q(schools__school_user__is_verified=False)),
-            ),
-
-            'books_ordered_and_incentives_per_district': district_qs.filter(
-                schools__school_user__school_packages__isnull=False
-            ).values('name').annotate(
-                no_of_books_ordered=Sum('schools__school_user__school_packages__total_quantity'),
-                no_of_incentive_books=Sum(
-                    SchoolPackage.incentive_query_generator(prefix='schools__school_user__school_packages__')
-                ),
-                district_id=F('id')
-            ),
-
-            'deliveries_per_district': district_qs.filter(
-                schools__school_user__school_packages__isnull=False,
-            ).values('name').annotate(
-                school_delivered=Count('schools__school_user__school_packages'),
-                district_id=F('id')
-            ),
-
-            'payment_per_order_window': order_qs.values('assigned_order_window__title').annotate(
-                payment=Sum(F('book_order__price') * F('book_order__quantity')),
-                order_window_id=F('assigned_order_window__id'),
-                title=F('assigned_order_window__title'),
-            ).order_by('assigned_order_window__id'),
-
-            'books_per_publisher': book_qs.values('publisher__name').annotate(
-                number_of_books=Count('id'),
-                publisher_name=F('publisher__name'),
-                publisher_id=F('publisher__id')
-            ),
-
-            'books_per_category': book_qs.values('categories__name').annotate(
-                number_of_books=Count('id'),
-                category=F('categories__name'),
-                category_id=F('categories__id'),
-            ),
-
-            'books_per_grade': get_book_grade_qs(book_qs),
-
-            'books_per_language': get_book_languages(book_qs),
-            'books_per_publisher_per_category': get_books_per_publisher_per_category(book_qs),
-
-            'books_and_cost_per_school': user_qs.filter(
-                user_type=User.UserType.SCHOOL_ADMIN.value,
-                order__status=Order.Status.COMPLETED.value,
-            ).values('school__name').annotate(
-                number_of_books_ordered=Sum('order__book_order__quantity'),
-                school_name=F('school__name'),
-                school_id=F('school__id'),
-                total_cost=Sum(F('order__book_order__price') * F('order__book_order__quantity'))
-            ),
-
-            'book_grades_per_order_window': get_book_grades_per_order_window(order_qs, order_window_qs),
-        }
+        return ReportQuerySets()
 
 
 class ScholReportQuery(graphene.ObjectType):
@@ -509,47 +471,4 @@ class ScholReportQuery(graphene.ObjectType):
 
     @staticmethod
     def resolve_reports(root, info, **kwargs):
-        order_qs = Order.objects.filter(created_by=info.context.user, status=Order.Status.COMPLETED.value)
-        school_package_qs = SchoolPackage.objects.filter(
-            status=SchoolPackage.Status.DELIVERED.value,
-            school=info.context.user
-        )
-        order_window_qs = OrderWindow.objects.filter(
-            orders__status=Order.Status.COMPLETED.value,
-            orders__created_by=info.context.user
-        )
-        book_qs = Book.objects.filter(
-            is_published=True,
-            ordered_book__order__status=Order.Status.COMPLETED.value,
-            ordered_book__order__created_by=info.context.user
-        )
-
-        return {
-            'number_of_books_ordered': order_qs.aggregate(total=Sum('book_order__quantity'))['total'],
-            'number_of_incentive_books': school_package_qs.aggregate(
-                total_incentive_books=Sum(
-                    SchoolPackage.incentive_query_generator()
-                ),
-            )['total_incentive_books'],
-            'payment_per_order_window': order_window_qs.values('title').annotate(
-                payment=Sum(F('orders__book_order__price') * F('orders__book_order__quantity')),
-                order_window_id=F('id')
-            ),
-            'books_per_publisher': book_qs.values('publisher__name').annotate(
-                number_of_books=Sum('ordered_book__quantity'),
-                publisher_name=F('publisher__name'),
-                publisher_id=F('publisher__id')
-            ),
-
-            'books_per_category': book_qs.values('categories__name').annotate(
-                number_of_books=Sum('ordered_book__quantity'),
-                category=F('categories__name'),
-                category_id=F('categories__id'),
-            ),
-
-            'books_per_grade': get_book_grade_qs(book_qs, school_report=True),
-
-            'books_per_language': get_book_languages(book_qs, school_report=True),
-
-            'books_per_publisher_per_category': get_books_per_publisher_per_category(book_qs, school_report=True),
-        }
+        return SchoolReportQuerySets(info.context.user)
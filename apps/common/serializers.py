@@ -1,7 +1,9 @@
 from rest_framework import serializers
+from django.db import transaction
 # from django.utils.translation import gettext_lazy as _
 
-from apps.common.models import ActivityLogFile
+from apps.common.models import ActivityLogFile, ReportExport
+from apps.common.tasks import generate_report_export
 from config.serializers import CreatedUpdatedBaseSerializer
 
 
@@ -10,3 +12,21 @@ class ActivityLogFileSerializer(CreatedUpdatedBaseSerializer, serializers.ModelS
     class Meta:
         model = ActivityLogFile
         fields = ('type', 'file', )
+
+
+class ReportExportSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = ReportExport
+        fields = ('order_window',)
+
+    def create(self, validated_data):
+        report_export = ReportExport.objects.create(
+            **validated_data,
+            created_by=self.context['request'].user,
+        )
+        transaction.on_commit(lambda: generate_report_export.delay(report_export.pk))
+        return report_export
+
+    def update(self, instance, validated_data):
+        raise Exception('Not allowed')
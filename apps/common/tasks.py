@@ -1,8 +1,30 @@
-from django.core.mail import send_mail
+import datetime
+import logging
+import tempfile
+
+import graphene
+from django.core.mail import send_mail, get_connection, EmailMultiAlternatives
 from celery import shared_task
 from django.template.loader import render_to_string
 from django.conf import settings
+from django.core.files.base import File
+from django.db import transaction
+from django.utils import timezone
+from django.utils.functional import Promise
 from django.utils.translation import gettext_lazy as _
+from openpyxl import Workbook
+
+from apps.common.models import ReportExport
+from apps.common.data_export import DataExport
+from apps.common.reports import ReportQuerySets, refresh_report_snapshots, refresh_school_report_snapshots
+from apps.common.schema import ReportType
+from apps.notification.models import Notification
+
+logger = logging.getLogger(__name__)
+
+GENERIC_EMAIL_FOOTER_MESSAGE = _(
+    "If you are having trouble with the button above, copy and paste the URL below into your web browser."
+)
 
 
 @shared_task(name="generic_email_sender")
@@ -13,9 +35,184 @@ def generic_email_sender(subject, message, recipient, html_context=None):
         "from_email": settings.DEFAULT_FROM_EMAIL,
         "recipient_list": recipient,
     }
-    html_context['footer_message'] = _("If you are having trouble with the button above, copy and paste the URL below into your web browser.") # noqa E501]
+    html_context['footer_message'] = GENERIC_EMAIL_FOOTER_MESSAGE
     if html_context:
         email_data["html_message"] = render_to_string(
             "emails/generic_email.html", html_context
         )
     send_mail(**email_data)
+
+
+def send_generic_emails(emails):
+    """
+    Send multiple generic emails using a single connection (Use inside a task)
+    emails: [(subject, message, recipient_list, html_context), ...]
+    """
+    connection = get_connection()
+    messages = []
+    for subject, message, recipient, html_context in emails:
+        html_context['footer_message'] = GENERIC_EMAIL_FOOTER_MESSAGE
+        email = EmailMultiAlternatives(
+            subject, message, settings.DEFAULT_FROM_EMAIL, recipient, connection=connection,
+        )
+        email.attach_alternative(render_to_string("emails/generic_email.html", html_context), 'text/html')
+        messages.append(email)
+    return connection.send_messages(messages)
+
+
+@shared_task(name="report_snapshot_refresh")
+def refresh_report_snapshot(keys=None):
+    refresh_report_snapshots(keys)
+
+
+def schedule_report_snapshot_refresh():
+    """
+    Refresh report snapshots after current transaction is committed (Use after package/order status change)
+    """
+    transaction.on_commit(lambda: refresh_report_snapshot.delay())
+
+
+@shared_task(name="school_report_snapshot_refresh")
+def refresh_school_report_snapshot(user_ids=None):
+    refresh_school_report_snapshots(user_ids)
+
+
+def schedule_school_report_snapshot_refresh(order_qs):
+    """
+    Refresh report snapshots of the schools of given orders after current transaction is committed
+    (Use after order/package status change)
+    """
+    user_ids = list(order_qs.order_by().values_list('created_by', flat=True).distinct())
+    if user_ids:
+        transaction.on_commit(
+            lambda: refresh_school_report_snapshot.delay(user_ids)
+        )
+
+
+def _get_report_cell_value(value):
+    if isinstance(value, datetime.datetime):
+        # NOTE: Excel doesn't support timezone
+        return value.isoformat()
+    if isinstance(value, Promise):
+        # Lazy translated labels
+        return str(value)
+    return value
+
+
+def _get_report_sheet_title(field_name):
+    # NOTE: Excel limits sheet title to 31 characters
+    return field_name.replace('_', ' ').capitalize()[:31]
+
+
+def _get_list_field_type(field_type):
+    """
+    Object type of the list field (None for scalar fields)
+    """
+    if isinstance(field_type, graphene.NonNull):
+        field_type = field_type.of_type
+    if not isinstance(field_type, graphene.List):
+        return None
+    item_type = field_type.of_type
+    if isinstance(item_type, graphene.NonNull):
+        item_type = item_type.of_type
+    return item_type
+
+
+def _get_report_fields(object_type):
+    """
+    Scalar field names and the nested list field (name, object type) of the object type
+    """
+    scalar_fields = []
+    nested_field = None
+    for name, field in object_type._meta.fields.items():
+        nested_type = _get_list_field_type(field.type)
+        if nested_type is None:
+            scalar_fields.append(name)
+        else:
+            nested_field = (name, nested_type)
+    return scalar_fields, nested_field
+
+
+def _get_report_headers(object_type):
+    scalar_fields, nested_field = _get_report_fields(object_type)
+    headers = [name.replace('_', ' ').capitalize() for name in scalar_fields]
+    if nested_field is not None:
+        headers.extend(_get_report_headers(nested_field[1]))
+    return headers
+
+
+def _get_report_rows(object_type, items, parent_row=()):
+    """
+    Rows of the items, nested list fields are flattened (One row per nested item with the parent values)
+    """
+    scalar_fields, nested_field = _get_report_fields(object_type)
+    for item in items:
+        row = (*parent_row, *(_get_report_cell_value(item.get(name)) for name in scalar_fields))
+        nested_items = nested_field and item.get(nested_field[0])
+        if not nested_items:
+            yield row
+            continue
+        yield from _get_report_rows(nested_field[1], nested_items, parent_row=row)
+
+
+def generate_report_export_file(report_export):
+    """
+    Write each list field of ReportType to its own sheet and scalar fields to the summary sheet
+    """
+    report = ReportQuerySets(order_window=report_export.order_window)
+    # Write-only workbook, rows are written to temporary files instead of memory
+    wb = Workbook(write_only=True)
+    summary_ws = wb.create_sheet('Summary')
+    summary_ws.append(['Field', 'Value'])
+    if report_export.order_window:
+        summary_ws.append(['Order window', report_export.order_window.title])
+    for name, field in ReportType._meta.fields.items():
+        # NOTE: Resolvers don't use info
+        value = getattr(ReportType, f'resolve_{name}')(report, None)
+        object_type = _get_list_field_type(field.type)
+        if object_type is None:
+            summary_ws.append([field.description or name, _get_report_cell_value(value)])
+            continue
+        ws = wb.create_sheet(_get_report_sheet_title(name))
+        ws.append(_get_report_headers(object_type))
+        for row in _get_report_rows(object_type, value or []):
+            ws.append(row)
+
+    filename = f'report-{timezone.now().strftime("%Y%m%d%H%M%S")}.xlsx'
+    with tempfile.TemporaryFile(dir=settings.TEMP_DIR) as export_file:
+        wb.save(export_file)
+        export_file.seek(0)
+        report_export.file.save(filename, File(export_file), save=False)
+
+
+@shared_task(name="report_export_generator")
+def generate_report_export(report_export_id):
+    report_export = ReportExport.objects.select_related('order_window', 'created_by').get(id=report_export_id)
+    ReportExport.objects.filter(id=report_export.id).update(
+        status=ReportExport.Status.STARTED.value,
+        started_at=timezone.now(),
+    )
+    try:
+        generate_report_export_file(report_export)
+    except Exception:
+        logger.error(f'Failed to generate report export: {report_export.id}', exc_info=True)
+        ReportExport.objects.filter(id=report_export.id).update(
+            status=ReportExport.Status.FAILED.value,
+            finished_at=timezone.now(),
+        )
+        return False
+    report_export.status = ReportExport.Status.SUCCESS.value
+    report_export.finished_at = timezone.now()
+    report_export.save(update_fields=('file', 'status', 'finished_at'))
+    Notification.objects.create(
+        content_object=report_export,
+        recipient=report_export.created_by,
+        notification_type=Notification.NotificationType.REPORT_EXPORTED.value,
+        title=_('Report export is ready to download.'),
+    )
+    return True
+
+
+@shared_task(name="data_export")
+def export_data(tables=None, order_window_ids=None, force=False):
+    return DataExport(tables=tables, order_window_ids=order_window_ids, force=force).run()
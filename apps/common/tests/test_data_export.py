@@ -0,0 +1,54 @@
+import pyarrow.parquet as pq
+from django.utils import timezone
+
+from utils.graphene.tests import GraphQLTestCase
+
+from apps.order.models import Order
+from apps.common.models import DataExportPartition
+from apps.common.data_export import DataExport
+
+from apps.order.factories import OrderFactory, OrderWindowFactory, BookOrderFactory
+
+
+class TestDataExport(GraphQLTestCase):
+    def _read_partition(self, table, order_window):
+        partition = DataExportPartition.objects.get(table=table, order_window=order_window)
+        self.assertTrue(partition.file.name.endswith(f'{table}.parquet'))
+        with partition.file.open('rb') as export_file:
+            return pq.read_table(export_file).to_pylist()
+
+    def test_incremental_data_export(self):
+        order_window_1, order_window_2 = OrderWindowFactory.create_batch(2)
+        order_1 = OrderFactory.create(assigned_order_window=order_window_1)
+        order_2 = OrderFactory.create(assigned_order_window=order_window_2)
+        order_3 = OrderFactory.create(assigned_order_window=None)
+        BookOrderFactory.create_batch(2, order=order_1)
+        BookOrderFactory.create_batch(3, order=order_2)
+
+        def _export():
+            return DataExport(tables=['orders', 'book_orders']).run()
+
+        # Orders without order window are exported as a separate partition
+        self.assertEqual(_export(), dict(orders=3, book_orders=3))
+        self.assertEqual(len(self._read_partition('book_orders', order_window_1)), 2)
+        book_orders = self._read_partition('book_orders', order_window_2)
+        self.assertEqual(len(book_orders), 3)
+        self.assertEqual({row['order'] for row in book_orders}, {order_2.pk})
+        self.assertEqual([row['id'] for row in self._read_partition('orders', None)], [order_3.pk])
+        self.assertEqual(self._read_partition('book_orders', None), [])
+
+        # Unchanged partitions are not written again
+        self.assertEqual(_export(), dict(orders=0, book_orders=0))
+
+        # Only changed order window is written
+        Order.objects.filter(pk=order_2.pk).update(status=Order.Status.COMPLETED.value, updated_at=timezone.now())
+        self.assertEqual(_export(), dict(orders=1, book_orders=1))
+        orders = self._read_partition('orders', order_window_2)
+        self.assertEqual([row['status'] for row in orders], [Order.Status.COMPLETED.value])
+        self.assertEqual(DataExportPartition.objects.get(table='orders', order_window=order_window_2).row_count, 1)
+
+        # Force writes all partitions
+        self.assertEqual(
+            DataExport(tables=['orders'], order_window_ids=[order_window_1.pk], force=True).run(),
+            dict(orders=1),
+        )
@@ -0,0 +1,306 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from openpyxl import load_workbook
+
+from utils.graphene.tests import GraphQLTestCase
+
+from apps.user.models import User
+from apps.book.models import Book
+from apps.order.models import Order
+from apps.common.models import ReportExport
+from apps.notification.models import Notification
+from apps.common.reports import (
+    refresh_report_snapshots,
+    refresh_school_report_snapshots,
+    get_books_per_publisher_per_category,
+)
+from apps.common.tasks import generate_report_export
+
+from apps.user.factories import UserFactory
+from apps.book.factories import BookFactory, CategoryFactory
+from apps.publisher.factories import PublisherFactory
+from apps.order.factories import OrderFactory, OrderWindowFactory, BookOrderFactory
+
+
+class TestReports(GraphQLTestCase):
+    REPORTS_QUERY = '''
+        query MyQuery {
+          moderatorQuery {
+            reports {
+              numberOfBooksOrdered
+            }
+          }
+        }
+    '''
+
+    SCHOOL_REPORTS_QUERY = '''
+        query MyQuery {
+          schoolQuery {
+            reports {
+              numberOfBooksOrdered
+            }
+          }
+        }
+    '''
+
+    REPORTS_SNAPSHOT_QUERY = '''
+        query MyQuery {
+          moderatorQuery {
+            reports {
+              dataAsOf
+              booksPerGrade {
+                grade
+                numberOfBooks
+              }
+            }
+          }
+        }
+    '''
+
+    SCHOOL_REPORTS_SNAPSHOT_QUERY = '''
+        query MyQuery {
+          schoolQuery {
+            reports {
+              dataAsOf
+              numberOfBooksOrdered
+              booksPerCategory {
+                categoryId
+                numberOfBooks
+              }
+            }
+          }
+        }
+    '''
+
+    REQUEST_REPORT_EXPORT_MUTATION = '''
+        mutation Mutation($input: ReportExportInputType!) {
+          moderatorMutation {
+            requestReportExport(data: $input) {
+              ok
+              errors
+              result {
+                id
+                status
+              }
+            }
+          }
+        }
+    '''
+
+    REPORT_EXPORT_QUERY = '''
+        query MyQuery($id: ID!) {
+          moderatorQuery {
+            reportExport(id: $id) {
+              id
+              status
+              file {
+                url
+              }
+            }
+          }
+        }
+    '''
+
+    NOTIFICATIONS_QUERY = '''
+        query MyQuery {
+          notifications {
+            results {
+              notificationType
+              reportExport {
+                id
+              }
+            }
+          }
+        }
+    '''
+
+    def setUp(self):
+        self.moderator = UserFactory.create(user_type=User.UserType.MODERATOR.value)
+        self.school_user = UserFactory.create(user_type=User.UserType.SCHOOL_ADMIN.value)
+        OrderFactory.create(created_by=self.school_user, status=Order.Status.COMPLETED.value, total_quantity=10)
+        OrderFactory.create(created_by=self.school_user, status=Order.Status.COMPLETED.value, total_quantity=5)
+        OrderFactory.create(created_by=self.school_user, status=Order.Status.PENDING.value, total_quantity=20)
+        OrderFactory.create(status=Order.Status.COMPLETED.value, total_quantity=30)
+        super().setUp()
+
+    def _query_check_with_report_queries(self, query):
+        with CaptureQueriesContext(connection) as queries:
+            content = self.query_check(query)
+        # Exclude session/user queries of the request
+        report_queries = [
+            captured_query['sql']
+            for captured_query in queries.captured_queries
+            if 'SUM(' in captured_query['sql'] or 'COUNT(' in captured_query['sql']
+        ]
+        return content, report_queries
+
+    def test_reports_selected_fields_only(self):
+        self.force_login(self.moderator)
+        content, report_queries = self._query_check_with_report_queries(self.REPORTS_QUERY)
+        self.assertEqual(content['data']['moderatorQuery']['reports']['numberOfBooksOrdered'], 45)
+        self.assertEqual(len(report_queries), 1, report_queries)
+
+        self.force_login(self.school_user)
+        content, report_queries = self._query_check_with_report_queries(self.SCHOOL_REPORTS_QUERY)
+        self.assertEqual(content['data']['schoolQuery']['reports']['numberOfBooksOrdered'], 15)
+        self.assertEqual(len(report_queries), 1, report_queries)
+
+    def test_report_snapshots(self):
+        publisher = PublisherFactory.create()
+        BookFactory.create(publisher=publisher, is_published=True, grade=Book.Grade.GRADE_1.value)
+        self.force_login(self.moderator)
+
+        def _query_books_per_grade():
+            reports = self.query_check(self.REPORTS_SNAPSHOT_QUERY)['data']['moderatorQuery']['reports']
+            return reports['dataAsOf'], reports['booksPerGrade']
+
+        # Computed live until the snapshots are refreshed
+        data_as_of, books_per_grade = _query_books_per_grade()
+        self.assertIsNone(data_as_of)
+        self.assertEqual(books_per_grade, [dict(grade=str(Book.Grade.GRADE_1.label), numberOfBooks=1)])
+
+        refresh_report_snapshots()
+        BookFactory.create(publisher=publisher, is_published=True, grade=Book.Grade.GRADE_1.value)
+        data_as_of, books_per_grade = _query_books_per_grade()
+        self.assertIsNotNone(data_as_of)
+        self.assertEqual(books_per_grade, [dict(grade=str(Book.Grade.GRADE_1.label), numberOfBooks=1)])
+
+        refresh_report_snapshots()
+        _, books_per_grade = _query_books_per_grade()
+        self.assertEqual(books_per_grade, [dict(grade=str(Book.Grade.GRADE_1.label), numberOfBooks=2)])
+
+    def test_books_per_publisher_per_category(self):
+        # Publishers with same name are not merged
+        publisher_1, publisher_2 = PublisherFactory.create_batch(2, name='Same name')
+        category_1, category_2 = CategoryFactory.create_batch(2)
+        for publisher, categories_list in [
+            (publisher_1, [[category_1], [category_1, category_2]]),
+            (publisher_2, [[category_2]]),
+        ]:
+            for categories in categories_list:
+                book = BookFactory.create(publisher=publisher, is_published=True)
+                book.categories.set(categories)
+
+        result = get_books_per_publisher_per_category(Book.objects.filter(is_published=True))
+        self.assertEqual(result, [
+            {
+                'publisher_id': publisher_1.pk,
+                'publisher_name': 'Same name',
+                'categories': [
+                    {'number_of_books': 2, 'category': category_1.name, 'category_id': category_1.pk},
+                    {'number_of_books': 1, 'category': category_2.name, 'category_id': category_2.pk},
+                ],
+            },
+            {
+                'publisher_id': publisher_2.pk,
+                'publisher_name': 'Same name',
+                'categories': [
+                    {'number_of_books': 1, 'category': category_2.name, 'category_id': category_2.pk},
+                ],
+            },
+        ])
+
+    def test_report_export(self):
+        order_window = OrderWindowFactory.create()
+        OrderFactory.create(
+            created_by=self.school_user,
+            status=Order.Status.COMPLETED.value,
+            total_quantity=7,
+            assigned_order_window=order_window,
+        )
+
+        def _query_check(minput, **kwargs):
+            return self.query_check(self.REQUEST_REPORT_EXPORT_MUTATION, minput=minput, **kwargs)
+
+        def _get_summary(report_export_id):
+            report_export = ReportExport.objects.get(pk=report_export_id)
+            with report_export.file.open('rb') as export_file:
+                workbook = load_workbook(export_file)
+            self.assertIn('Books per publisher per categor', workbook.sheetnames)
+            return {
+                row[0]: row[1]
+                for row in workbook['Summary'].iter_rows(min_row=2, values_only=True)
+            }
+
+        # Only moderator is allowed
+        self.force_login(self.school_user)
+        _query_check({'orderWindow': None}, assert_for_error=True)
+
+        self.force_login(self.moderator)
+        content = _query_check({'orderWindow': None}, okay=True, mnested=['moderatorMutation'])
+        result = content['data']['moderatorMutation']['requestReportExport']['result']
+        self.assertEqual(result['status'], self.genum(ReportExport.Status.PENDING))
+
+        self.assertTrue(generate_report_export(result['id']))
+        report_export = self.query_check(
+            self.REPORT_EXPORT_QUERY, variables={'id': result['id']}
+        )['data']['moderatorQuery']['reportExport']
+        self.assertEqual(report_export['status'], self.genum(ReportExport.Status.SUCCESS))
+        self.assertNotEqual(report_export['file']['url'], '')
+        self.assertEqual(_get_summary(result['id'])['Number of books Ordered'], 52)
+
+        # Requester is notified with the export
+        notifications = self.query_check(self.NOTIFICATIONS_QUERY)['data']['notifications']['results']
+        self.assertEqual(notifications, [
+            dict(
+                notificationType=self.genum(Notification.NotificationType.REPORT_EXPORTED),
+                reportExport=dict(id=result['id']),
+            ),
+        ])
+
+        # Order window slice
+        content = _query_check({'orderWindow': str(order_window.pk)}, okay=True, mnested=['moderatorMutation'])
+        result = content['data']['moderatorMutation']['requestReportExport']['result']
+        self.assertTrue(generate_report_export(result['id']))
+        summary = _get_summary(result['id'])
+        self.assertEqual(summary['Order window'], order_window.title)
+        self.assertEqual(summary['Number of books Ordered'], 7)
+
+    def test_school_report_snapshots(self):
+        category_1, category_2 = CategoryFactory.create_batch(2)
+        book = BookFactory.create(is_published=True)
+        book.categories.set([category_1, category_2])
+        # NOTE: Order totals are incremented by the book order
+        order = OrderFactory.create(created_by=self.school_user, status=Order.Status.COMPLETED.value)
+        BookOrderFactory.create(order=order, book=book, quantity=3)
+        # Uncategorized books are included, unpublished books are not
+        BookOrderFactory.create(order=order, book=BookFactory.create(is_published=True), quantity=2)
+        unpublished_book = BookFactory.create(is_published=False)
+        unpublished_book.categories.set([category_1])
+        BookOrderFactory.create(order=order, book=unpublished_book, quantity=4)
+        self.force_login(self.school_user)
+
+        def _query_reports():
+            content, report_queries = self._query_check_with_report_queries(self.SCHOOL_REPORTS_SNAPSHOT_QUERY)
+            return content['data']['schoolQuery']['reports'], report_queries
+
+        expected_books_per_category = [
+            # Each ordered book is counted once per category
+            dict(categoryId=str(category_1.pk), numberOfBooks=3),
+            dict(categoryId=str(category_2.pk), numberOfBooks=3),
+            dict(categoryId=None, numberOfBooks=2),
+        ]
+
+        # Computed live until the snapshot is refreshed
+        reports, _ = _query_reports()
+        self.assertIsNone(reports['dataAsOf'])
+        self.assertEqual(reports['numberOfBooksOrdered'], 24)
+        self.assertEqual(reports['booksPerCategory'], expected_books_per_category)
+
+        refresh_school_report_snapshots([self.school_user.pk, self.moderator.pk])
+        reports, report_queries = _query_reports()
+        self.assertIsNotNone(reports['dataAsOf'])
+        self.assertEqual(reports['numberOfBooksOrdered'], 24)
+        self.assertEqual(reports['booksPerCategory'], expected_books_per_category)
+        self.assertEqual(report_queries, [])
+
+        # Book category changes don't schedule a refresh, they are picked up by the periodic refresh of all schools
+        book.categories.set([category_1])
+        reports, _ = _query_reports()
+        self.assertEqual(reports['booksPerCategory'], expected_books_per_category)
+        refresh_school_report_snapshots()
+        reports, _ = _query_reports()
+        self.assertEqual(reports['booksPerCategory'], [
+            dict(categoryId=str(category_1.pk), numberOfBooks=3),
+            dict(categoryId=None, numberOfBooks=2),
+        ])
@@ -1,6 +1,7 @@
 from promise import Promise
 from django.utils.functional import cached_property
 from apps.order.models import Order
+from apps.common.models import ReportExport
 from apps.notification.models import Notification
 from utils.graphene.dataloaders import DataLoaderWithContext, WithContextMixin
 
@@ -25,7 +26,34 @@ class OrderLoader(DataLoaderWithContext):
         return Promise.resolve([orders.get(key, 0) for key in keys])
 
 
+class ReportExportLoader(DataLoaderWithContext):
+    def batch_load_fn(self, keys):
+        report_export_id_by_notification_id = {
+            notification_id: object_id
+            for notification_id, object_id in Notification.objects.filter(
+                id__in=keys,
+                content_type__app_label=ReportExport._meta.app_label,
+                content_type__model=ReportExport._meta.model_name,
+            ).values_list('id', 'object_id')
+        }
+        report_exports = {
+            report_export.pk: report_export
+            for report_export in ReportExport.objects.filter(
+                id__in=report_export_id_by_notification_id.values(),
+                created_by=self.context.user,
+            )
+        }
+        return Promise.resolve([
+            report_exports.get(report_export_id_by_notification_id.get(key))
+            for key in keys
+        ])
+
+
 class DataLoaders(WithContextMixin):
     @cached_property
     def order(self):
         return OrderLoader(context=self.context)
+
+    @cached_property
+    def report_export(self):
+        return ReportExportLoader(context=self.context)
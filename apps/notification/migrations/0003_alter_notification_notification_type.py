@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-19 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification', '0002_notification_recipient'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('order_received', 'Order received'), ('order_packed', 'Order packed'), ('order_completed', 'Order completed'), ('order_cancelled', 'Order cancelled'), ('report_exported', 'Report exported'), ('general', 'General')], default='general', max_length=40, verbose_name='Notification Type'),
+        ),
+    ]
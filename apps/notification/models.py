@@ -12,6 +12,7 @@ class Notification(models.Model):
         ORDER_PACKED = 'order_packed', 'Order packed'
         ORDER_COMPLETED = 'order_completed', 'Order completed'
         ORDER_CANCELLED = 'order_cancelled', 'Order cancelled'
+        REPORT_EXPORTED = 'report_exported', 'Report exported'
         GENERAL = 'general', 'General'
 
     notification_type = models.CharField(
@@ -10,6 +10,8 @@ from apps.notification.models import Notification
 from apps.notification.filters import NotificationFilter
 from apps.order.schema import OrderType
 from apps.order.models import Order
+from apps.common.schema import ReportExportType
+from apps.common.models import ReportExport
 
 
 def get_notification_qs(info):
@@ -18,6 +20,7 @@ def get_notification_qs(info):
 
 class NotificationType(DjangoObjectType):
     order = graphene.Field(OrderType)
+    report_export = graphene.Field(ReportExportType)
 
     class Meta:
         model = Notification
@@ -34,6 +37,10 @@ class NotificationType(DjangoObjectType):
     def resolve_order(root, info, **kwargs) -> Union[Order, None]:
         return info.context.dl.notification.order.load(root.pk)
 
+    @staticmethod
+    def resolve_report_export(root, info, **kwargs) -> Union[ReportExport, None]:
+        return info.context.dl.notification.report_export.load(root.pk)
+
 
 class NotificationWithCountType(graphene.ObjectType):
     read_count = graphene.Int()
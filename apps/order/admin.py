@@ -1,7 +1,7 @@
 from django.contrib import admin
 from modeltranslation.admin import TranslationAdmin
 
-from apps.order.models import CartItem, BookOrder, Order, OrderWindow
+from apps.order.models import CartItem, BookOrder, Order, OrderWindow, OrderDailyStat, BookOrderFact
 
 
 class CartItemAdmin(admin.ModelAdmin):
@@ -31,7 +31,27 @@ class OrderAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related('created_by')
 
 
+class OrderDailyStatAdmin(admin.ModelAdmin):
+    list_display = ['id', 'date', 'created_by', 'publisher', 'status', 'order_count', 'quantity', 'value']
+    list_filter = ['status']
+    autocomplete_fields = ['created_by', 'publisher']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('created_by', 'publisher')
+
+
+class BookOrderFactAdmin(admin.ModelAdmin):
+    list_display = ['id', 'book_order', 'order', 'status', 'publisher', 'grade', 'language', 'quantity', 'value']
+    list_filter = ['status', 'grade', 'language']
+    autocomplete_fields = ['created_by', 'publisher']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('publisher')
+
+
 admin.site.register(CartItem, CartItemAdmin)
 admin.site.register(BookOrder, BookOrderAdmin)
 admin.site.register(Order, OrderAdmin)
 admin.site.register(OrderWindow)
+admin.site.register(OrderDailyStat, OrderDailyStatAdmin)
+admin.site.register(BookOrderFact, BookOrderFactAdmin)
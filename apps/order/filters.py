@@ -1,6 +1,5 @@
 import django_filters
 from django.db import models
-from django.db.models import Q
 
 from utils.graphene.filters import (
     DateGteFilter,
@@ -9,6 +8,9 @@ from utils.graphene.filters import (
     IDListFilter,
 )
 
+from apps.user.models import User
+from apps.common.models import District, Municipality
+
 from .models import BookOrder, Order, OrderWindow, OrderActivityLog
 from .enums import OrderStatusEnum
 
@@ -50,14 +52,30 @@ class OrderFilterSet(django_filters.FilterSet):
     def filter_order_by_districts(self, queryset, name, value):
         if not value:
             return queryset
-        return queryset.filter(Q(created_by__school__district__in=value) | Q(created_by__institution__district__in=value))
+        return queryset.filter(district__in=value)
 
     def filter_order_by_municipalities(self, queryset, name, value):
         if not value:
             return queryset
-        return queryset.filter(
-            Q(created_by__school__municipality__in=value) | Q(created_by__institution__municipality__in=value)
-        )
+        return queryset.filter(municipality__in=value)
+
+
+class OrderExportFilterSet(OrderFilterSet):
+    """
+    OrderFilterSet for query params (Used by order export endpoint)
+    Unlike GraphQL arguments, values are not validated by the schema, invalid values are reported as form errors.
+    """
+    status = django_filters.MultipleChoiceFilter(choices=Order.Status.choices)
+    users = django_filters.ModelMultipleChoiceFilter(queryset=User.objects.all(), method='filter_users')
+    order_windows = django_filters.ModelMultipleChoiceFilter(
+        queryset=OrderWindow.objects.all(), method='filter_order_windows'
+    )
+    districts = django_filters.ModelMultipleChoiceFilter(
+        queryset=District.objects.all(), method='filter_order_by_districts'
+    )
+    municipalities = django_filters.ModelMultipleChoiceFilter(
+        queryset=Municipality.objects.all(), method='filter_order_by_municipalities'
+    )
 
 
 class OrderWindowFilterSet(django_filters.FilterSet):
@@ -0,0 +1,44 @@
+from django.db import migrations, models
+
+
+def backfill_order_totals(apps, schema_editor):
+    Order = apps.get_model('order', 'Order')
+    BookOrder = apps.get_model('order', 'BookOrder')
+    book_order_qs = BookOrder.objects.filter(order=models.OuterRef('pk')).order_by().values('order')
+    Order.objects.update(
+        total_quantity=models.functions.Coalesce(
+            models.Subquery(
+                book_order_qs.annotate(total=models.Sum('quantity')).values('total')[:1],
+                output_field=models.PositiveIntegerField(),
+            ),
+            0,
+        ),
+        distinct_book_count=models.functions.Coalesce(
+            models.Subquery(
+                book_order_qs.annotate(total=models.Count('book', distinct=True)).values('total')[:1],
+                output_field=models.PositiveIntegerField(),
+            ),
+            0,
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0011_auto_20231203_2050'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='distinct_book_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Distinct book count'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_quantity',
+            field=models.PositiveIntegerField(default=0, verbose_name='Total quantity'),
+        ),
+        migrations.RunPython(backfill_order_totals, reverse_code=migrations.RunPython.noop),
+    ]
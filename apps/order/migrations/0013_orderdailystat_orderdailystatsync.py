@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('publisher', '0002_publisher_internal_code'),
+        ('order', '0012_order_total_quantity_distinct_book_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderDailyStatSync',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_order_id', models.BigIntegerField(default=0, verbose_name='Last synced order id')),
+                ('synced_at', models.DateTimeField(blank=True, null=True, verbose_name='Synced at')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OrderDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('in_transit', 'IN TRANSIT'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=40, verbose_name='Order status')),
+                ('order_count', models.PositiveIntegerField(default=0, verbose_name='Order count')),
+                ('quantity', models.BigIntegerField(default=0, verbose_name='Quantity')),
+                ('value', models.BigIntegerField(default=0, verbose_name='Value')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Created by')),
+                ('publisher', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='publisher.publisher', verbose_name='Publisher')),
+            ],
+            options={
+                'verbose_name': 'Order daily stat',
+                'verbose_name_plural': 'Order daily stats',
+                'unique_together': {('date', 'created_by', 'publisher', 'status')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='orderdailystat',
+            index=models.Index(fields=['status', 'date'], name='order_daily_stat_status_date'),
+        ),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 3.2.16 on 2026-10-19 13:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BACKFILL_SQL = '''
+INSERT INTO order_bookorderfact (
+    book_order_id, order_id, order_window_id, status, created_at, created_by_id, user_type,
+    school_id, institution_id, province_id, district_id, municipality_id,
+    publisher_id, book_id, grade, language, quantity, value
+)
+SELECT
+    book_order.id,
+    "order".id,
+    "order".assigned_order_window_id,
+    "order".status,
+    "order".created_at,
+    "order".created_by_id,
+    "user".user_type,
+    "user".school_id,
+    "user".institution_id,
+    COALESCE(school.province_id, institution.province_id),
+    COALESCE(school.district_id, institution.district_id),
+    COALESCE(school.municipality_id, institution.municipality_id),
+    book_order.publisher_id,
+    book_order.book_id,
+    book_order.grade,
+    book_order.language,
+    book_order.quantity,
+    book_order.total_price
+FROM order_bookorder AS book_order
+    INNER JOIN order_order AS "order" ON "order".id = book_order.order_id
+    INNER JOIN user_user AS "user" ON "user".id = "order".created_by_id
+    LEFT OUTER JOIN school_school AS school ON school.id = "user".school_id
+    LEFT OUTER JOIN institution_institution AS institution ON institution.id = "user".institution_id
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('book', '0007_alter_book_language'),
+        ('common', '0004_auto_20220302_1008'),
+        ('institution', '0002_auto_20220331_1509'),
+        ('publisher', '0002_publisher_internal_code'),
+        ('school', '0002_auto_20220627_2055'),
+        ('order', '0013_orderdailystat_orderdailystatsync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookOrderFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('in_transit', 'IN TRANSIT'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=40, verbose_name='Order status')),
+                ('created_at', models.DateTimeField(verbose_name='Order placed at')),
+                ('user_type', models.CharField(max_length=40, verbose_name='User type')),
+                ('grade', models.CharField(blank=True, choices=[('ecd', 'ECD'), ('grade_1', 'Grade 1'), ('grade_2', 'Grade 2'), ('grade_3', 'Grade 3'), ('grade_4', 'Grade 4'), ('grade_5', 'Grade 5')], max_length=40, null=True, verbose_name='Grade')),
+                ('language', models.CharField(blank=True, choices=[('english', 'English'), ('nepali', 'Nepali'), ('Maithali', 'Maithali'), ('Tharu', 'Tharu'), ('bilingual', 'Bilingual')], max_length=40, null=True, verbose_name='Language')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Quantity')),
+                ('value', models.BigIntegerField(verbose_name='Value')),
+                ('book', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='book.book', verbose_name='Book')),
+                ('book_order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='fact', to='order.bookorder', verbose_name='Book order')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Created by')),
+                ('district', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='common.district', verbose_name='District')),
+                ('institution', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='institution.institution', verbose_name='Institution')),
+                ('municipality', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='common.municipality', verbose_name='Municipality')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='order.order', verbose_name='Order')),
+                ('order_window', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='order.orderwindow', verbose_name='Order window')),
+                ('province', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='common.province', verbose_name='Province')),
+                ('publisher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='publisher.publisher', verbose_name='Publisher')),
+                ('school', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='school.school', verbose_name='School')),
+            ],
+            options={
+                'verbose_name': 'Book order fact',
+                'verbose_name_plural': 'Book order facts',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='bookorderfact',
+            index=models.Index(fields=['status', 'order_window'], name='book_order_fact_status_window'),
+        ),
+        migrations.AddIndex(
+            model_name='bookorderfact',
+            index=models.Index(fields=['status', 'district'], name='book_order_fact_status_dist'),
+        ),
+        migrations.AddIndex(
+            model_name='bookorderfact',
+            index=models.Index(fields=['status', 'municipality'], name='book_order_fact_status_muni'),
+        ),
+        migrations.AddIndex(
+            model_name='bookorderfact',
+            index=models.Index(fields=['status', 'publisher'], name='book_order_fact_status_pub'),
+        ),
+        migrations.AddIndex(
+            model_name='bookorderfact',
+            index=models.Index(fields=['status', 'grade'], name='book_order_fact_status_grade'),
+        ),
+        migrations.AddIndex(
+            model_name='bookorderfact',
+            index=models.Index(fields=['status', 'language'], name='book_order_fact_status_lang'),
+        ),
+        migrations.AddIndex(
+            model_name='bookorderfact',
+            index=models.Index(fields=['created_by', 'status'], name='book_order_fact_user_status'),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
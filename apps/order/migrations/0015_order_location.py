@@ -0,0 +1,42 @@
+# Generated by Django 3.2.16 on 2026-10-19 15:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BACKFILL_SQL = '''
+UPDATE order_order AS "order" SET
+    province_id = "user".province_id,
+    district_id = "user".district_id,
+    municipality_id = "user".municipality_id
+FROM user_user AS "user"
+WHERE "user".id = "order".created_by_id
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0004_auto_20220302_1008'),
+        ('user', '0003_user_location'),
+        ('order', '0014_bookorderfact'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='district',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='common.district', verbose_name='District'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='municipality',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='common.municipality', verbose_name='Municipality'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='province',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='common.province', verbose_name='Province'),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.16 on 2026-10-19 18:10
+
+from django.db import migrations, models
+
+
+# Remove order level rows duplicated by concurrent refreshes (Same values, keep one)
+DEDUPLICATE_SQL = '''
+DELETE FROM order_orderdailystat AS stat
+USING order_orderdailystat AS other_stat
+WHERE
+    stat.publisher_id IS NULL
+    AND other_stat.publisher_id IS NULL
+    AND stat.date = other_stat.date
+    AND stat.created_by_id = other_stat.created_by_id
+    AND stat.status = other_stat.status
+    AND stat.id > other_stat.id
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0015_order_location'),
+    ]
+
+    operations = [
+        migrations.RunSQL(DEDUPLICATE_SQL, reverse_sql=migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='orderdailystat',
+            constraint=models.UniqueConstraint(condition=models.Q(('publisher__isnull', True)), fields=('date', 'created_by', 'status'), name='order_daily_stat_unique_order_row'),
+        ),
+    ]
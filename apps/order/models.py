@@ -1,10 +1,13 @@
 import uuid
+import datetime
 
+from django.core.cache import cache
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _, gettext
 from django.core.exceptions import ValidationError
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Cast
 from apps.book.models import Book
 
 
@@ -36,22 +39,65 @@ class OrderWindow(models.Model):
     def __str__(self):
         return f'{self.title} :: {self.start_date} - {self.end_date}'
 
+    # Active window is cached in-process and in the shared cache (per window type and date)
+    ACTIVE_WINDOW_CACHE_KEY = 'order-window-active-{type}-{date}'
+    # In-process entries are kept for short time as other processes can't invalidate them
+    # NOTE: Other processes can serve a changed window for up to ACTIVE_WINDOW_LOCAL_CACHE_TIMEOUT after save/delete
+    ACTIVE_WINDOW_LOCAL_CACHE_TIMEOUT = 60  # Seconds
+    # {(type, date): (expire_at, window)}
+    _active_window_local_cache = {}
+    _NOT_CACHED = object()
+
+    @staticmethod
+    def _get_next_midnight(date):
+        # Midnight in TIME_ZONE
+        return timezone.make_aware(datetime.datetime.combine(date + datetime.timedelta(days=1), datetime.time.min))
+
+    @classmethod
+    def get_active_window_by_type(cls, window_type):
+        now = timezone.now()
+        today = timezone.localdate(now)
+        local_cache_key = (window_type, today)
+        local_cache = cls._active_window_local_cache.get(local_cache_key)
+        if local_cache and local_cache[0] > now:
+            return local_cache[1]
+
+        cache_key = cls.ACTIVE_WINDOW_CACHE_KEY.format(type=window_type, date=today)
+        window = cache.get(cache_key, cls._NOT_CACHED)
+        is_cached = window is not cls._NOT_CACHED
+        if not is_cached:
+            window = cls.objects.filter(
+                start_date__lte=today,
+                end_date__gte=today,
+                type=window_type,
+            ).first()
+        # Expire at end_date boundary for active window (windows of same type don't overlap),
+        # else at midnight as a window can start next day
+        expire_at = cls._get_next_midnight(window.end_date if window else today)
+        if not is_cached:
+            cache.set(cache_key, window, timeout=(expire_at - now).total_seconds())
+        cls._active_window_local_cache[local_cache_key] = (
+            min(expire_at, now + datetime.timedelta(seconds=cls.ACTIVE_WINDOW_LOCAL_CACHE_TIMEOUT)),
+            window,
+        )
+        return window
+
+    @classmethod
+    def clear_active_window_cache(cls):
+        today = timezone.localdate()
+        cls._active_window_local_cache.clear()
+        cache.delete_many([
+            cls.ACTIVE_WINDOW_CACHE_KEY.format(type=window_type, date=today)
+            for window_type in cls.OrderWindowType.values
+        ])
+
     @classmethod
     def get_active_window(cls, user):
         from apps.user.models import User
-        now_date = timezone.now().date()
         if user.user_type == User.UserType.SCHOOL_ADMIN:
-            return cls.objects.filter(
-                start_date__lte=now_date,
-                end_date__gte=now_date,
-                type=cls.OrderWindowType.SCHOOL
-            ).first()
+            return cls.get_active_window_by_type(cls.OrderWindowType.SCHOOL.value)
         elif user.user_type == User.UserType.INSTITUTIONAL_USER:
-            return cls.objects.filter(
-                start_date__lte=now_date,
-                end_date__gte=now_date,
-                type=cls.OrderWindowType.INSTITUTION
-            ).first()
+            return cls.get_active_window_by_type(cls.OrderWindowType.INSTITUTION.value)
         return None
 
     def clean(self):
@@ -96,7 +142,17 @@ class OrderWindow(models.Model):
     def save(self, *args, **kwargs):
         # Making sure clean is always called
         self.clean()
-        return super().save(*args, **kwargs)
+        resp = super().save(*args, **kwargs)
+        self.clear_active_window_cache()
+        # Clear again after commit, value can be cached from old state by other requests in between
+        transaction.on_commit(self.clear_active_window_cache)
+        return resp
+
+    def delete(self, *args, **kwargs):
+        resp = super().delete(*args, **kwargs)
+        self.clear_active_window_cache()
+        transaction.on_commit(self.clear_active_window_cache)
+        return resp
 
 
 class CartItem(models.Model):
@@ -166,6 +222,8 @@ class BookOrder(models.Model):
         verbose_name=_('Grade'), blank=True, null=True
     )
 
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Updated at'))
+
     class Meta:
         verbose_name = _('Book Order')
         verbose_name_plural = _('Book Orders')
@@ -191,9 +249,39 @@ class BookOrder(models.Model):
         self.total_price = self.price * self.quantity
 
     def save(self, *args, **kwargs):
-        if self.pk is None:  # Create
+        is_new = self.pk is None
+        if is_new:  # Create
             self._set_book_attributes()
-        return super().save(*args, **kwargs)
+        resp = super().save(*args, **kwargs)
+        if is_new:
+            # NOTE: Book orders created from cart use bulk_create and set totals directly
+            self._increment_order_totals()
+        BookOrderFact.refresh_book_orders([self.pk])
+        # Publisher rollup rows are computed from the facts
+        transaction.on_commit(lambda: OrderDailyStat.refresh([self.order_id]))
+        return resp
+
+    def _increment_order_totals(self):
+        """
+        Add this new book order to the denormalized totals of the order (Single UPDATE)
+        """
+        distinct_book_increment = 0
+        if self.book_id is not None:
+            distinct_book_increment = models.Case(
+                models.When(
+                    models.Exists(
+                        BookOrder.objects.filter(order=models.OuterRef('pk'), book=self.book_id).exclude(pk=self.pk)
+                    ),
+                    then=0,
+                ),
+                default=1,
+                output_field=models.IntegerField(),
+            )
+        Order.objects.filter(pk=self.order_id).update(
+            total_quantity=models.F('total_quantity') + self.quantity,
+            distinct_book_count=models.F('distinct_book_count') + distinct_book_increment,
+            updated_at=timezone.now(),
+        )
 
 
 class Order(models.Model):
@@ -226,6 +314,25 @@ class Order(models.Model):
         default=Status.PENDING,
         verbose_name=_("Order status")
     )
+    # Denormalized from book orders (Used by order lists, summaries and reports)
+    total_quantity = models.PositiveIntegerField(default=0, verbose_name=_('Total quantity'))
+    distinct_book_count = models.PositiveIntegerField(default=0, verbose_name=_('Distinct book count'))
+    # Location of the created_by user when the order was placed (Used by district/municipality filters)
+    province = models.ForeignKey(
+        'common.Province', verbose_name=_('Province'), related_name='+',
+        on_delete=models.SET_NULL, null=True, blank=True
+    )
+    district = models.ForeignKey(
+        'common.District', verbose_name=_('District'), related_name='+',
+        on_delete=models.SET_NULL, null=True, blank=True
+    )
+    municipality = models.ForeignKey(
+        'common.Municipality', verbose_name=_('Municipality'), related_name='+',
+        on_delete=models.SET_NULL, null=True, blank=True
+    )
+
+    # NOTE: Bulk/raw updates need to set it too (Used as the data export watermark)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Updated at'))
 
     class Meta:
         verbose_name = _('Order')
@@ -234,6 +341,18 @@ class Order(models.Model):
     def __str__(self):
         return self.status
 
+    @staticmethod
+    def get_book_order_totals(book_orders):
+        """
+        Return (total_quantity, distinct_book_count) for given book orders (or cart items)
+        """
+        total_quantity = 0
+        book_ids = set()
+        for book_order in book_orders:
+            total_quantity += book_order.quantity
+            book_ids.add(book_order.book_id)
+        return total_quantity, len(book_ids)
+
 
 class OrderActivityLog(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='activity_logs')
@@ -249,3 +368,335 @@ class OrderActivityLog(models.Model):
 
     class Meta:
         ordering = ('-id',)
+
+
+class OrderDailyStat(models.Model):
+    """
+    Daily rollup of orders used by dashboard stats (OrderStatType)
+    Rows with publisher=None contain order level totals, others contain publisher book order totals (from BookOrderFact).
+    """
+    # Number of orders processed per sync iteration
+    SYNC_CHUNK_SIZE = 1000
+    SYNC_LAG = timezone.timedelta(minutes=1)
+
+    date = models.DateField(verbose_name=_('Date'))
+    created_by = models.ForeignKey(
+        'user.User',
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name=_('Created by')
+    )
+    publisher = models.ForeignKey(
+        'publisher.Publisher',
+        on_delete=models.CASCADE,
+        related_name='+',
+        null=True,
+        blank=True,
+        verbose_name=_('Publisher')
+    )
+    status = models.CharField(max_length=40, choices=Order.Status.choices, verbose_name=_('Order status'))
+    order_count = models.PositiveIntegerField(default=0, verbose_name=_('Order count'))
+    quantity = models.BigIntegerField(default=0, verbose_name=_('Quantity'))
+    value = models.BigIntegerField(default=0, verbose_name=_('Value'))
+
+    class Meta:
+        verbose_name = _('Order daily stat')
+        verbose_name_plural = _('Order daily stats')
+        unique_together = ('date', 'created_by', 'publisher', 'status')
+        constraints = [
+            # NOTE: unique_together doesn't cover NULL publisher (order level rows)
+            models.UniqueConstraint(
+                fields=['date', 'created_by', 'status'],
+                condition=models.Q(publisher__isnull=True),
+                name='order_daily_stat_unique_order_row',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'date'], name='order_daily_stat_status_date'),
+        ]
+
+    def __str__(self):
+        return f'{self.date} - {self.status}'
+
+    @staticmethod
+    def _annotate_date(qs, created_at_field):
+        # NOTE: Same date cast used by the previous OrderStatType aggregation
+        return qs.annotate(stat_date=Cast(created_at_field, models.DateField()))
+
+    @classmethod
+    def refresh(cls, order_ids):
+        """
+        Recompute rollup rows for the (date, created_by) of provided orders
+        """
+        order_keys = set(
+            cls._annotate_date(
+                Order.objects.filter(id__in=order_ids), 'created_at'
+            ).values_list('stat_date', 'created_by').distinct()
+        )
+        if not order_keys:
+            return
+        with transaction.atomic():
+            # Serialize refreshes, concurrent delete + create of the same rows can conflict.
+            # Rows are computed after the lock so that changes committed by the previous holder are included.
+            OrderDailyStatSync.lock()
+            cls._refresh(order_keys)
+
+    @classmethod
+    def _refresh(cls, order_keys):
+        dates = {date for date, _ in order_keys}
+        users = {user for _, user in order_keys}
+
+        order_qs = cls._annotate_date(
+            Order.objects.filter(created_by__in=users), 'created_at'
+        ).filter(stat_date__in=dates).order_by()
+        fact_qs = cls._annotate_date(
+            BookOrderFact.objects.filter(created_by__in=users), 'created_at'
+        ).filter(stat_date__in=dates).order_by()
+
+        stats = [
+            cls(
+                date=row['stat_date'],
+                created_by_id=row['created_by'],
+                status=row['status'],
+                order_count=row['stat_order_count'],
+                quantity=row['stat_quantity'] or 0,
+                value=row['stat_value'] or 0,
+            )
+            for row in order_qs.values('stat_date', 'created_by', 'status').annotate(
+                stat_order_count=models.Count('id'),
+                stat_quantity=models.Sum('total_quantity'),
+                stat_value=models.Sum('total_price'),
+            )
+        ]
+        stats.extend([
+            cls(
+                date=row['stat_date'],
+                created_by_id=row['created_by'],
+                publisher_id=row['publisher'],
+                status=row['status'],
+                order_count=row['stat_order_count'],
+                quantity=row['stat_quantity'] or 0,
+                value=row['stat_value'] or 0,
+            )
+            for row in fact_qs.values('stat_date', 'created_by', 'publisher', 'status').annotate(
+                stat_order_count=models.Count('order', distinct=True),
+                stat_quantity=models.Sum('quantity'),
+                stat_value=models.Sum('value'),
+            )
+        ])
+        cls.objects.filter(created_by__in=users, date__in=dates).delete()
+        cls.objects.bulk_create(stats)
+
+    @classmethod
+    def sync(cls):
+        """
+        Add orders created after the high-water mark to the rollup
+        """
+        # NOTE: Skip recent orders, their transaction may not be committed yet (lower id can commit later)
+        created_before = timezone.now() - cls.SYNC_LAG
+        while True:
+            with transaction.atomic():
+                # Lock the high-water mark so that concurrent runs process orders only once
+                sync_state = OrderDailyStatSync.lock()
+                order_ids = list(
+                    Order.objects.filter(
+                        id__gt=sync_state.last_order_id,
+                        created_at__lt=created_before,
+                    ).order_by('id').values_list('id', flat=True)[:cls.SYNC_CHUNK_SIZE]
+                )
+                if order_ids:
+                    cls.refresh(order_ids)
+                    sync_state.last_order_id = order_ids[-1]
+                sync_state.synced_at = timezone.now()
+                sync_state.save(update_fields=('last_order_id', 'synced_at'))
+            if len(order_ids) < cls.SYNC_CHUNK_SIZE:
+                break
+
+
+class OrderDailyStatSync(models.Model):
+    """
+    High-water mark for OrderDailyStat (Single row)
+    """
+    SINGLETON_ID = 1
+
+    last_order_id = models.BigIntegerField(default=0, verbose_name=_('Last synced order id'))
+    synced_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Synced at'))
+
+    def __str__(self):
+        return str(self.last_order_id)
+
+    @classmethod
+    def lock(cls):
+        """
+        Lock the row till the end of current transaction (Also used to serialize OrderDailyStat.refresh)
+        """
+        cls.objects.get_or_create(pk=cls.SINGLETON_ID)
+        return cls.objects.select_for_update().get(pk=cls.SINGLETON_ID)
+
+
+class BookOrderFact(models.Model):
+    """
+    Denormalized book order line used by reports and OrderDailyStat publisher rows (One row per BookOrder)
+    Created/updated with the book order (refresh) and kept in sync on order status change (sync_status)
+    """
+    book_order = models.OneToOneField(
+        BookOrder, on_delete=models.CASCADE, related_name='fact', verbose_name=_('Book order'),
+    )
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='+', verbose_name=_('Order'))
+    order_window = models.ForeignKey(
+        OrderWindow, on_delete=models.SET_NULL, related_name='+', null=True, blank=True, verbose_name=_('Order window'),
+    )
+    status = models.CharField(max_length=40, choices=Order.Status.choices, verbose_name=_('Order status'))
+    created_at = models.DateTimeField(verbose_name=_('Order placed at'))
+    created_by = models.ForeignKey(
+        'user.User', on_delete=models.CASCADE, related_name='+', verbose_name=_('Created by'),
+    )
+    user_type = models.CharField(max_length=40, verbose_name=_('User type'))
+    school = models.ForeignKey(
+        'school.School', on_delete=models.SET_NULL, related_name='+', null=True, blank=True, verbose_name=_('School'),
+    )
+    institution = models.ForeignKey(
+        'institution.Institution', on_delete=models.SET_NULL, related_name='+', null=True, blank=True,
+        verbose_name=_('Institution'),
+    )
+    # Location of the school/institution
+    province = models.ForeignKey(
+        'common.Province', on_delete=models.SET_NULL, related_name='+', null=True, blank=True,
+        verbose_name=_('Province'),
+    )
+    district = models.ForeignKey(
+        'common.District', on_delete=models.SET_NULL, related_name='+', null=True, blank=True,
+        verbose_name=_('District'),
+    )
+    municipality = models.ForeignKey(
+        'common.Municipality', on_delete=models.SET_NULL, related_name='+', null=True, blank=True,
+        verbose_name=_('Municipality'),
+    )
+    publisher = models.ForeignKey(
+        'publisher.Publisher', on_delete=models.CASCADE, related_name='+', verbose_name=_('Publisher'),
+    )
+    book = models.ForeignKey(
+        'book.Book', on_delete=models.SET_NULL, related_name='+', null=True, blank=True, verbose_name=_('Book'),
+    )
+    grade = models.CharField(choices=Book.Grade.choices, max_length=40, null=True, blank=True, verbose_name=_('Grade'))
+    language = models.CharField(
+        choices=Book.LanguageType.choices, max_length=40, null=True, blank=True, verbose_name=_('Language'),
+    )
+    quantity = models.PositiveIntegerField(verbose_name=_('Quantity'))
+    value = models.BigIntegerField(verbose_name=_('Value'))
+
+    class Meta:
+        verbose_name = _('Book order fact')
+        verbose_name_plural = _('Book order facts')
+        indexes = [
+            models.Index(fields=['status', 'order_window'], name='book_order_fact_status_window'),
+            models.Index(fields=['status', 'district'], name='book_order_fact_status_dist'),
+            models.Index(fields=['status', 'municipality'], name='book_order_fact_status_muni'),
+            models.Index(fields=['status', 'publisher'], name='book_order_fact_status_pub'),
+            models.Index(fields=['status', 'grade'], name='book_order_fact_status_grade'),
+            models.Index(fields=['status', 'language'], name='book_order_fact_status_lang'),
+            models.Index(fields=['created_by', 'status'], name='book_order_fact_user_status'),
+        ]
+
+    def __str__(self):
+        return str(self.book_order_id)
+
+    # Number of orders refreshed per reconcile iteration
+    RECONCILE_CHUNK_SIZE = 1000
+
+    @classmethod
+    def refresh(cls, order_ids):
+        """
+        Recompute fact rows of provided orders (Use after creating/changing book orders)
+        """
+        cls._refresh(BookOrder.objects.filter(order__in=order_ids), cls.objects.filter(order__in=order_ids))
+
+    @classmethod
+    def refresh_book_orders(cls, book_order_ids):
+        """
+        Recompute fact rows of provided book orders (Used by BookOrder.save)
+        """
+        cls._refresh(BookOrder.objects.filter(id__in=book_order_ids), cls.objects.filter(book_order__in=book_order_ids))
+
+    @classmethod
+    def _refresh(cls, book_order_qs, fact_qs):
+        book_order_qs = book_order_qs.values(
+            'id',
+            'order',
+            'order__assigned_order_window',
+            'order__status',
+            'order__created_at',
+            'order__created_by',
+            'order__created_by__user_type',
+            'order__created_by__school',
+            'order__created_by__institution',
+            'order__province',
+            'order__district',
+            'order__municipality',
+            'publisher',
+            'book',
+            'grade',
+            'language',
+            'quantity',
+            'total_price',
+        )
+        facts = [
+            cls(
+                book_order_id=row['id'],
+                order_id=row['order'],
+                order_window_id=row['order__assigned_order_window'],
+                status=row['order__status'],
+                created_at=row['order__created_at'],
+                created_by_id=row['order__created_by'],
+                user_type=row['order__created_by__user_type'],
+                school_id=row['order__created_by__school'],
+                institution_id=row['order__created_by__institution'],
+                province_id=row['order__province'],
+                district_id=row['order__district'],
+                municipality_id=row['order__municipality'],
+                publisher_id=row['publisher'],
+                book_id=row['book'],
+                grade=row['grade'],
+                language=row['language'],
+                quantity=row['quantity'],
+                value=row['total_price'],
+            )
+            for row in book_order_qs
+        ]
+        with transaction.atomic():
+            fact_qs.delete()
+            cls.objects.bulk_create(facts)
+
+    @classmethod
+    def sync_status(cls, order_ids):
+        """
+        Copy order status to the fact rows (Single UPDATE, use after order status change)
+        """
+        cls.objects.filter(order__in=order_ids).update(
+            status=models.Subquery(
+                Order.objects.filter(pk=models.OuterRef('order')).values('status')[:1]
+            ),
+        )
+
+    @classmethod
+    def reconcile(cls):
+        """
+        Refresh orders with missing or out of sync fact rows (Changes made outside of BookOrder.save/mutations)
+        OrderDailyStat rows of those orders are refreshed as well.
+        """
+        order_ids = set(
+            BookOrder.objects.filter(fact__isnull=True).values_list('order', flat=True).distinct()
+        ) | set(
+            cls.objects.filter(
+                ~models.Q(status=models.F('order__status')) |
+                ~models.Q(publisher=models.F('book_order__publisher')) |
+                ~models.Q(quantity=models.F('book_order__quantity')) |
+                ~models.Q(value=models.F('book_order__total_price'))
+            ).values_list('order', flat=True).distinct()
+        )
+        order_ids = sorted(order_ids)
+        for index in range(0, len(order_ids), cls.RECONCILE_CHUNK_SIZE):
+            chunk_order_ids = order_ids[index: index + cls.RECONCILE_CHUNK_SIZE]
+            cls.refresh(chunk_order_ids)
+            OrderDailyStat.refresh(chunk_order_ids)
+        return len(order_ids)
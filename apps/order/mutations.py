@@ -16,6 +16,7 @@ from apps.order.serializers import (
     CartItemSerializer,
     CreateOrderFromCartSerializer,
     OrderUpdateSerializer,
+    BulkOrderStatusUpdateSerializer,
 )
 
 
@@ -97,6 +98,25 @@ class UpdateOrder(OrderMutationMixin, CreateUpdateGrapheneMutation):
     permissions = [UserPermissions.Permission.UPDATE_ORDER]
 
 
+BulkOrderStatusUpdateInputType = generate_input_type_for_serializer(
+    'BulkOrderStatusUpdateInputType',
+    serializer_class=BulkOrderStatusUpdateSerializer
+)
+
+
+class BulkUpdateOrderStatus(CreateUpdateGrapheneMutation):
+    class Arguments:
+        data = BulkOrderStatusUpdateInputType(required=True)
+    model = Order
+    serializer_class = BulkOrderStatusUpdateSerializer
+    result = graphene.List(graphene.NonNull(OrderType))
+    permissions = [UserPermissions.Permission.UPDATE_ORDER]
+
+
+class ModeratorMutation():
+    bulk_update_order_status = BulkUpdateOrderStatus.Field()
+
+
 class Mutation(graphene.ObjectType):
     create_cart_item = CreateCartItem.Field()
     update_cart_item = UpdateCartItem.Field()
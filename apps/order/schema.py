@@ -5,8 +5,6 @@ from graphene_django import DjangoObjectType
 from graphene_django_extras import PageGraphqlPagination, DjangoObjectField
 
 from django.db.models import QuerySet, F, Sum, Count
-from django.db.models.fields import DateField
-from django.db.models.functions import Cast
 
 from utils.graphene.types import CustomDjangoListObjectType, FileFieldType
 from utils.graphene.fields import DjangoPaginatedListObjectField, CustomDjangoListField
@@ -21,6 +19,7 @@ from .models import (
     BookOrder,
     OrderWindow,
     OrderActivityLog,
+    OrderDailyStat,
 )
 from .filters import (
     BookOrderFilterSet,
@@ -38,19 +37,23 @@ def get_cart_items_qs(info):
     )
 
 
-def get_orders_qs(info):
+def get_user_orders_qs(user):
     def _qs():
-        if info.context.user.user_type == User.UserType.PUBLISHER.value:
+        if user.user_type == User.UserType.PUBLISHER.value:
             return Order.objects.filter(
-                book_order__publisher=info.context.user.publisher, created_by__is_deactivated=False
+                book_order__publisher=user.publisher, created_by__is_deactivated=False
             )
-        elif info.context.user.user_type == User.UserType.MODERATOR.value:
+        elif user.user_type == User.UserType.MODERATOR.value:
             return Order.objects.filter(created_by__is_deactivated=False)
-        return Order.objects.filter(created_by=info.context.user)
+        return Order.objects.filter(created_by=user)
     # Making sure only distinct orders are fetched
     return _qs().distinct()
 
 
+def get_orders_qs(info):
+    return get_user_orders_qs(info.context.user)
+
+
 class OrderWindowType(DjangoObjectType):
     type = graphene.Field(OrderWindowTypeEnum)
 
@@ -148,7 +151,7 @@ class OrderType(DjangoObjectType):
 
     class Meta:
         model = Order
-        fields = ('id', 'order_code', 'total_price', 'created_by', 'status', 'created_at')
+        fields = ('id', 'order_code', 'total_price', 'created_by', 'status', 'created_at', 'distinct_book_count')
 
     @staticmethod
     def get_custom_queryset(queryset, info):
@@ -163,9 +166,6 @@ class OrderType(DjangoObjectType):
     def resolve_book_orders(root, info, **kwargs):
         return root.book_order.select_related('publisher')
 
-    @staticmethod
-    def resolve_total_quantity(root, info, **kwargs):
-        return root.book_order.aggregate(Sum('quantity'))['quantity__sum']
 
 
 class OrderListType(CustomDjangoListObjectType):
@@ -179,6 +179,17 @@ class OrderStatisticType(graphene.ObjectType):
     total_quantity = graphene.Int()
 
 
+def get_order_daily_stat_qs(info):
+    user = info.context.user
+    if user.user_type == User.UserType.PUBLISHER.value:
+        return OrderDailyStat.objects.filter(publisher=user.publisher, created_by__is_deactivated=False)
+    # Order level rows
+    qs = OrderDailyStat.objects.filter(publisher__isnull=True)
+    if user.user_type == User.UserType.MODERATOR.value:
+        return qs.filter(created_by__is_deactivated=False)
+    return qs.filter(created_by=user)
+
+
 def get_stat_daterange():
     stat_to = timezone.now()
     return stat_to - timezone.timedelta(90), stat_to
@@ -193,6 +204,16 @@ class OrderStatType(graphene.ObjectType):
     class Meta:
         fields = ()
 
+    @staticmethod
+    def get_completed_stat_qs(root):
+        # NOTE: root is OrderDailyStat queryset
+        stat_from, stat_to = get_stat_daterange()
+        return root.filter(
+            status=Order.Status.COMPLETED.value,
+            date__gte=stat_from.date(),
+            date__lte=stat_to.date(),
+        )
+
     @staticmethod
     def resolve_total_books_uploaded(root, info, **kwargs):
         '''
@@ -209,38 +230,27 @@ class OrderStatType(graphene.ObjectType):
         '''
         Returns total orders completed in last 3 months
         '''
-        stat_from, stat_to = get_stat_daterange()
-        return root.filter(
-            status=Order.Status.COMPLETED.value,
-            created_at__gte=stat_from,
-            created_at__lte=stat_to
-        ).count()
+        return OrderStatType.get_completed_stat_qs(root).aggregate(total=Sum('order_count'))['total'] or 0
 
     @staticmethod
     def resolve_total_books_ordered(root, info, **kwargs):
         '''
         Returns total books ordered in last 3 months
         '''
-        stat_from, stat_to = get_stat_daterange()
-        return root.filter(
-            status=Order.Status.COMPLETED.value,
-            created_at__gte=stat_from,
-            created_at__lte=stat_to
-        ).aggregate(Sum('book_order__quantity'))['book_order__quantity__sum']
+        return OrderStatType.get_completed_stat_qs(root).aggregate(total=Sum('quantity'))['total']
 
     @staticmethod
     def resolve_stat(root, info, **kwargs):
         '''
         Returns order stat of in last 3 months
         '''
-        stat_from, stat_to = get_stat_daterange()
-        return root.filter(
-            status=Order.Status.COMPLETED.value,
-            created_at__gte=stat_from,
-            created_at__lte=stat_to
-        ).annotate(created_at_date=Cast('created_at', DateField())).values('created_at_date').annotate(
-            total_quantity=Sum('book_order__quantity')
-        ).values('created_at_date', 'total_quantity')
+        stat_qs = OrderStatType.get_completed_stat_qs(root).order_by().values('date').annotate(
+            total=Sum('quantity')
+        ).order_by('date').values_list('date', 'total')
+        return [
+            dict(created_at_date=created_at_date, total_quantity=total_quantity)
+            for created_at_date, total_quantity in stat_qs
+        ]
 
 
 class OrderSummaryType(graphene.ObjectType):
@@ -286,11 +296,13 @@ class Query(graphene.ObjectType):
         current_user = info.context.user
         if current_user.user_type == User.UserType.SCHOOL_ADMIN:
             order_qs = Order.objects.filter(created_by=current_user, status=Order.Status.PENDING)
-            return order_qs.aggregate(
-                total_books=Count('book_order__book', distinct=True),
-                total_books_quantity=Sum('book_order__quantity'),
-                total_price=Sum('book_order__total_price'),
+            # NOTE: Unique book count is across orders, so it can't be summed from Order.distinct_book_count
+            summary = BookOrder.objects.filter(order__in=order_qs).aggregate(
+                total_books=Count('book', distinct=True),
+                total_price=Sum('total_price'),
             )
+            summary['total_books_quantity'] = order_qs.aggregate(total=Sum('total_quantity'))['total']
+            return summary
 
     @staticmethod
     def resolve_order_window_active(root, info, **kwargs) -> Union[None, OrderWindow]:
@@ -310,7 +322,7 @@ class Query(graphene.ObjectType):
 
     def resolve_order_stat(root, info, **kwargs):
         if info.context.user.is_authenticated:
-            return get_orders_qs(info)
+            return get_order_daily_stat_qs(info)
         return None
 
 
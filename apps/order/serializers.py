@@ -1,9 +1,10 @@
 from rest_framework import serializers
-from django.db.models import F, Sum
+from django.db.models import F, Q, Sum
+from django.utils import timezone
 from django.utils.translation import gettext
 from django.db import transaction
 
-from config.serializers import CreatedUpdatedBaseSerializer
+from config.serializers import CreatedUpdatedBaseSerializer, IntegerIDField
 
 from apps.user.models import User
 from apps.book.models import WishList
@@ -14,9 +15,12 @@ from .models import (
     BookOrder,
     OrderWindow,
     OrderActivityLog,
+    BookOrderFact,
 )
-from .tasks import send_notification
+from .tasks import send_notification, send_bulk_notification, schedule_order_daily_stat_refresh
 from apps.package.models import SchoolPackage, InstitutionPackage
+from apps.common.tasks import schedule_school_report_snapshot_refresh
+from apps.payment.models import UserLedger
 
 
 class CartItemSerializer(CreatedUpdatedBaseSerializer, serializers.ModelSerializer):
@@ -79,9 +83,14 @@ class CreateOrderFromCartSerializer(CreatedUpdatedBaseSerializer, serializers.Mo
         # Create order
         data['created_by'] = created_by
         data['assigned_order_window'] = active_order_window
-        total_price = cart_items.aggregate(Sum('total_price'))['total_price__sum']
-        cart_items.aggregate(Sum('total_price'))['total_price__sum']
-        data['total_price'] = total_price
+        # Snapshot of the user's location
+        data['province_id'] = created_by.province_id
+        data['district_id'] = created_by.district_id
+        data['municipality_id'] = created_by.municipality_id
+        # Evaluate cart once, it is used for totals and book orders
+        cart_items = list(cart_items.select_related('book', 'book__publisher'))
+        data['total_price'] = sum(cart_item.total_price for cart_item in cart_items)
+        data['total_quantity'], data['distinct_book_count'] = Order.get_book_order_totals(cart_items)
         data['cart_items'] = cart_items
         return data
 
@@ -101,13 +110,15 @@ class CreateOrderFromCartSerializer(CreatedUpdatedBaseSerializer, serializers.Mo
             book_order._set_book_attributes()
             book_orders.append(book_order)
         BookOrder.objects.bulk_create(book_orders)
+        BookOrderFact.refresh([order.id])
+        UserLedger.refresh([order.created_by_id])
         # Remove books form withlist
         book_ids = CartItem.objects\
             .filter(created_by=validated_data['created_by'])\
             .values_list('book', flat=True)
         WishList.objects.filter(book_id__in=book_ids).delete()
         # Clear cart
-        cart_items.delete()
+        CartItem.objects.filter(id__in=[cart_item.id for cart_item in cart_items]).delete()
         # Send notification
         transaction.on_commit(
             lambda: send_notification.delay(order.id)
@@ -176,6 +187,10 @@ class OrderUpdateSerializer(serializers.ModelSerializer):
         )
         # Update
         updated_order = super().update(instance, data)
+        BookOrderFact.sync_status([updated_order.id])
+        UserLedger.refresh([updated_order.created_by_id])
+        schedule_order_daily_stat_refresh(Order.objects.filter(id=updated_order.id))
+        schedule_school_report_snapshot_refresh(Order.objects.filter(id=updated_order.id))
         # Send notification
         transaction.on_commit(
             lambda: send_notification.delay(updated_order.id)
@@ -184,3 +199,100 @@ class OrderUpdateSerializer(serializers.ModelSerializer):
 
     def create(self, data):
         raise Exception('Not allowed')
+
+
+class BulkOrderStatusUpdateSerializer(serializers.ModelSerializer):
+    '''
+    This serializer is used to update status of multiple orders at once
+    '''
+    orders = serializers.ListField(child=IntegerIDField(), allow_empty=False)
+    comment = serializers.CharField(required=False)
+
+    class Meta:
+        model = Order
+        fields = ('orders', 'status', 'comment')
+        extra_kwargs = {
+            'status': {'required': True},
+        }
+
+    def validate(self, data):
+        data['current_status_by_order'] = self.get_current_status_by_order(data['orders'], data['status'])
+        return data
+
+    def get_current_status_by_order(self, order_ids, status, lock=False):
+        """
+        Validate orders and status transition, returns {order_id: current_status}
+        With lock, orders are locked till the end of current transaction (Status can't change after the check)
+        """
+        order_ids = set(order_ids)
+        user = self.context['request'].user
+        order_qs = Order.objects.filter(id__in=order_ids)
+        if user.user_type == User.UserType.SCHOOL_ADMIN:
+            # If user is SCHOOL_ADMIN, then the order should be created by that user
+            order_qs = order_qs.filter(created_by=user)
+        if lock:
+            order_qs = order_qs.select_for_update().order_by('id')
+        current_status_by_order = dict(order_qs.values_list('id', 'status'))
+
+        if missing_order_ids := order_ids - set(current_status_by_order.keys()):
+            raise serializers.ValidationError(
+                gettext('Orders not found: %(ids)s' % dict(ids=', '.join(map(str, sorted(missing_order_ids)))))
+            )
+        # NOTE: Same validation as OrderUpdateSerializer but for all orders at once
+        packed_order_ids = set(
+            Order.objects.filter(
+                Q(school_related_orders__school=F('created_by')) |
+                Q(institution_related_orders__institution=F('created_by')),
+                id__in=order_ids,
+            ).values_list('id', flat=True)
+        )
+        if packed_order_ids:
+            raise serializers.ValidationError(
+                gettext('Orders are packed, you can not change status: %(ids)s' % dict(
+                    ids=', '.join(map(str, sorted(packed_order_ids)))
+                ))
+            )
+        allowed_current_statuses = {
+            current_status
+            for current_status, new_status in OrderUpdateSerializer.STATUS_CHANGE_ALLOWED_PERMISSION.get(user.user_type, [])
+            if new_status == status
+        }
+        not_allowed_current_statuses = set(current_status_by_order.values()) - allowed_current_statuses
+        if not_allowed_current_statuses:
+            raise serializers.ValidationError(
+                gettext('Changing from %(current_status)s to %(status)s is not allowed!!' % dict(
+                    current_status=', '.join(sorted(not_allowed_current_statuses)),
+                    status=status,
+                ))
+            )
+        return current_status_by_order
+
+    def create(self, data):
+        status = data['status']
+        comment = data.get('comment', '')
+        order_ids = list(data['current_status_by_order'].keys())
+        with transaction.atomic():
+            # Lock and validate again, status of the orders may have changed after validate
+            current_status_by_order = self.get_current_status_by_order(order_ids, status, lock=True)
+            # Create logs
+            OrderActivityLog.objects.bulk_create([
+                OrderActivityLog(
+                    order_id=order_id,
+                    created_by=self.context['request'].user,
+                    system_generated_comment=f"Changed status from {current_status} to {status}",
+                    comment=comment,
+                )
+                for order_id, current_status in current_status_by_order.items()
+            ])
+            # Update
+            order_qs = Order.objects.filter(id__in=order_ids)
+            order_qs.update(status=status, updated_at=timezone.now())
+            BookOrderFact.sync_status(order_ids)
+            UserLedger.refresh_for_orders(order_qs)
+            schedule_order_daily_stat_refresh(order_qs)
+            schedule_school_report_snapshot_refresh(order_qs)
+        # Send notification
+        transaction.on_commit(
+            lambda: send_bulk_notification.delay(order_ids)
+        )
+        return order_qs
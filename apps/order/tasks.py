@@ -1,10 +1,12 @@
+from collections import Counter
+
 from celery import shared_task
 from django.utils.translation import gettext_lazy as _
 from django.db import transaction
 
-from apps.order.models import Order
+from apps.order.models import Order, OrderDailyStat, BookOrderFact
 from apps.notification.models import Notification
-from apps.common.tasks import generic_email_sender
+from apps.common.tasks import generic_email_sender, send_generic_emails
 import logging
 
 logger = logging.getLogger(__name__)
@@ -81,3 +83,88 @@ def send_notification(order_id):
         title = _('Book order cancelled.')
         notification_type = Notification.NotificationType.ORDER_CANCELLED.value
         send_notification_to_customer(order_obj, notification_type, title)
+
+
+@shared_task(name="bulk_notification_sender")
+def send_bulk_notification(order_ids, chunk_size=500):
+    """
+    Send notifications for orders with changed status (Used by bulk status update)
+    In app notification is sent per order, mail is sent per recipient and status using a single connection.
+    """
+    notification_by_status = {
+        Order.Status.COMPLETED.value: (
+            _('Book order completed.'), Notification.NotificationType.ORDER_COMPLETED.value,
+            _('%(count)d book orders completed.'),
+        ),
+        Order.Status.CANCELLED.value: (
+            _('Book order cancelled.'), Notification.NotificationType.ORDER_CANCELLED.value,
+            _('%(count)d book orders cancelled.'),
+        ),
+    }
+    # {(recipient, status): order count}
+    order_count_by_recipient = Counter()
+    recipients = {}
+    for index in range(0, len(order_ids), chunk_size):
+        orders = list(
+            Order.objects.filter(
+                id__in=order_ids[index: index + chunk_size],
+                status__in=notification_by_status.keys(),
+            ).select_related('created_by')
+        )
+        # Send in app notification
+        Notification.objects.bulk_create([
+            Notification(
+                content_object=order,
+                recipient=order.created_by,
+                notification_type=notification_by_status[order.status][1],
+                title=notification_by_status[order.status][0],
+            ) for order in orders
+        ])
+        for order in orders:
+            order_count_by_recipient[(order.created_by_id, order.status)] += 1
+            recipients[order.created_by_id] = order.created_by
+
+    # Send mail notification
+    emails = []
+    for (recipient_id, status), order_count in order_count_by_recipient.items():
+        recipient = recipients[recipient_id]
+        title, _notification_type, multiple_title = notification_by_status[status]
+        title = str(title) if order_count == 1 else str(multiple_title) % dict(count=order_count)
+        emails.append((
+            title, title, [recipient.email], {
+                "heading": title,
+                "message": title,
+                "full_name": recipient.full_name,
+            },
+        ))
+    send_generic_emails(emails)
+
+
+@shared_task(name="order_daily_stat_sync")
+def sync_order_daily_stat():
+    OrderDailyStat.sync()
+
+
+@shared_task(name="order_daily_stat_refresh")
+def refresh_order_daily_stat(order_ids):
+    OrderDailyStat.refresh(order_ids)
+
+
+def schedule_order_daily_stat_refresh(order_qs):
+    """
+    Refresh rollup for given orders after current transaction is committed (Use after order status change)
+    """
+    order_ids = list(order_qs.values_list('id', flat=True))
+    if order_ids:
+        transaction.on_commit(
+            lambda: refresh_order_daily_stat.delay(order_ids)
+        )
+
+
+@shared_task(name="book_order_fact_reconcile")
+def reconcile_book_order_facts():
+    """
+    Fix any drift of the fact table from changes made outside of the mutations (admin, shell, bulk updates)
+    """
+    order_count = BookOrderFact.reconcile()
+    logger.info(f'Book order fact: {order_count} orders reconciled')
@@ -2,7 +2,7 @@ from django.utils import timezone
 
 from apps.common.tests.test_permissions import TestPermissions
 from apps.user.models import User
-from apps.order.models import Order
+from apps.order.models import Order, BookOrder, OrderDailyStat, BookOrderFact
 from apps.book.models import Book
 
 from apps.user.factories import UserFactory
@@ -76,7 +76,12 @@ class TestOrderState(TestPermissions):
         )
         super().setUp()
 
+    def refresh_order_daily_stat(self):
+        # NOTE: Rollup is updated by celery beat and order status changes, refresh it for orders created by factories
+        OrderDailyStat.refresh(Order.objects.values_list('id', flat=True))
+
     def test_admin_can_see_overall_stat(self):
+        self.refresh_order_daily_stat()
         self.force_login(self.super_admin)
         content = self.query_check(self.order_stat)
         order_stat = content['data']['orderStat']
@@ -93,6 +98,7 @@ class TestOrderState(TestPermissions):
         # ------------------------------------
         # Test for first publisher
         # ------------------------------------
+        self.refresh_order_daily_stat()
         self.force_login(self.publisher_user_1)
         content = self.query_check(self.order_stat)
         order_stat = content['data']['orderStat']
@@ -123,6 +129,7 @@ class TestOrderState(TestPermissions):
             order=order, book=self.book_1, quantity=10,
             grade=Book.Grade.GRADE_1.value, language=Book.LanguageType.ENGLISH.value
         )
+        self.refresh_order_daily_stat()
         self.force_login(self.school_admin_user)
         content = self.query_check(self.order_stat)
         order_stat = content['data']['orderStat']
@@ -135,8 +142,26 @@ class TestOrderState(TestPermissions):
             order=order, book=self.book_1, quantity=30,
             grade=Book.Grade.GRADE_1.value, language=Book.LanguageType.ENGLISH.value
         )
+        self.refresh_order_daily_stat()
         self.force_login(self.individual_user)
         content = self.query_check(self.order_stat)
         order_stat = content['data']['orderStat']
         self.assertEqual(order_stat['stat'][0]['createdAtDate'], str(self.stat_to.date()))
         self.assertEqual(order_stat['stat'][0]['totalQuantity'], 30)
+
+    def test_stat_follows_book_order_changes(self):
+        self.refresh_order_daily_stat()
+        self.force_login(self.publisher_user_1)
+        # BookOrder.save refreshes the fact row and the rollup after commit
+        book_order = BookOrder.objects.get(book=self.book_1)
+        book_order.quantity = 10
+        with self.captureOnCommitCallbacks(execute=True):
+            book_order.save()
+        content = self.query_check(self.order_stat)
+        self.assertEqual(content['data']['orderStat']['totalBooksOrdered'], 15)
+
+        # Changes bypassing BookOrder.save are fixed by the reconcile job
+        BookOrder.objects.filter(book=self.book_2).update(quantity=15)
+        self.assertEqual(BookOrderFact.reconcile(), 1)
+        content = self.query_check(self.order_stat)
+        self.assertEqual(content['data']['orderStat']['totalBooksOrdered'], 25)
@@ -1,15 +1,21 @@
+import io
+from unittest import mock
+
+from django.urls import reverse
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+from openpyxl import load_workbook
 
 from utils.graphene.tests import GraphQLTestCase
 
 from apps.user.models import User
-from apps.order.models import Order, OrderWindow
+from apps.order.models import Order, OrderWindow, BookOrderFact
 from apps.book.models import Book
 
 from apps.user.factories import UserFactory
 from apps.book.factories import BookFactory, WishListFactory
 from apps.publisher.factories import PublisherFactory
+from apps.school.factories import SchoolFactory
 from apps.order.factories import (
     BookOrderFactory,
     CartItemFactory,
@@ -52,6 +58,21 @@ class TestOrder(GraphQLTestCase):
         }
     '''
 
+    BULK_UPDATE_ORDER_STATUS_MUTATION = '''
+        mutation Mutation($input: BulkOrderStatusUpdateInputType!) {
+          moderatorMutation {
+            bulkUpdateOrderStatus(data: $input) {
+              ok
+              errors
+              result {
+                id
+                status
+              }
+            }
+          }
+        }
+    '''
+
     CART_QUERY = '''
         query MyQuery {
           cartItems {
@@ -82,6 +103,16 @@ class TestOrder(GraphQLTestCase):
         }
     '''
 
+    ORDERS_BY_LOCATION_QUERY = '''
+        query MyQuery($districts: [ID!], $municipalities: [ID!]) {
+          orders(districts: $districts, municipalities: $municipalities) {
+            results {
+              id
+            }
+          }
+        }
+    '''
+
     WISH_LIST_QUERY = '''
         query MyQuery {
           wishList {
@@ -141,6 +172,8 @@ class TestOrder(GraphQLTestCase):
         self.query_check(self.CREATE_ORDER_FROM_CART_MUTATION, okay=False)
 
         # Create order (With active order window)
+        self.user.school = SchoolFactory.create()
+        self.user.save()
         active_order_window = OrderWindowFactory.create(
             start_date=self.now_datetime.date() - timezone.timedelta(9),
             end_date=self.now_datetime.date() + timezone.timedelta(10),
@@ -174,6 +207,68 @@ class TestOrder(GraphQLTestCase):
             self.book1.price * self.cart_item_1.quantity + self.book2.price * self.cart_item_2.quantity
         )
 
+        # Test should persist order totals
+        order = Order.objects.get(created_by=self.user)
+        self.assertEqual(order.total_quantity, self.cart_item_1.quantity + self.cart_item_2.quantity)
+        self.assertEqual(order.distinct_book_count, 2)
+
+        # Test should snapshot location of the user
+        school = self.user.school
+        self.assertEqual(
+            (order.province_id, order.district_id, order.municipality_id),
+            (school.province_id, school.district_id, school.municipality_id),
+        )
+
+        # Test should create order facts
+        facts = BookOrderFact.objects.filter(order=order).order_by('book_id')
+        self.assertEqual(
+            list(facts.values_list('book_id', 'order_window_id', 'status', 'quantity', 'value')),
+            sorted([
+                (
+                    cart_item.book_id,
+                    active_order_window.pk,
+                    Order.Status.PENDING.value,
+                    cart_item.quantity,
+                    cart_item.book.price * cart_item.quantity,
+                )
+                for cart_item in [self.cart_item_1, self.cart_item_2]
+            ]),
+        )
+
+    def test_book_order_updates_order_totals(self):
+        order = OrderFactory.create(created_by=self.user)
+        BookOrderFactory.create(order=order, book=self.book1, quantity=2)
+        BookOrderFactory.create(order=order, book=self.book1, quantity=3)
+        BookOrderFactory.create(order=order, book=self.book2, quantity=4)
+        order.refresh_from_db()
+        self.assertEqual((order.total_quantity, order.distinct_book_count), (9, 2))
+
+    def test_order_location_filter(self):
+        school_1, school_2 = SchoolFactory.create_batch(2)
+        orders_1, orders_2 = [
+            OrderFactory.create_batch(
+                2,
+                created_by=UserFactory.create(user_type=User.UserType.SCHOOL_ADMIN, school=school),
+                province=school.province,
+                district=school.district,
+                municipality=school.municipality,
+            )
+            for school in [school_1, school_2]
+        ]
+        self.force_login(UserFactory.create(user_type=User.UserType.MODERATOR))
+
+        def _query_order_ids(**filters):
+            content = self.query_check(self.ORDERS_BY_LOCATION_QUERY, variables=filters)
+            return {int(order['id']) for order in content['data']['orders']['results']}
+
+        self.assertEqual(_query_order_ids(), {order.pk for order in [*orders_1, *orders_2]})
+        self.assertEqual(_query_order_ids(districts=[school_1.district_id]), {order.pk for order in orders_1})
+        self.assertEqual(_query_order_ids(municipalities=[school_2.municipality_id]), {order.pk for order in orders_2})
+        self.assertEqual(
+            _query_order_ids(districts=[school_1.district_id], municipalities=[school_2.municipality_id]),
+            set(),
+        )
+
     def test_order_update(self):
         school_user1 = UserFactory.create(user_type=User.UserType.SCHOOL_ADMIN)
         school_user2 = UserFactory.create(user_type=User.UserType.SCHOOL_ADMIN)
@@ -243,6 +338,97 @@ class TestOrder(GraphQLTestCase):
                 assert len(response['data']['updateOrder']['result']['activityLog']) > 0
             order.save(update_fields=('status',))  # Revert back status for next user
 
+    def test_bulk_order_status_update(self):
+        school_user = UserFactory.create(user_type=User.UserType.SCHOOL_ADMIN)
+        moderator_user = UserFactory.create(user_type=User.UserType.MODERATOR)
+
+        pending_orders = OrderFactory.create_batch(3, created_by=school_user)
+        in_transit_orders = OrderFactory.create_batch(2, created_by=school_user, status=Order.Status.IN_TRANSIT)
+        for order in in_transit_orders:
+            BookOrderFactory.create(order=order)
+        BookOrderFact.refresh([order.pk for order in in_transit_orders])
+
+        def _query_check(orders, status, **kwargs):
+            return self.query_check(
+                self.BULK_UPDATE_ORDER_STATUS_MUTATION,
+                minput={
+                    'orders': [str(order.pk) for order in orders],
+                    'status': self.genum(status),
+                    'comment': 'Bulk update',
+                },
+                **kwargs,
+            )
+
+        # Only moderator is allowed
+        self.force_login(school_user)
+        _query_check(pending_orders, Order.Status.CANCELLED, assert_for_error=True)
+
+        self.force_login(moderator_user)
+        # PENDING -> COMPLETED is not allowed, so whole batch should fail
+        _query_check(
+            [*pending_orders, *in_transit_orders], Order.Status.COMPLETED, okay=False, mnested=['moderatorMutation']
+        )
+        self.assertEqual(Order.objects.filter(status=Order.Status.COMPLETED).count(), 0)
+
+        content = _query_check(in_transit_orders, Order.Status.COMPLETED, okay=True, mnested=['moderatorMutation'])
+        result = content['data']['moderatorMutation']['bulkUpdateOrderStatus']['result']
+        self.assertEqual(len(result), 2)
+        self.assertEqual({item['status'] for item in result}, {self.genum(Order.Status.COMPLETED)})
+        # Order facts should follow the order status
+        self.assertEqual(
+            set(BookOrderFact.objects.filter(order__in=in_transit_orders).values_list('status', flat=True)),
+            {Order.Status.COMPLETED.value},
+        )
+
+        with self.captureOnCommitCallbacks(execute=True), mock.patch('apps.order.tasks.send_generic_emails') as send_emails:
+            _query_check(pending_orders, Order.Status.CANCELLED, okay=True, mnested=['moderatorMutation'])
+        # Single mail per recipient
+        emails = send_emails.call_args[0][0]
+        self.assertEqual(len(emails), 1)
+        self.assertEqual(emails[0][0], '3 book orders cancelled.')
+        self.assertEqual(emails[0][2], [school_user.email])
+        for order in pending_orders:
+            order.refresh_from_db()
+            self.assertEqual(order.status, Order.Status.CANCELLED)
+            self.assertEqual(order.activity_logs.count(), 1)
+
+    def test_order_export(self):
+        school_user = UserFactory.create(user_type=User.UserType.SCHOOL_ADMIN)
+        moderator_user = UserFactory.create(user_type=User.UserType.MODERATOR)
+        pending_order = OrderFactory.create(created_by=school_user)
+        completed_order = OrderFactory.create(created_by=school_user, status=Order.Status.COMPLETED)
+        BookOrderFactory.create_batch(2, order=pending_order, quantity=2)
+        BookOrderFactory.create_batch(3, order=completed_order, quantity=1)
+        export_url = reverse('order:export_orders')
+
+        # Anonymous user are not allowed
+        response = self.client.get(export_url)
+        self.assertEqual(response.status_code, 403)
+
+        self.force_login(moderator_user)
+        response = self.client.get(export_url, {'status': [Order.Status.PENDING.value]})
+        self.assertEqual(response.status_code, 200)
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        # Header + book orders of pending order
+        self.assertEqual(len(rows), 3)
+        self.assertTrue(all(row.startswith(str(pending_order.pk)) for row in rows[1:]))
+
+        response = self.client.get(export_url, {'export_type': 'xlsx', 'status': [Order.Status.COMPLETED.value]})
+        self.assertEqual(response.status_code, 200)
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        rows = list(workbook.active.iter_rows(values_only=True))
+        # Header + book orders of completed order
+        self.assertEqual(len(rows), 4)
+        self.assertTrue(all(row[0] == completed_order.pk for row in rows[1:]))
+
+        # Invalid filters are rejected instead of exporting all orders
+        for params in [
+            {'status': ['unknown-status']},
+            {'users': ['abc']},
+        ]:
+            response = self.client.get(export_url, params)
+            self.assertEqual(response.status_code, 400)
+
     def test_order_summary(self):
         user = UserFactory.create(user_type=User.UserType.SCHOOL_ADMIN)
         publisher = PublisherFactory.create()
@@ -390,3 +576,24 @@ class OrderWindowTest(GraphQLTestCase):
                 endDate=order_window.end_date.isoformat(),
             )
         )
+
+    def test_active_window_cache(self):
+        user = UserFactory.create(user_type=User.UserType.SCHOOL_ADMIN)
+        order_window = OrderWindowFactory.create(
+            start_date=self.now_datetime.date() - timezone.timedelta(9),
+            end_date=self.now_datetime.date() + timezone.timedelta(10),
+            type=OrderWindow.OrderWindowType.SCHOOL,
+        )
+        self.assertEqual(OrderWindow.get_active_window(user), order_window)
+        # Cached value should be used
+        with self.assertNumQueries(0):
+            self.assertEqual(OrderWindow.get_active_window(user), order_window)
+        # Shared cache should be used when in-process cache is not available
+        OrderWindow._active_window_local_cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(OrderWindow.get_active_window(user), order_window)
+
+        # Save should invalidate the cache
+        order_window.start_date = self.now_datetime.date() + timezone.timedelta(1)
+        order_window.save()
+        self.assertEqual(OrderWindow.get_active_window(user), None)
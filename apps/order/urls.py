@@ -0,0 +1,9 @@
+from django.urls import path
+
+from apps.order.views import export_orders
+
+app_name = 'order'
+
+urlpatterns = [
+    path('export/', export_orders, name='export_orders'),
+]
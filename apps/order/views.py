@@ -0,0 +1,117 @@
+import csv
+import datetime
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import StreamingHttpResponse, FileResponse, HttpResponseBadRequest, JsonResponse
+from django.utils import timezone
+from openpyxl import Workbook
+
+from .models import BookOrder
+from .filters import OrderExportFilterSet
+from .schema import get_user_orders_qs
+
+
+class Echo:
+    """
+    An object that implements just the write method of the file-like interface.
+    https://docs.djangoproject.com/en/3.2/howto/outputting-csv/#streaming-large-csv-files
+    """
+    def write(self, value):
+        return value
+
+
+class OrderExport:
+    CSV = 'csv'
+    XLSX = 'xlsx'
+
+    ITERATOR_CHUNK_SIZE = 2000
+
+    HEADERS = [
+        'Order ID', 'Order code', 'Order status', 'Order placed at', 'Order window',
+        'Created by', 'Created by email',
+        'Book title', 'ISBN', 'Edition', 'Publisher', 'Grade', 'Language',
+        'Price', 'Quantity', 'Total price',
+    ]
+    FIELDS = [
+        'order_id', 'order__order_code', 'order__status', 'order__created_at', 'order__assigned_order_window__title',
+        'order__created_by__full_name', 'order__created_by__email',
+        'title', 'isbn', 'edition', 'publisher__name', 'grade', 'language',
+        'price', 'quantity', 'total_price',
+    ]
+
+    def __init__(self, user, filter_data):
+        self.user = user
+        self.filterset = OrderExportFilterSet(
+            data=filter_data,
+            queryset=get_user_orders_qs(user),
+        )
+
+    def get_rows(self):
+        # Flat values are fetched using server side cursor, so memory usage doesn't depend on row count
+        return BookOrder.objects.filter(
+            order__in=self.filterset.qs.values('id')
+        ).order_by('order_id', 'id').values_list(*self.FIELDS).iterator(chunk_size=self.ITERATOR_CHUNK_SIZE)
+
+    def get_filename(self, extension):
+        return f'orders-{timezone.now().strftime("%Y%m%d-%H%M%S")}.{extension}'
+
+    def export_csv(self):
+        writer = csv.writer(Echo())
+
+        def _generate():
+            yield writer.writerow(self.HEADERS)
+            for row in self.get_rows():
+                yield writer.writerow(row)
+
+        response = StreamingHttpResponse(_generate(), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{self.get_filename(self.CSV)}"'
+        return response
+
+    def export_xlsx(self):
+        # Write-only workbook streams rows to a temporary file, so memory usage doesn't depend on row count
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet('Orders')
+        ws.append(self.HEADERS)
+        for row in self.get_rows():
+            ws.append([
+                # openpyxl doesn't support timezone aware datetime and UUID
+                timezone.localtime(value).replace(tzinfo=None) if isinstance(value, datetime.datetime) else
+                str(value) if field == 'order__order_code' else value
+                for field, value in zip(self.FIELDS, row)
+            ])
+        export_file = tempfile.TemporaryFile(dir=settings.TEMP_DIR)
+        wb.save(export_file)
+        export_file.seek(0)
+        # FileResponse sends the file in blocks and closes it after the response is sent
+        return FileResponse(
+            export_file,
+            as_attachment=True,
+            filename=self.get_filename(self.XLSX),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+
+
+def export_orders(request):
+    """
+    Export orders with book orders as csv or xlsx
+    Supports same filters as orders query. eg: ?export_type=xlsx&status=pending&order_windows=1&order_windows=2
+    """
+    if not request.user.is_authenticated:
+        raise PermissionDenied
+    filter_data = {
+        key: request.GET.getlist(key)
+        for key in request.GET.keys()
+        if key != 'export_type'
+    }
+    export_type = request.GET.get('export_type', OrderExport.CSV)
+    exporter = OrderExport(request.user, filter_data)
+    if not exporter.filterset.is_valid():
+        # NOTE: Invalid filters are skipped by django-filter, which would export all orders
+        return JsonResponse({'errors': exporter.filterset.errors.get_json_data()}, status=400)
+    if export_type == OrderExport.CSV:
+        return exporter.export_csv()
+    elif export_type == OrderExport.XLSX:
+        return exporter.export_xlsx()
+    return HttpResponseBadRequest('Invalid export_type')
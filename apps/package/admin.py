@@ -8,6 +8,7 @@ from apps.package.models import (
     CourierPackage,
     InstitutionPackage,
     InstitutionPackageBook,
+    PackageGenerationJob,
 )
 
 
@@ -45,6 +46,12 @@ class CourierPackageAdmin(admin.ModelAdmin):
     pass
 
 
+class PackageGenerationJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'order_window', 'status', 'stage', 'stage_done_rows', 'stage_total_rows', 'created_at')
+    list_filter = ('status',)
+    readonly_fields = ('created_by', 'created_at', 'started_at', 'stage_started_at', 'finished_at')
+
+
 admin.site.register(PublisherPackageBook, PublisherPackageBookAdmin)
 admin.site.register(PublisherPackage, PublisherPackageAdmin)
 admin.site.register(SchoolPackageBook, SchoolPackageBookAdmin)
@@ -52,3 +59,4 @@ admin.site.register(SchoolPackage, SchoolPackageAdmin)
 admin.site.register(CourierPackage, CourierPackageAdmin)
 admin.site.register(InstitutionPackage, InstitutionPackageAdmin)
 admin.site.register(InstitutionPackageBook, InstitutionPackageBookAdmin)
+admin.site.register(PackageGenerationJob, PackageGenerationJobAdmin)
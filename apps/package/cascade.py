@@ -0,0 +1,99 @@
+from django.db import connection
+
+from apps.order.models import Order
+from apps.package.models import (
+    SchoolPackage,
+    CourierPackage,
+    InstitutionPackage,
+)
+
+# NOTE: Courier, school and institution packages share the same status values
+ORDER_STATUS_BY_PACKAGE_STATUS = {
+    CourierPackage.Status.PENDING.value: Order.Status.PENDING.value,
+    CourierPackage.Status.IN_TRANSIT.value: Order.Status.IN_TRANSIT.value,
+    CourierPackage.Status.ISSUE.value: Order.Status.PENDING.value,
+    CourierPackage.Status.DELIVERED.value: Order.Status.COMPLETED.value,
+}
+
+
+def _get_user_package_cte(package_model, package_ids_sql):
+    """
+    CTEs updating the user (school/institution) packages and selecting their related orders
+    """
+    through_table = package_model.related_orders.through._meta.db_table
+    package_column = package_model.related_orders.field.m2m_column_name()
+    order_column = package_model.related_orders.field.m2m_reverse_name()
+    return (
+        f'''
+        UPDATE {package_model._meta.db_table} AS package
+        SET status = %(status)s, updated_at = NOW()
+        WHERE {package_ids_sql}
+        RETURNING package.id
+        ''',
+        f'''
+        SELECT related_order.{order_column} AS order_id
+        FROM {through_table} AS related_order
+        INNER JOIN {{package_cte}} ON related_order.{package_column} = {{package_cte}}.id
+        ''',
+    )
+
+
+def cascade_package_status(package_model, package_ids, status):
+    """
+    Update status of the packages and cascade it to the child packages (for courier packages) and related orders.
+    All the levels are updated by a single statement (Data-modifying CTEs).
+    Returns ids of the updated orders.
+    """
+    package_ids = list(package_ids)
+    if not package_ids:
+        return []
+    params = dict(
+        package_ids=package_ids,
+        status=status,
+        order_status=ORDER_STATUS_BY_PACKAGE_STATUS[status],
+    )
+
+    ctes = []
+    related_order_selects = []
+    if package_model == CourierPackage:
+        ctes.append((
+            'courier_package',
+            f'''
+            UPDATE {CourierPackage._meta.db_table}
+            SET status = %(status)s, updated_at = NOW()
+            WHERE id = ANY(%(package_ids)s)
+            RETURNING id
+            ''',
+        ))
+        user_package_models = [
+            ('school_package', SchoolPackage),
+            ('institution_package', InstitutionPackage),
+        ]
+        package_ids_sql = 'package.courier_package_id IN (SELECT id FROM courier_package)'
+    elif package_model in [SchoolPackage, InstitutionPackage]:
+        user_package_models = [('user_package', package_model)]
+        package_ids_sql = 'package.id = ANY(%(package_ids)s)'
+    else:
+        raise Exception(f'Unknown package model: {package_model}')
+
+    for cte_name, user_package_model in user_package_models:
+        package_cte, related_order_select = _get_user_package_cte(user_package_model, package_ids_sql)
+        ctes.append((cte_name, package_cte))
+        related_order_selects.append(related_order_select.format(package_cte=cte_name))
+    ctes.append(('related_order', ' UNION '.join(related_order_selects)))
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'WITH ' + ', '.join(
+                f'{cte_name} AS ({cte_sql})'
+                for cte_name, cte_sql in ctes
+            ) + f'''
+            UPDATE {Order._meta.db_table} AS "order"
+            SET status = %(order_status)s, updated_at = NOW()
+            FROM related_order
+            WHERE "order".id = related_order.order_id
+            RETURNING "order".id
+            ''',
+            params,
+        )
+        return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,33 @@
+from collections import defaultdict
+from django.db import models
+from django.db.models.functions import Coalesce
+from promise import Promise
+from django.utils.functional import cached_property
+
+from apps.order.models import Order
+from utils.graphene.dataloaders import DataLoaderWithContext, WithContextMixin
+
+
+class CourierPackageRelatedOrdersLoader(DataLoaderWithContext):
+    def batch_load_fn(self, keys):
+        # NOTE: An order belongs to either a school package or an institution package
+        order_qs = Order.objects.filter(
+            models.Q(school_related_orders__courier_package__in=keys) |
+            models.Q(institution_related_orders__courier_package__in=keys)
+        ).annotate(
+            courier_package_id=Coalesce(
+                models.F('school_related_orders__courier_package'),
+                models.F('institution_related_orders__courier_package'),
+            ),
+        ).order_by('id')
+        _map = defaultdict(list)
+        for order in order_qs:
+            _map[order.courier_package_id].append(order)
+
+        return Promise.resolve([_map[key] for key in keys])
+
+
+class DataLoaders(WithContextMixin):
+    @cached_property
+    def courier_package_related_orders(self):
+        return CourierPackageRelatedOrdersLoader(context=self.context)
@@ -8,22 +8,35 @@ from apps.package.models import (
     SchoolPackage,
     CourierPackage,
     InstitutionPackage,
+    PackageGenerationJob,
 )
 
 
 PublisherPackageStatusEnum = convert_enum_to_graphene_enum(PublisherPackage.Status, name='PublisherPackageStatusEnum')
+PublisherPackageExportStatusEnum = convert_enum_to_graphene_enum(
+    PublisherPackage.ExportStatus, name='PublisherPackageExportStatusEnum'
+)
 SchoolPackageStatusEnum = convert_enum_to_graphene_enum(SchoolPackage.Status, name='SchoolPackageStatusEnum')
 CourierPackageStatusEnum = convert_enum_to_graphene_enum(CourierPackage.Status, name='CourierPackageStatusEnum')
 InstitutionPackageStatusEnum = convert_enum_to_graphene_enum(InstitutionPackage.Status, name='InstitutionPackageStatusEnum')
 CourierPackageTypeEnum = convert_enum_to_graphene_enum(CourierPackage.Type, name='CourierPackageTypeEnum')
+PackageGenerationJobStatusEnum = convert_enum_to_graphene_enum(
+    PackageGenerationJob.Status, name='PackageGenerationJobStatusEnum'
+)
+PackageGenerationJobStageEnum = convert_enum_to_graphene_enum(
+    PackageGenerationJob.Stage, name='PackageGenerationJobStageEnum'
+)
 
 enum_map = {
     get_enum_name_from_django_field(field): enum
     for field, enum in (
         (PublisherPackage.status, PublisherPackageStatusEnum),
+        (PublisherPackage.orders_export_status, PublisherPackageExportStatusEnum),
         (SchoolPackage.status, SchoolPackageStatusEnum),
         (CourierPackage.status, CourierPackageStatusEnum),
         (InstitutionPackage.status, InstitutionPackageStatusEnum),
         (CourierPackage.type, CourierPackageTypeEnum),
+        (PackageGenerationJob.status, PackageGenerationJobStatusEnum),
+        (PackageGenerationJob.stage, PackageGenerationJobStageEnum),
     )
 }
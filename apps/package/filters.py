@@ -9,6 +9,7 @@ from apps.package.models import (
     CourierPackageLog,
     InstitutionPackage,
     InstitutionPackageLog,
+    PackageGenerationJob,
 )
 from apps.package.enums import (
     PublisherPackageStatusEnum,
@@ -16,6 +17,7 @@ from apps.package.enums import (
     CourierPackageStatusEnum,
     InstitutionPackageStatusEnum,
     CourierPackageTypeEnum,
+    PackageGenerationJobStatusEnum,
 )
 
 
@@ -154,3 +156,18 @@ class InstitutionPackageLogFilterSet(django_filters.FilterSet):
         if not value:
             return queryset
         return queryset.filter(comment__icontains=value)
+
+
+class PackageGenerationJobFilterSet(django_filters.FilterSet):
+
+    status = MultipleInputFilter(PackageGenerationJobStatusEnum, field_name='status')
+    order_windows = IDListFilter(method='filter_order_windows')
+
+    class Meta:
+        model = PackageGenerationJob
+        fields = ()
+
+    def filter_order_windows(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(order_window__in=value)
@@ -0,0 +1,447 @@
+import logging
+from collections import defaultdict, Counter
+
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db import connection
+from django.db.models import Sum, F, Q
+from django.utils.functional import cached_property
+
+from apps.order.models import Order, OrderWindow, BookOrder
+from apps.package.models import (
+    PublisherPackage, PublisherPackageBook,
+    SchoolPackage, SchoolPackageBook,
+    InstitutionPackage, InstitutionPackageBook,
+    CourierPackage,
+    PackageGenerationJob,
+)
+from apps.package.incentive import allocate_incentives
+from apps.package.plan import PackagePlan
+from apps.package.tasks import get_publisher_book_orders_qs, schedule_publisher_package_exports
+from apps.user.models import User
+
+logger = logging.getLogger(__name__)
+
+
+class PackageGenerator():
+    """
+    Generate packages for an order window.
+    Each stage can be run for a subset (chunk) of its keys, packages which already exists are skipped.
+    """
+    Stage = PackageGenerationJob.Stage
+
+    def __init__(self, order_window, log=None, order_ids=None):
+        self.order_window = order_window
+        self.log = log or logger.info
+        # Limit to the given orders (eg: orders frozen at the start of a package generation job)
+        self.order_ids = order_ids
+        if order_window.type == OrderWindow.OrderWindowType.SCHOOL.value:
+            self.is_school = True
+            self.user_field = 'school'
+            self.stages = [self.Stage.PUBLISHER_PACKAGE, self.Stage.COURIER_PACKAGE, self.Stage.SCHOOL_PACKAGE]
+            self.courier_package_type = CourierPackage.Type.SCHOOL.value
+        elif order_window.type == OrderWindow.OrderWindowType.INSTITUTION.value:
+            self.is_school = False
+            self.user_field = 'institution'
+            self.stages = [self.Stage.PUBLISHER_PACKAGE, self.Stage.COURIER_PACKAGE, self.Stage.INSTITUTION_PACKAGE]
+            self.courier_package_type = CourierPackage.Type.INSTITUTION.value
+        else:
+            raise Exception(f'Unknown order window type: {order_window.type}')
+        self.municipality_field = f'{self.user_field}__municipality'
+
+    @cached_property
+    def orders(self):
+        # Get orders belongs to order window
+        orders = Order.objects.filter(
+            book_order__publisher__isnull=False,
+            assigned_order_window__id=self.order_window.pk,
+            status=Order.Status.PENDING.value,
+            created_by__is_deactivated=False
+        )
+        if self.order_ids is not None:
+            orders = orders.filter(id__in=self.order_ids)
+        return orders
+
+    def get_order_ids(self):
+        return list(self.orders.order_by('id').values_list('id', flat=True).distinct())
+
+    @property
+    def book_orders(self):
+        return BookOrder.objects.filter(order__in=self.orders.values('id'))
+
+    @cached_property
+    def plan(self):
+        # NOTE: Plan cached by the preview (dry-run) is reused if the book orders/locations haven't changed
+        return PackagePlan(self.order_window, self.book_orders, self.municipality_field).get()
+
+    # ------------------------------------------------------------------
+    # Validation
+    # ------------------------------------------------------------------
+    def get_errors(self):
+        """
+        Return list of error messages, packages can't be generated if there are any errors
+        """
+        errors = []
+        user_ids = self.orders.values_list('created_by__id', flat=True)
+        mismatched_order_users = User.objects.filter(
+            id__in=user_ids, is_deactivated=False,
+            ledger__outstanding_balance__lt=0,
+        )
+        if mismatched_order_users.exists():
+            errors.append(
+                'Mismatched orders exists please fix those \n' + '\n'.join([
+                    'id = %s ---- full name = %s' % (user['id'], user['full_name'])
+                    for user in mismatched_order_users.values('id', 'full_name')
+                ])
+            )
+            return errors
+
+        # Check if unverified users exists and their profile, we need municipality
+        # to generate courier packages
+        unverified_users_qs = self.orders.filter(
+            Q(created_by__is_verified=False) | Q(**{f'created_by__{self.user_field}__isnull': True})
+        ).distinct()
+        if unverified_users_qs.exists():
+            errors.append(
+                'Following users are not verified or school profile is not attached \n' + '\n'.join([
+                    'id = %s ---- full name = %s' % (user['created_by__id'], user['created_by__full_name'])
+                    for user in unverified_users_qs.values('created_by__id', 'created_by__full_name')
+                ])
+            )
+        return errors
+
+    # ------------------------------------------------------------------
+    # Stages
+    # ------------------------------------------------------------------
+    def get_stage_keys(self, stage):
+        """
+        Sorted unique keys (publisher/municipality/user ids) processed by the stage
+        """
+        key_field = {
+            self.Stage.PUBLISHER_PACKAGE: 'publisher',
+            self.Stage.COURIER_PACKAGE: f'order__created_by__{self.municipality_field}',
+            self.Stage.SCHOOL_PACKAGE: 'order__created_by',
+            self.Stage.INSTITUTION_PACKAGE: 'order__created_by',
+        }[stage]
+        return list(
+            self.book_orders.order_by(key_field).values_list(key_field, flat=True).distinct()
+        )
+
+    def run_stage(self, stage, keys=None):
+        """
+        Create packages for given keys (All if keys is not provided)
+        """
+        return {
+            self.Stage.PUBLISHER_PACKAGE: self.create_publisher_packages,
+            self.Stage.COURIER_PACKAGE: self.create_courier_packages,
+            self.Stage.SCHOOL_PACKAGE: self.create_school_packages,
+            self.Stage.INSTITUTION_PACKAGE: self.create_institution_packages,
+        }[stage](keys)
+
+    def run(self):
+        for stage in self.stages:
+            self.run_stage(stage)
+        self.finalize()
+
+    def finalize(self):
+        """
+        Run after all the stages are completed, safe to run multiple times
+        """
+        # NOTE: Recomputed for the whole order window
+        allocate_incentives(self.order_window)
+        # Generate related orders export files (celery tasks after commit)
+        # NOTE: After incentive allocation, exports include the incentive books
+        schedule_publisher_package_exports(
+            PublisherPackage.objects.filter(
+                order_window=self.order_window,
+                orders_export_status=PublisherPackage.ExportStatus.PENDING.value,
+            ).values_list('id', flat=True)
+        )
+
+    @staticmethod
+    def _get_related_order_ids(related_book_orders):
+        return {
+            order_id
+            for related_book_order in related_book_orders
+            for order_id in related_book_order['related_order_ids']
+        }
+
+    def create_publisher_packages(self, publisher_ids=None):
+        # ------------------------------------------------------------------
+        # Create publisher packages
+        # ------------------------------------------------------------------
+        book_orders = self.book_orders
+        if publisher_ids is not None:
+            book_orders = book_orders.filter(publisher__in=publisher_ids)
+        existing_publisher_ids = set(
+            PublisherPackage.objects.filter(
+                order_window=self.order_window,
+                publisher__in=book_orders.values('publisher'),
+            ).values_list('publisher', flat=True)
+        )
+        publisher_book_orders = defaultdict(list)
+        for publisher_book_order in get_publisher_book_orders_qs(
+            book_orders.exclude(publisher__in=existing_publisher_ids)
+        ):
+            publisher_book_orders[publisher_book_order['publisher']].append(publisher_book_order)
+
+        # Create packages for each publishers
+        packages = PublisherPackage.objects.bulk_create([
+            PublisherPackage(
+                status=PublisherPackage.Status.PENDING.value,
+                publisher_id=publisher_id,
+                order_window=self.order_window,
+                total_quantity=sum(book_order['total_quantity'] for book_order in related_book_orders),
+                total_price=sum(book_order['total_price'] for book_order in related_book_orders),
+            )
+            for publisher_id, related_book_orders in publisher_book_orders.items()
+        ])
+        package_by_publisher = {
+            package.publisher_id: package
+            for package in packages
+        }
+
+        PublisherPackageBook.objects.bulk_create([
+            PublisherPackageBook(
+                book_id=related_book_order['book__id'],
+                quantity=related_book_order['total_quantity'],
+                publisher_package=package_by_publisher[publisher_id],
+            )
+            for publisher_id, related_book_orders in publisher_book_orders.items()
+            for related_book_order in related_book_orders
+        ])
+        PublisherPackageRelatedOrder = PublisherPackage.related_orders.through
+        PublisherPackageRelatedOrder.objects.bulk_create([
+            PublisherPackageRelatedOrder(
+                publisherpackage_id=package_by_publisher[publisher_id].pk,
+                order_id=order_id,
+            )
+            for publisher_id, related_book_orders in publisher_book_orders.items()
+            for order_id in self._get_related_order_ids(related_book_orders)
+        ])
+
+        self.log(f'{len(packages)} Publisher packages created.')
+        return packages
+
+    def create_courier_packages(self, municipality_ids=None):
+        # ------------------------------------------------------------------
+        # Create courier packages
+        # ------------------------------------------------------------------
+        # NOTE: Municipality aggregates are reused from the package plan
+        municipality_plans = self.plan['municipalities']
+        if municipality_ids is not None:
+            municipality_ids = set(municipality_ids)
+            municipality_plans = [
+                municipality_plan
+                for municipality_plan in municipality_plans
+                if municipality_plan['id'] in municipality_ids
+            ]
+        existing_municipality_ids = set(
+            CourierPackage.objects.filter(
+                order_window=self.order_window,
+                type=self.courier_package_type,
+                municipality__in=[municipality_plan['id'] for municipality_plan in municipality_plans],
+            ).values_list('municipality', flat=True)
+        )
+        courier_packages = CourierPackage.objects.bulk_create([
+            CourierPackage(
+                status=CourierPackage.Status.PENDING.value,
+                order_window=self.order_window,
+                municipality_id=municipality_plan['id'],
+                total_quantity=municipality_plan['total_quantity'],
+                total_price=municipality_plan['total_price'],
+                is_eligible_for_incentive=municipality_plan['is_eligible_for_incentive'],
+                type=self.courier_package_type,
+            )
+            for municipality_plan in municipality_plans
+            if municipality_plan['id'] not in existing_municipality_ids
+        ])
+        self.log(f'{len(courier_packages)} municipality/courier packages created.')
+        return courier_packages
+
+    def _get_user_book_orders(self, user_package_model, user_ids):
+        """
+        User-by-book aggregates of the orders (Single grouped query)
+        Returns {user_id: [book aggregate, ...]}
+        """
+        book_orders = self.book_orders
+        if user_ids is not None:
+            book_orders = book_orders.filter(order__created_by__in=user_ids)
+        existing_user_ids = user_package_model.objects.filter(
+            order_window=self.order_window,
+            **{f'{self.user_field}__in': book_orders.values('order__created_by')},
+        ).values(self.user_field)
+        user_book_orders_qs = book_orders.exclude(
+            order__created_by__in=existing_user_ids,
+        ).order_by().values('order__created_by', 'book').annotate(
+            total_quantity=Sum('quantity'),
+            total_price=Sum(F('quantity') * F('price')),
+            related_order_ids=ArrayAgg('order', distinct=True),
+            publisher_ids=ArrayAgg('publisher', distinct=True),
+            municipality_id=F(f'order__created_by__{self.municipality_field}'),
+        ).order_by('order__created_by', 'book')
+
+        user_book_orders = defaultdict(list)
+        for user_book_order in user_book_orders_qs:
+            user_book_orders[user_book_order['order__created_by']].append(user_book_order)
+        return user_book_orders
+
+    @staticmethod
+    def get_courier_package(courier_package_by_municipality, user_id, municipality_id):
+        courier_package = courier_package_by_municipality.get(municipality_id)
+        if courier_package is None:
+            # NOTE: Municipality of the user changed after the courier packages were created
+            raise Exception(
+                f'Courier package not found for municipality: {municipality_id} (user: {user_id}).'
+                ' Courier packages need to be regenerated.'
+            )
+        return courier_package
+
+    def get_courier_package_by_municipality(self):
+        return {
+            courier_package.municipality_id: courier_package
+            for courier_package in CourierPackage.objects.filter(
+                order_window=self.order_window,
+                type=self.courier_package_type,
+            )
+        }
+
+    def get_publisher_package_id_by_publisher(self):
+        return dict(
+            PublisherPackage.objects.filter(
+                order_window=self.order_window,
+            ).values_list('publisher', 'id')
+        )
+
+    def _increment_publisher_packages_incentive(self, incentive_by_publisher_package):
+        # Single UPDATE ... FROM (VALUES ...)
+        if not incentive_by_publisher_package:
+            return
+        values_sql = ', '.join(['(%s, %s)'] * len(incentive_by_publisher_package))
+        params = [
+            value
+            for package_id, incentive in incentive_by_publisher_package.items()
+            for value in (package_id, incentive)
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'''
+                UPDATE {PublisherPackage._meta.db_table} AS publisher_package
+                SET incentive = publisher_package.incentive + increment.value, updated_at = NOW()
+                FROM (VALUES {values_sql}) AS increment (id, value)
+                WHERE publisher_package.id = increment.id
+                ''',
+                params,
+            )
+
+    def create_school_packages(self, school_ids=None):
+        # ------------------------------------------------------------------
+        # Create school packages
+        # ------------------------------------------------------------------
+        user_book_orders = self._get_user_book_orders(SchoolPackage, school_ids)
+        courier_package_by_municipality = self.get_courier_package_by_municipality()
+        publisher_package_id_by_publisher = self.get_publisher_package_id_by_publisher()
+
+        # Create packages for each school
+        school_packages = []
+        incentive_by_publisher_package = Counter()
+        for school_id, related_book_orders in user_book_orders.items():
+            total_quantity = sum(book_order['total_quantity'] for book_order in related_book_orders)
+            is_eligible_for_incentive = self.order_window.enable_incentive and (
+                total_quantity >= self.order_window.incentive_quantity_threshold
+            )
+            school_packages.append(
+                SchoolPackage(
+                    status=SchoolPackage.Status.PENDING.value,
+                    school_id=school_id,
+                    order_window=self.order_window,
+                    courier_package=self.get_courier_package(
+                        courier_package_by_municipality, school_id, related_book_orders[0]['municipality_id'],
+                    ),
+                    total_quantity=total_quantity,
+                    total_price=sum(book_order['total_price'] for book_order in related_book_orders),
+                    is_eligible_for_incentive=is_eligible_for_incentive,
+                )
+            )
+            if is_eligible_for_incentive:
+                # Increment incentive of publisher packages related to the school orders
+                incentive_by_publisher_package.update({
+                    publisher_package_id_by_publisher[publisher_id]
+                    for related_book_order in related_book_orders
+                    for publisher_id in related_book_order['publisher_ids']
+                })
+        school_packages = SchoolPackage.objects.bulk_create(school_packages)
+        package_by_school = {
+            school_package.school_id: school_package
+            for school_package in school_packages
+        }
+        self._increment_publisher_packages_incentive(incentive_by_publisher_package)
+
+        SchoolPackageBook.objects.bulk_create([
+            SchoolPackageBook(
+                book_id=related_book_order['book'],
+                quantity=related_book_order['total_quantity'],
+                school_package=package_by_school[school_id],
+            )
+            for school_id, related_book_orders in user_book_orders.items()
+            for related_book_order in related_book_orders
+        ])
+        SchoolPackageRelatedOrder = SchoolPackage.related_orders.through
+        SchoolPackageRelatedOrder.objects.bulk_create([
+            SchoolPackageRelatedOrder(
+                schoolpackage_id=package_by_school[school_id].pk,
+                order_id=order_id,
+            )
+            for school_id, related_book_orders in user_book_orders.items()
+            for order_id in self._get_related_order_ids(related_book_orders)
+        ])
+
+        self.log(f'{len(school_packages)} School packages created.')
+        return school_packages
+
+    def create_institution_packages(self, institution_ids=None):
+        # ------------------------------------------------------------------
+        # Create institution packages
+        # ------------------------------------------------------------------
+        user_book_orders = self._get_user_book_orders(InstitutionPackage, institution_ids)
+        courier_package_by_municipality = self.get_courier_package_by_municipality()
+
+        # Create packages for each institution
+        institution_packages = InstitutionPackage.objects.bulk_create([
+            InstitutionPackage(
+                status=InstitutionPackage.Status.PENDING.value,
+                institution_id=institution_id,
+                order_window=self.order_window,
+                courier_package=self.get_courier_package(
+                    courier_package_by_municipality, institution_id, related_book_orders[0]['municipality_id'],
+                ),
+                total_quantity=sum(book_order['total_quantity'] for book_order in related_book_orders),
+                total_price=sum(book_order['total_price'] for book_order in related_book_orders),
+            )
+            for institution_id, related_book_orders in user_book_orders.items()
+        ])
+        package_by_institution = {
+            institution_package.institution_id: institution_package
+            for institution_package in institution_packages
+        }
+
+        InstitutionPackageBook.objects.bulk_create([
+            InstitutionPackageBook(
+                book_id=related_book_order['book'],
+                quantity=related_book_order['total_quantity'],
+                school_package=package_by_institution[institution_id],
+            )
+            for institution_id, related_book_orders in user_book_orders.items()
+            for related_book_order in related_book_orders
+        ])
+        InstitutionPackageRelatedOrder = InstitutionPackage.related_orders.through
+        InstitutionPackageRelatedOrder.objects.bulk_create([
+            InstitutionPackageRelatedOrder(
+                institutionpackage_id=package_by_institution[institution_id].pk,
+                order_id=order_id,
+            )
+            for institution_id, related_book_orders in user_book_orders.items()
+            for order_id in self._get_related_order_ids(related_book_orders)
+        ])
+
+        self.log(f'{len(institution_packages)} Institution packages created.')
+        return institution_packages
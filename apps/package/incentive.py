@@ -0,0 +1,159 @@
+import bisect
+import json
+import logging
+import os
+from collections import defaultdict, Counter
+
+from django.conf import settings
+from django.db import models
+from django.db.models.functions import Least
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from apps.order.models import OrderWindow
+from apps.package.models import SchoolPackage, PublisherPackage
+
+logger = logging.getLogger(__name__)
+
+
+class IncentiveCatalogue():
+    """
+    Incentive books for each incentive quantity (tier), loaded and indexed lazily.
+    Catalogue format: {'book_list_<incentive quantity>': [{book_name, price, publisher_name, quantity, internal_code}]}
+    NOTE: Incentive quantity without a tier in the catalogue uses the nearest lower tier
+    """
+    CATALOGUE_PATH = os.path.join(settings.BASE_DIR, 'apps/package/seed/incentive_books.json')
+    TIER_KEY_PREFIX = 'book_list_'
+
+    def __init__(self, path=CATALOGUE_PATH):
+        self.path = path
+        self._books_by_publisher_by_tier = {}
+        self._tier_by_incentive_quantity = {}
+
+    @cached_property
+    def books_by_tier(self):
+        with open(self.path) as fp:
+            catalogue = json.load(fp)
+        return {
+            int(key[len(self.TIER_KEY_PREFIX):]): books
+            for key, books in catalogue.items()
+        }
+
+    @cached_property
+    def tiers(self):
+        return sorted(self.books_by_tier.keys())
+
+    def get_tier(self, incentive_quantity):
+        """
+        Returns the catalogue tier for the incentive quantity (None if below the lowest tier)
+        """
+        if incentive_quantity not in self._tier_by_incentive_quantity:
+            tier = None
+            index = bisect.bisect_right(self.tiers, incentive_quantity)
+            if index:
+                tier = self.tiers[index - 1]
+            if incentive_quantity and tier != incentive_quantity:
+                logger.warning(
+                    f'No incentive books tier for incentive quantity: {incentive_quantity}, using tier: {tier}'
+                )
+            self._tier_by_incentive_quantity[incentive_quantity] = tier
+        return self._tier_by_incentive_quantity[incentive_quantity]
+
+    def get_books(self, incentive_quantity):
+        return self.books_by_tier.get(self.get_tier(incentive_quantity), [])
+
+    def get_books_by_publisher(self, incentive_quantity):
+        """
+        Returns {internal_code: [book, ...]} for the tier (Indexed on first use)
+        """
+        if incentive_quantity not in self._books_by_publisher_by_tier:
+            books_by_publisher = defaultdict(list)
+            for book in self.get_books(incentive_quantity):
+                books_by_publisher[book['internal_code']].append(book)
+            self._books_by_publisher_by_tier[incentive_quantity] = dict(books_by_publisher)
+        return self._books_by_publisher_by_tier[incentive_quantity]
+
+    def get_total_price(self, incentive_quantity):
+        return sum(book['quantity'] * book['price'] for book in self.get_books(incentive_quantity))
+
+
+incentive_catalogue = IncentiveCatalogue()
+
+
+def get_incentive_quantity_expression(order_window):
+    """
+    Incentive quantity of school packages of the order window (Same as SchoolPackage.incentive_query_generator)
+    NOTE: Doesn't use joins so that it can be used in update()
+    """
+    if not order_window.enable_incentive:
+        return models.Value(0, output_field=models.IntegerField())
+    return models.Case(
+        models.When(
+            total_quantity__gte=order_window.incentive_quantity_threshold,
+            then=Least(
+                models.F('total_quantity') * order_window.incentive_multiplier,
+                models.Value(order_window.incentive_max),
+            ),
+        ),
+        default=models.Value(0),
+        output_field=models.IntegerField(),
+    )
+
+
+def allocate_incentives(order_window, catalogue=incentive_catalogue):
+    """
+    Compute incentive of school packages and allocate incentive books to publisher packages
+    """
+    if order_window.type != OrderWindow.OrderWindowType.SCHOOL.value:
+        return
+    school_packages = SchoolPackage.objects.filter(order_window=order_window)
+
+    # Per school incentive quantity (Single UPDATE)
+    school_packages.update(
+        incentive_quantity=get_incentive_quantity_expression(order_window),
+        updated_at=timezone.now(),
+    )
+    school_count_by_tier = dict(
+        school_packages.filter(incentive_quantity__gt=0).order_by().values('incentive_quantity').annotate(
+            count=models.Count('id'),
+        ).values_list('incentive_quantity', 'count')
+    )
+    # Per school incentive price (Single UPDATE, price is same for same tier)
+    school_packages.update(
+        incentive_price=models.Case(
+            *[
+                models.When(incentive_quantity=tier, then=models.Value(int(catalogue.get_total_price(tier))))
+                for tier in school_count_by_tier.keys()
+            ],
+            default=models.Value(0),
+            output_field=models.IntegerField(),
+        ) if school_count_by_tier else models.Value(0),
+        updated_at=timezone.now(),
+    )
+
+    # Incentive books for each publisher: {internal_code: {(book_name, price): quantity}}
+    book_quantity_by_publisher = defaultdict(Counter)
+    for tier, school_count in school_count_by_tier.items():
+        for internal_code, books in catalogue.get_books_by_publisher(tier).items():
+            book_quantity = book_quantity_by_publisher[internal_code]
+            for book in books:
+                book_quantity[(book['book_name'], book['price'])] += book['quantity'] * school_count
+
+    publisher_packages = list(
+        PublisherPackage.objects.filter(order_window=order_window).select_related('publisher')
+    )
+    for publisher_package in publisher_packages:
+        book_quantity = book_quantity_by_publisher.get(publisher_package.publisher.internal_code, {})
+        publisher_package.incentive_books = [
+            dict(book_name=book_name, price=price, quantity=quantity)
+            for (book_name, price), quantity in sorted(book_quantity.items())
+        ]
+        publisher_package.incentive_quantity = sum(book_quantity.values())
+        publisher_package.incentive_price = int(sum(
+            price * quantity
+            for (_, price), quantity in book_quantity.items()
+        ))
+        publisher_package.updated_at = timezone.now()
+    PublisherPackage.objects.bulk_update(
+        publisher_packages, ('incentive_books', 'incentive_quantity', 'incentive_price', 'updated_at'),
+    )
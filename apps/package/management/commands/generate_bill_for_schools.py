@@ -1,21 +1,133 @@
-from openpyxl.workbook import Workbook
 import os
+import tempfile
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
-from django.db import transaction
-from django.db.models import Sum
+from openpyxl import Workbook
+
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.storage import default_storage
+from django.db.models import F
 from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.text import slugify
+
 from apps.order.models import OrderWindow, BookOrder
 from apps.package.models import SchoolPackage
-from apps.package.seed.incentive import INCENTIVE_BOOKS
+from apps.package.incentive import incentive_catalogue
+
+
+def write_school_bill(bill, directory):
+    """
+    Write bill of a school using write-only workbook (No database access, runs in worker processes)
+    """
+    school_detail = f"{bill['school_name']} / {bill['district_name']} / {bill['municipality_name']}"
+    wb = Workbook(write_only=True)
+    sheet = wb.create_sheet(f"{bill['school_name']} - {bill['municipality_name']}"[:31])
+    sheet.append([school_detail])
+    sheet.append([])
+    sheet.append(['Book Name', 'Publisher Name', 'Quantity', 'Price', 'Sub Total', 'Total'])
+
+    total_book_order_price = 0
+    total_book_order_quantity = 0
+    for book_order in bill['book_orders']:
+        sub_total = book_order['quantity'] * book_order['price']
+        sheet.append([
+            book_order['title'],
+            book_order['publisher_name'],
+            book_order['quantity'],
+            book_order['price'],
+            sub_total,
+            book_order['total_price'],
+        ])
+        total_book_order_price += sub_total
+        total_book_order_quantity += book_order['quantity']
+
+    sheet.append([])
+    sheet.append(['', '', 'Total Quantity', total_book_order_quantity, 'Total Price', total_book_order_price])
+    sheet.append([])
+    sheet.append([])
+    sheet.append([])
+    sheet.append([f'{school_detail} Incentive books'])
+    sheet.append([])
+
+    sheet.append(['Book Name', 'Publisher Name', 'Quantity', 'Price', 'Sub Total'])
+    # Schools below the incentive threshold don't have incentive books
+    total_incentive_price = 0
+    total_incentive_quantity = 0
+    for book in bill['incentive_books']:
+        sheet.append([
+            book['book_name'],
+            book['publisher_name'],
+            book['quantity'],
+            book['price'],
+            book['quantity'] * book['price']
+        ])
+        total_incentive_price += book['quantity'] * book['price']
+        total_incentive_quantity += book['quantity']
+    sheet.append([])
+    sheet.append(['', 'Total Quantity', total_incentive_quantity, 'Total Price', total_incentive_price])
+
+    filename = os.path.join(directory, f"{bill['package_id']}-{slugify(bill['school_name'], allow_unicode=True)}.xlsx")
+    wb.save(filename)
+    return filename
+
+
+def write_school_bills(bills, directory):
+    return [write_school_bill(bill, directory) for bill in bills]
 
 
 class Command(BaseCommand):
-    help = 'Delete package of particular order window'
+    help = 'Generate bill for schools of particular order window'
+
+    SHARD_SIZE = 50
 
     def add_arguments(self, parser):
         parser.add_argument('order_window_id', type=int, help='order window id')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of worker processes')
+        parser.add_argument('--shard-size', type=int, default=self.SHARD_SIZE, help='Number of schools per worker task')
+
+    def get_school_bills(self, order_window):
+        """
+        Fetch bill data of all school packages (2 queries)
+        """
+        school_packages = SchoolPackage.objects.filter(order_window=order_window).values(
+            'id',
+            'incentive_quantity',
+            school_name=F('school__school__name'),
+            district_name=F('school__school__district__name'),
+            municipality_name=F('school__school__municipality__name'),
+        ).order_by('id')
+
+        book_orders_by_package = defaultdict(list)
+        book_orders = BookOrder.objects.filter(
+            order__school_related_orders__order_window=order_window,
+        ).values(
+            'title',
+            'quantity',
+            'price',
+            'total_price',
+            package_id=F('order__school_related_orders'),
+            publisher_name=F('publisher__name'),
+        ).order_by('order__school_related_orders', 'id')
+        for book_order in book_orders.iterator():
+            book_orders_by_package[book_order['package_id']].append(book_order)
+
+        return [
+            dict(
+                package_id=package['id'],
+                school_name=package['school_name'],
+                district_name=package['district_name'],
+                municipality_name=package['municipality_name'],
+                book_orders=book_orders_by_package[package['id']],
+                # Allocated while generating packages (apps.package.incentive.allocate_incentives)
+                incentive_books=incentive_catalogue.get_books(package['incentive_quantity']),
+            )
+            for package in school_packages
+        ]
 
-    @transaction.atomic
     def handle(self, *args, **options):
         order_window_id = options['order_window_id']
         # Check if order window exists
@@ -25,67 +137,28 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR('Invalid order window id supplied.'))
             return
 
-        school_packages = SchoolPackage.objects.filter(order_window=order_window)
-
-        wb = Workbook()
-
-        for package in school_packages:
-            row = 1
-            sheet = wb.create_sheet(f'{package.school.school} - {package.school.school.municipality}')
-            school_detail = f'{package.school.school} / {package.school.school.district} / {package.school.school.municipality}' # noqa
-            sheet.append([school_detail])
-            sheet.append([])
-            sheet.append(['Book Name', 'Publisher Name', 'Quantity', 'Price', 'Sub Total', 'Total'])
-
-            total_book_order_price = 0
-            total_book_order_quantity = 0
-            for book_order in BookOrder.objects.filter(order__in=package.related_orders.values_list('id', flat=True)):
-                sub_total = book_order.quantity * book_order.price
-                sheet.append([
-                    book_order.title,
-                    book_order.publisher.name,
-                    book_order.quantity,
-                    book_order.price,
-                    sub_total,
-                    book_order.total_price
-                ])
-                row += 1
-                total_book_order_price += sub_total
-                total_book_order_quantity += book_order.quantity
-
-            sheet.append([])
-            sheet.append(['', '', 'Total Quantity', total_book_order_quantity, 'Total Price', total_book_order_price])
-            sheet.append([])
-            sheet.append([])
-            sheet.append([])
-            incentive_detail = f'{package.school.school} / {package.school.school.district} / {package.school.school.municipality} Incentive books' # noqa
-            sheet.append([incentive_detail])
-            sheet.append([])
-
-            sheet.append(['Book Name', 'Publisher Name', 'Quantity', 'Price', 'Sub Total'])
-            incentive = package.related_orders.all().aggregate(
-                total_quantity=Sum('book_order__quantity')
-            )['total_quantity']
-            if incentive >= 10:
-                total_incentive_price = 0
-                total_incentive_quantity = 0
-                incentive_key = f'book_list_{incentive * 4}'
-                for book in INCENTIVE_BOOKS[incentive_key]:
-                    sheet.append([
-                        book['book_name'],
-                        book['publisher_name'],
-                        book['quantity'],
-                        book['price'],
-                        book['quantity'] * book['price']
-                    ])
-                    total_incentive_price += book['quantity'] * book['price']
-                    total_incentive_quantity += book['quantity']
-            sheet.append([])
-            sheet.append(['', 'Total Quantity', total_incentive_quantity, 'Total Price', total_incentive_price])
-
-        # Make sure generated directory exists
-        try:
-            os.makedirs("generated")
-        except FileExistsError:
-            pass
-        wb.save(filename="generated/school_bill.xlsx")
+        bills = self.get_school_bills(order_window)
+        shard_size = max(options['shard_size'], 1)
+        shards = [bills[index:index + shard_size] for index in range(0, len(bills), shard_size)]
+
+        with tempfile.TemporaryDirectory(dir=settings.TEMP_DIR) as directory:
+            # NOTE: Workers only write files, all the data is already fetched
+            with ProcessPoolExecutor(max_workers=max(options['workers'] or 1, 1)) as executor:
+                filenames = [
+                    filename
+                    for shard_filenames in executor.map(write_school_bills, shards, [directory] * len(shards))
+                    for filename in shard_filenames
+                ]
+
+            with tempfile.TemporaryFile(dir=settings.TEMP_DIR) as zip_file:
+                with zipfile.ZipFile(zip_file, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+                    for filename in filenames:
+                        archive.write(filename, arcname=os.path.basename(filename))
+                zip_file.seek(0)
+                name = default_storage.save(
+                    f"school-bills/{order_window.pk}/school_bills_{timezone.now().strftime('%Y%m%d%H%M%S')}.zip",
+                    File(zip_file),
+                )
+
+        self.stdout.write(self.style.SUCCESS(f'{len(filenames)} School bills generated.'))
+        self.stdout.write(self.style.SUCCESS(f'Download link: {default_storage.url(name)}'))
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+def set_existing_exports_status(apps, schema_editor):
+    PublisherPackage = apps.get_model('package', 'PublisherPackage')
+    # Exports of existing packages are generated while creating packages
+    PublisherPackage.objects.exclude(
+        models.Q(orders_export_file__isnull=True) | models.Q(orders_export_file='')
+    ).update(orders_export_status='success')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('package', '0008_publisherpackage_orders_export_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='publisherpackage',
+            name='orders_export_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('started', 'Started'), ('success', 'Success'), ('failed', 'Failed')], default='pending', max_length=40, verbose_name='Orders export status'),
+        ),
+        migrations.RunPython(set_existing_exports_status, reverse_code=migrations.RunPython.noop),
+    ]
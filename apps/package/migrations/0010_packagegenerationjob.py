@@ -0,0 +1,39 @@
+# Generated by Django 3.2.16 on 2026-10-19 10:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('order', '0013_orderdailystat_orderdailystatsync'),
+        ('package', '0009_publisherpackage_orders_export_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackageGenerationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('started', 'Started'), ('success', 'Success'), ('failed', 'Failed')], default='pending', max_length=40, verbose_name='Status')),
+                ('stage', models.CharField(blank=True, choices=[('publisher_package', 'Publisher package'), ('courier_package', 'Courier package'), ('school_package', 'School package'), ('institution_package', 'Institution package')], max_length=40, null=True, verbose_name='Current stage')),
+                ('last_processed_key', models.IntegerField(blank=True, null=True, verbose_name='Last processed key')),
+                ('stage_total_rows', models.PositiveIntegerField(default=0, verbose_name='Stage total rows')),
+                ('stage_done_rows', models.PositiveIntegerField(default=0, verbose_name='Stage done rows')),
+                ('errors', models.TextField(blank=True, verbose_name='Errors')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Started at')),
+                ('stage_started_at', models.DateTimeField(blank=True, null=True, verbose_name='Stage started at')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Finished at')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Created by')),
+                ('order_window', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='order.orderwindow', verbose_name='Order window')),
+            ],
+            options={
+                'verbose_name': 'Package generation job',
+                'verbose_name_plural': 'Package generation jobs',
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.16 on 2026-10-19 11:40
+
+from django.db import migrations, models
+from django.db.models.functions import Least
+
+
+def set_school_packages_incentive_quantity(apps, schema_editor):
+    OrderWindow = apps.get_model('order', 'OrderWindow')
+    SchoolPackage = apps.get_model('package', 'SchoolPackage')
+    for order_window in OrderWindow.objects.filter(type='school', enable_incentive=True):
+        SchoolPackage.objects.filter(
+            order_window=order_window,
+            total_quantity__gte=order_window.incentive_quantity_threshold,
+        ).update(
+            incentive_quantity=Least(
+                models.F('total_quantity') * order_window.incentive_multiplier,
+                models.Value(order_window.incentive_max),
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0013_orderdailystat_orderdailystatsync'),
+        ('package', '0010_packagegenerationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='publisherpackage',
+            name='incentive_books',
+            field=models.JSONField(blank=True, default=list, verbose_name='Incentive books'),
+        ),
+        migrations.AddField(
+            model_name='publisherpackage',
+            name='incentive_price',
+            field=models.IntegerField(default=0, verbose_name='Incentive price'),
+        ),
+        migrations.AddField(
+            model_name='publisherpackage',
+            name='incentive_quantity',
+            field=models.IntegerField(default=0, verbose_name='Incentive quantity'),
+        ),
+        migrations.AddField(
+            model_name='schoolpackage',
+            name='incentive_price',
+            field=models.IntegerField(default=0, verbose_name='Incentive price'),
+        ),
+        migrations.AddField(
+            model_name='schoolpackage',
+            name='incentive_quantity',
+            field=models.IntegerField(default=0, verbose_name='Incentive quantity'),
+        ),
+        migrations.RunPython(set_school_packages_incentive_quantity, reverse_code=migrations.RunPython.noop),
+    ]
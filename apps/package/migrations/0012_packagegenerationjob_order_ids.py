@@ -0,0 +1,19 @@
+# Generated by Django 3.2.16 on 2026-10-19 18:40
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('package', '0011_incentive_allocation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='packagegenerationjob',
+            name='order_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, null=True, size=None, verbose_name='Orders'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-19 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('package', '0012_packagegenerationjob_order_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='packagegenerationjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Heartbeat at'),
+        ),
+    ]
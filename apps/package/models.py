@@ -1,6 +1,9 @@
 import uuid
+import datetime
 
 from django.db import models
+from django.contrib.postgres.fields import ArrayField
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.db.models.functions import Least
 
@@ -36,6 +39,12 @@ class PublisherPackage(models.Model):
         ISSUE = 'issue', _('Issue')
         DELIVERED = 'delivered', _('Delivered')
 
+    class ExportStatus(models.TextChoices):
+        PENDING = 'pending', _('Pending')
+        STARTED = 'started', _('Started')
+        SUCCESS = 'success', _('Success')
+        FAILED = 'failed', _('Failed')
+
     package_id = models.UUIDField(
         primary_key=False,
         default=uuid.uuid4,
@@ -65,9 +74,21 @@ class PublisherPackage(models.Model):
     total_price = models.IntegerField(verbose_name=_('Total price'), default=0)
     total_quantity = models.IntegerField(verbose_name=_('Total quantity'), default=0)
     incentive = models.IntegerField(verbose_name=_('Incentive'), default=0)
+    # Incentive books allocated to the publisher: [{book_name, price, quantity}]
+    incentive_books = models.JSONField(verbose_name=_('Incentive books'), default=list, blank=True)
+    incentive_quantity = models.IntegerField(verbose_name=_('Incentive quantity'), default=0)
+    incentive_price = models.IntegerField(verbose_name=_('Incentive price'), default=0)
     orders_export_file = models.FileField(
         upload_to='publisher/exports/', max_length=255, null=True, blank=True, default=None,
     )
+    orders_export_status = models.CharField(
+        max_length=40,
+        choices=ExportStatus.choices,
+        default=ExportStatus.PENDING,
+        verbose_name=_('Orders export status')
+    )
+
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Updated at'))
 
     class Meta:
         unique_together = ('publisher', 'order_window')
@@ -143,6 +164,10 @@ class SchoolPackage(models.Model):
         verbose_name=_('Courier package'),
     )
     is_eligible_for_incentive = models.BooleanField(default=False, verbose_name=_('Is eligible for incentive'),)
+    incentive_quantity = models.IntegerField(verbose_name=_('Incentive quantity'), default=0)
+    incentive_price = models.IntegerField(verbose_name=_('Incentive price'), default=0)
+
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Updated at'))
 
     class Meta:
         unique_together = ('school', 'order_window')
@@ -243,6 +268,8 @@ class InstitutionPackage(models.Model):
         verbose_name=_('Courier package'),
     )
 
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Updated at'))
+
     class Meta:
         unique_together = ('institution', 'order_window')
         verbose_name = _('Institution package')
@@ -291,6 +318,8 @@ class CourierPackage(models.Model):
         choices=Type.choices, max_length=40, verbose_name=_('Package type'), blank=True
     )
 
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Updated at'))
+
     class Meta:
         verbose_name = _('Courier Package')
         verbose_name_plural = _('Courier Packages')
@@ -322,3 +351,90 @@ class InstitutionPackageLog(BaseActivityLog):
         'package.InstitutionPackage', verbose_name=_('Institution package'), related_name='institution_package_logs',
         on_delete=models.CASCADE
     )
+
+
+class PackageGenerationJob(models.Model):
+    """
+    Package generation of an order window, processed as stages of chunks (Resumable using the checkpoint)
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending', _('Pending')
+        STARTED = 'started', _('Started')
+        SUCCESS = 'success', _('Success')
+        FAILED = 'failed', _('Failed')
+
+    class Stage(models.TextChoices):
+        PUBLISHER_PACKAGE = 'publisher_package', _('Publisher package')
+        COURIER_PACKAGE = 'courier_package', _('Courier package')
+        SCHOOL_PACKAGE = 'school_package', _('School package')
+        INSTITUTION_PACKAGE = 'institution_package', _('Institution package')
+
+    # Number of stage keys (publisher/municipality/user) processed per transaction
+    CHUNK_SIZE = 500
+    # Pending/Started job without a heartbeat for this long is considered lost (eg: worker crashed) and re-queued
+    STALE_TIMEOUT = datetime.timedelta(minutes=15)
+
+    order_window = models.ForeignKey(
+        'order.OrderWindow',
+        on_delete=models.PROTECT,
+        related_name='+',
+        verbose_name=_('Order window'),
+    )
+    status = models.CharField(
+        max_length=40,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name=_('Status'),
+    )
+    stage = models.CharField(
+        max_length=40, choices=Stage.choices, null=True, blank=True, verbose_name=_('Current stage'),
+    )
+    # Checkpoint: Keys (publisher/municipality/user id) of the stage are processed in ascending order
+    last_processed_key = models.IntegerField(null=True, blank=True, verbose_name=_('Last processed key'))
+    stage_total_rows = models.PositiveIntegerField(default=0, verbose_name=_('Stage total rows'))
+    stage_done_rows = models.PositiveIntegerField(default=0, verbose_name=_('Stage done rows'))
+    # Orders of the window frozen at job start, every stage (and resume) processes only these orders
+    order_ids = ArrayField(models.BigIntegerField(), null=True, blank=True, verbose_name=_('Orders'))
+    errors = models.TextField(blank=True, verbose_name=_('Errors'))
+    created_by = models.ForeignKey(
+        'user.User',
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='+',
+        verbose_name=_('Created by'),
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Created at'))
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Started at'))
+    stage_started_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Stage started at'))
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Finished at'))
+    # Updated by the worker on claim and after each chunk
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Heartbeat at'))
+
+    class Meta:
+        verbose_name = _('Package generation job')
+        verbose_name_plural = _('Package generation jobs')
+
+    def __str__(self):
+        return f'{self.order_window} - {self.status}'
+
+    @property
+    def is_stale(self):
+        return (
+            self.status in [self.Status.PENDING, self.Status.STARTED] and
+            (self.heartbeat_at or self.created_at) < timezone.now() - self.STALE_TIMEOUT
+        )
+
+    @property
+    def eta(self):
+        """
+        Estimated finish time of the current stage (Using the stage throughput so far)
+        """
+        if (
+            self.status != self.Status.STARTED or
+            not self.stage_started_at or
+            not self.stage_done_rows
+        ):
+            return None
+        elapsed = timezone.now() - self.stage_started_at
+        remaining_rows = max(self.stage_total_rows - self.stage_done_rows, 0)
+        return timezone.now() + elapsed * remaining_rows / self.stage_done_rows
@@ -8,19 +8,23 @@ from apps.package.serializers import (
     SchoolPackageUpdateSerializer,
     PublisherPackageUpdateSerializer,
     CourierPackageUpdateSerializer,
-    InstitutionPackageUpdateSerializer
+    InstitutionPackageUpdateSerializer,
+    PackageGenerationJobSerializer,
+    BulkCourierPackageStatusUpdateSerializer,
 )
 from apps.package.models import (
     PublisherPackage,
     SchoolPackage,
     CourierPackage,
     InstitutionPackage,
+    PackageGenerationJob,
 )
 from apps.package.schema import (
     SchoolPackageType,
     PublisherPackageType,
     CourierPackageType,
     InstitutionPackageType,
+    PackageGenerationJobType,
 )
 
 
@@ -96,8 +100,38 @@ class UpdateInstitutionPackage(packageMixin, CreateUpdateGrapheneMutation):
     result = graphene.Field(InstitutionPackageType)
 
 
+BulkCourierPackageStatusUpdateInputType = generate_input_type_for_serializer(
+    'BulkCourierPackageStatusUpdateInputType',
+    serializer_class=BulkCourierPackageStatusUpdateSerializer
+)
+
+
+class BulkUpdateCourierPackageStatus(packageMixin, CreateUpdateGrapheneMutation):
+    class Arguments:
+        data = BulkCourierPackageStatusUpdateInputType(required=True)
+    model = CourierPackage
+    serializer_class = BulkCourierPackageStatusUpdateSerializer
+    result = graphene.List(graphene.NonNull(CourierPackageType))
+
+
+PackageGenerationJobInputType = generate_input_type_for_serializer(
+    'PackageGenerationJobInputType',
+    serializer_class=PackageGenerationJobSerializer
+)
+
+
+class GeneratePackages(packageMixin, CreateUpdateGrapheneMutation):
+    class Arguments:
+        data = PackageGenerationJobInputType(required=True)
+    model = PackageGenerationJob
+    serializer_class = PackageGenerationJobSerializer
+    result = graphene.Field(PackageGenerationJobType)
+
+
 class Mutation(graphene.ObjectType):
     update_school_package = UpdateSchoolPackage.Field()
     update_publisher_package = UpdatePublisherPackage.Field()
     update_courier_package = UpdateCourierPackage.Field()
     update_institution_package = UpdateInstitutionPackage.Field()
+    bulk_update_courier_package_status = BulkUpdateCourierPackageStatus.Field()
+    generate_packages = GeneratePackages.Field()
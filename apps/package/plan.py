@@ -0,0 +1,186 @@
+import hashlib
+from array import array
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import Count, Max, Sum, F
+
+from apps.common.models import Municipality
+from apps.publisher.models import Publisher
+from apps.user.models import User
+
+
+class PackagePlan():
+    """
+    Preview of the packages of an order window, computed in memory without writing anything.
+    Book orders are loaded as compact columns (array) and every package aggregate is a single pass group-by.
+    Plan is cached using a fingerprint of the book orders, user locations and incentive settings of the window,
+    so a preview is reused by the package generation as long as nothing has changed.
+    """
+    CACHE_KEY = 'package-plan-{order_window_id}-{fingerprint}'
+    CACHE_TIMEOUT = 60 * 60
+    LOAD_CHUNK_SIZE = 5000
+
+    # NOTE: Order of the columns is same as in values_list
+    COLUMNS = ('order', 'user', 'publisher', 'book', 'municipality', 'quantity', 'price')
+
+    def __init__(self, order_window, book_orders, municipality_field):
+        self.order_window = order_window
+        self.book_orders = book_orders
+        self.municipality_field = municipality_field
+
+    def get_fingerprint(self):
+        # Any change in the book orders of the window (add/remove/quantity/price) changes the fingerprint
+        data = self.book_orders.order_by().aggregate(
+            count=Count('id'),
+            max_id=Max('id'),
+            total_quantity=Sum('quantity'),
+            total_price=Sum(F('quantity') * F('price')),
+        )
+        # Incentive settings of the window changes the eligibility
+        data['enable_incentive'] = int(self.order_window.enable_incentive)
+        data['incentive_quantity_threshold'] = self.order_window.incentive_quantity_threshold
+        # Courier packages are grouped by the municipality of the users, which can change without touching book orders
+        user_locations = self.book_orders.order_by('order__created_by').values_list(
+            'order__created_by', f'order__created_by__{self.municipality_field}',
+        ).distinct()
+        data['user_locations'] = hashlib.md5(str(list(user_locations)).encode()).hexdigest()
+        return '-'.join(
+            str(data[key] or 0)
+            for key in (
+                'count', 'max_id', 'total_quantity', 'total_price', 'enable_incentive', 'incentive_quantity_threshold',
+                'user_locations',
+            )
+        )
+
+    def get_cache_key(self):
+        return self.CACHE_KEY.format(
+            order_window_id=self.order_window.pk,
+            fingerprint=self.get_fingerprint(),
+        )
+
+    def get(self):
+        """
+        Return cached plan or compute and cache it
+        """
+        cache_key = self.get_cache_key()
+        plan = cache.get(cache_key)
+        if plan is None:
+            plan = self.compute()
+            cache.set(cache_key, plan, self.CACHE_TIMEOUT)
+        return plan
+
+    def load_columns(self):
+        columns = {
+            column: array('q')
+            for column in self.COLUMNS
+        }
+        column_arrays = [columns[column] for column in self.COLUMNS]
+        rows = self.book_orders.order_by().values_list(
+            'order', 'order__created_by', 'publisher', 'book',
+            f'order__created_by__{self.municipality_field}', 'quantity', 'price',
+        ).iterator(chunk_size=self.LOAD_CHUNK_SIZE)
+        for row in rows:
+            for column_array, value in zip(column_arrays, row):
+                # NOTE: Missing municipality (profile not attached) is grouped as 0
+                column_array.append(value or 0)
+        return columns
+
+    @staticmethod
+    def group_sum(keys, quantities, prices):
+        """
+        Returns {key: [total_quantity, total_price]}
+        """
+        totals = defaultdict(lambda: [0, 0])
+        for key, quantity, price in zip(keys, quantities, prices):
+            total = totals[key]
+            total[0] += quantity
+            total[1] += quantity * price
+        return totals
+
+    @staticmethod
+    def group_distinct(keys, values):
+        """
+        Returns {key: {value, ...}}
+        """
+        distinct_values = defaultdict(set)
+        for key, value in zip(keys, values):
+            distinct_values[key].add(value)
+        return distinct_values
+
+    def is_eligible_for_incentive(self, total_quantity):
+        return bool(
+            self.order_window.enable_incentive and
+            total_quantity >= self.order_window.incentive_quantity_threshold
+        )
+
+    def compute(self):
+        columns = self.load_columns()
+        quantities, prices = columns['quantity'], columns['price']
+
+        publisher_totals = self.group_sum(columns['publisher'], quantities, prices)
+        municipality_totals = self.group_sum(columns['municipality'], quantities, prices)
+        user_totals = self.group_sum(columns['user'], quantities, prices)
+        books_by_publisher = self.group_distinct(columns['publisher'], columns['book'])
+        orders_by_user = self.group_distinct(columns['user'], columns['order'])
+        publishers_by_user = self.group_distinct(columns['user'], columns['publisher'])
+        municipality_by_user = dict(zip(columns['user'], columns['municipality']))
+
+        # Only schools are eligible for incentive (Same as package generation)
+        check_incentive = self.order_window.type == self.order_window.OrderWindowType.SCHOOL.value
+        eligible_user_ids = {
+            user_id
+            for user_id, (total_quantity, _) in user_totals.items()
+            if check_incentive and self.is_eligible_for_incentive(total_quantity)
+        }
+        # Incentive of a publisher package is incremented for each eligible school ordering it's books
+        publisher_incentive = defaultdict(int)
+        for user_id in eligible_user_ids:
+            for publisher_id in publishers_by_user[user_id]:
+                publisher_incentive[publisher_id] += 1
+
+        publisher_names = dict(Publisher.objects.filter(id__in=publisher_totals.keys()).values_list('id', 'name'))
+        municipality_names = dict(
+            Municipality.objects.filter(id__in=municipality_totals.keys()).values_list('id', 'name')
+        )
+        user_names = dict(User.objects.filter(id__in=user_totals.keys()).values_list('id', 'full_name'))
+
+        return dict(
+            order_window_id=self.order_window.pk,
+            book_order_count=len(quantities),
+            total_quantity=sum(quantities),
+            total_price=sum(total_price for _, total_price in publisher_totals.values()),
+            publishers=[
+                dict(
+                    id=publisher_id,
+                    name=publisher_names.get(publisher_id),
+                    total_quantity=total_quantity,
+                    total_price=total_price,
+                    book_count=len(books_by_publisher[publisher_id]),
+                    incentive=publisher_incentive[publisher_id],
+                )
+                for publisher_id, (total_quantity, total_price) in sorted(publisher_totals.items())
+            ],
+            municipalities=[
+                dict(
+                    id=municipality_id or None,
+                    name=municipality_names.get(municipality_id),
+                    total_quantity=total_quantity,
+                    total_price=total_price,
+                    is_eligible_for_incentive=check_incentive and self.is_eligible_for_incentive(total_quantity),
+                )
+                for municipality_id, (total_quantity, total_price) in sorted(municipality_totals.items())
+            ],
+            users=[
+                dict(
+                    id=user_id,
+                    name=user_names.get(user_id),
+                    municipality_id=municipality_by_user[user_id] or None,
+                    total_quantity=total_quantity,
+                    total_price=total_price,
+                    order_count=len(orders_by_user[user_id]),
+                    is_eligible_for_incentive=user_id in eligible_user_ids,
+                )
+                for user_id, (total_quantity, total_price) in sorted(user_totals.items())
+            ],
+        )
@@ -4,7 +4,11 @@ from django.db.models import QuerySet
 from graphene_django import DjangoObjectType
 from graphene_django_extras import DjangoObjectField, PageGraphqlPagination
 
-from utils.graphene.fields import DjangoPaginatedListObjectField, CustomDjangoListField
+from utils.graphene.fields import (
+    DjangoPaginatedListObjectField,
+    DataLoaderPaginatedListObjectField,
+    CustomDjangoListField,
+)
 from utils.graphene.types import CustomDjangoListObjectType, FileFieldType
 
 from apps.package.models import (
@@ -19,6 +23,7 @@ from apps.package.models import (
     InstitutionPackage,
     InstitutionPackageBook,
     InstitutionPackageLog,
+    PackageGenerationJob,
 )
 from apps.user.models import User
 from apps.package.filters import (
@@ -30,18 +35,23 @@ from apps.package.filters import (
     CourierPackageLogFilterSet,
     InstitutionPackageFilterSet,
     InstitutionPackageLogFilterSet,
+    PackageGenerationJobFilterSet,
 )
 from apps.package.enums import (
     PublisherPackageStatusEnum,
+    PublisherPackageExportStatusEnum,
     SchoolPackageStatusEnum,
     CourierPackageStatusEnum,
     InstitutionPackageStatusEnum,
     CourierPackageTypeEnum,
+    PackageGenerationJobStatusEnum,
+    PackageGenerationJobStageEnum,
 )
 from utils.graphene.enums import EnumDescription
 from apps.common.schema import ActivityFileType
 from apps.order.schema import OrderType
-from apps.order.models import Order
+from apps.order.models import OrderWindow
+from apps.package.generator import PackageGenerator
 
 
 def publisher_package_qs(info):
@@ -74,6 +84,12 @@ def courier_package_qs(info):
     return CourierPackage.objects.none()
 
 
+def package_generation_job_qs(info):
+    if info.context.user.user_type == User.UserType.MODERATOR.value:
+        return PackageGenerationJob.objects.all()
+    return PackageGenerationJob.objects.none()
+
+
 class PublisherPackageBookType(DjangoObjectType):
     class Meta:
         model = PublisherPackageBook
@@ -111,13 +127,15 @@ class PublisherPackageType(DjangoObjectType):
             page_size_query_param='pageSize'
         )
     )
-    logs = DjangoPaginatedListObjectField(
+    logs = DataLoaderPaginatedListObjectField(
         PublisherPackageLogListType,
         pagination=PageGraphqlPagination(
             page_size_query_param='pageSize'
-        )
+        ),
+        related_field='publisher_package',
     )
     orders_export_file = graphene.Field(FileFieldType)
+    orders_export_status = graphene.Field(PublisherPackageExportStatusEnum, required=True)
 
     @staticmethod
     def get_custom_queryset(queryset, info):
@@ -127,13 +145,10 @@ class PublisherPackageType(DjangoObjectType):
         model = PublisherPackage
         fields = (
             'id', 'package_id', 'status', 'related_orders', 'publisher',
-            'total_price', 'total_quantity', 'incentive', 'orders_export_file',
+            'total_price', 'total_quantity', 'incentive', 'incentive_quantity', 'incentive_price',
+            'orders_export_file', 'orders_export_status',
         )
 
-    @staticmethod
-    def resolve_logs(root, info, **kwargs) -> QuerySet:
-        return root.publisher_package_logs
-
 
 class PublisherPackageListType(CustomDjangoListObjectType):
     class Meta:
@@ -172,17 +187,19 @@ class SchoolPackageType(DjangoObjectType):
     status = graphene.Field(SchoolPackageStatusEnum, required=True)
     status_display = EnumDescription(source='get_status_display')
 
-    school_package_books = DjangoPaginatedListObjectField(
+    school_package_books = DataLoaderPaginatedListObjectField(
         SchoolPackageBookListType,
         pagination=PageGraphqlPagination(
             page_size_query_param='pageSize'
-        )
+        ),
+        related_field='school_package',
     )
-    logs = DjangoPaginatedListObjectField(
+    logs = DataLoaderPaginatedListObjectField(
         SchoolPackageLogListType,
         pagination=PageGraphqlPagination(
             page_size_query_param='pageSize'
-        )
+        ),
+        related_field='school_package',
     )
 
     @staticmethod
@@ -193,13 +210,9 @@ class SchoolPackageType(DjangoObjectType):
         model = SchoolPackage
         fields = (
             'id', 'package_id', 'status', 'related_orders', 'school',
-            'total_price', 'total_quantity', 'is_eligible_for_incentive'
+            'total_price', 'total_quantity', 'is_eligible_for_incentive', 'incentive_quantity', 'incentive_price',
         )
 
-    @staticmethod
-    def resolve_logs(root, info, **kwargs) -> QuerySet:
-        return root.school_package_logs
-
 
 class SchoolPackageListType(CustomDjangoListObjectType):
     class Meta:
@@ -238,17 +251,19 @@ class InstitutionPackageType(DjangoObjectType):
     status = graphene.Field(InstitutionPackageStatusEnum, required=True)
     status_display = EnumDescription(source='get_status_display')
 
-    institution_package_books = DjangoPaginatedListObjectField(
+    institution_package_books = DataLoaderPaginatedListObjectField(
         InstitutionPackageBookListType,
         pagination=PageGraphqlPagination(
             page_size_query_param='pageSize'
-        )
+        ),
+        related_field='school_package',
     )
-    logs = DjangoPaginatedListObjectField(
+    logs = DataLoaderPaginatedListObjectField(
         InstitutionPackageLogListType,
         pagination=PageGraphqlPagination(
             page_size_query_param='pageSize'
-        )
+        ),
+        related_field='institution_package',
     )
 
     @staticmethod
@@ -262,10 +277,6 @@ class InstitutionPackageType(DjangoObjectType):
             'total_price', 'total_quantity',
         )
 
-    @staticmethod
-    def resolve_logs(root, info, **kwargs) -> QuerySet:
-        return root.institution_package_logs
-
 
 class InstitutionPackageListType(CustomDjangoListObjectType):
     class Meta:
@@ -283,7 +294,7 @@ class CourierPackageLogType(DjangoObjectType):
 
 class CourierPackageLogListType(CustomDjangoListObjectType):
     class Meta:
-        model = SchoolPackageLog
+        model = CourierPackageLog
         filterset_class = CourierPackageLogFilterSet
 
 
@@ -293,35 +304,40 @@ class CourierPackageType(DjangoObjectType):
     type = graphene.Field(CourierPackageTypeEnum, required=True)
     type_display = EnumDescription(source='get_type_display')
 
-    logs = DjangoPaginatedListObjectField(
-        PublisherPackageLogListType,
+    logs = DataLoaderPaginatedListObjectField(
+        CourierPackageLogListType,
         pagination=PageGraphqlPagination(
             page_size_query_param='pageSize'
-        )
+        ),
+        related_field='courier_package',
     )
-    school_packages = DjangoPaginatedListObjectField(
+    school_packages = DataLoaderPaginatedListObjectField(
         SchoolPackageListType,
         pagination=PageGraphqlPagination(
             page_size_query_param='pageSize'
-        )
+        ),
+        related_field='courier_package',
     )
-    institution_packages = DjangoPaginatedListObjectField(
+    institution_packages = DataLoaderPaginatedListObjectField(
         InstitutionPackageListType,
         pagination=PageGraphqlPagination(
             page_size_query_param='pageSize'
-        )
+        ),
+        related_field='courier_package',
     )
-    school_courier_package_books = DjangoPaginatedListObjectField(
+    school_courier_package_books = DataLoaderPaginatedListObjectField(
         SchoolPackageBookListType,
         pagination=PageGraphqlPagination(
             page_size_query_param='pageSize'
-        )
+        ),
+        related_field='school_package__courier_package',
     )
-    institution_courier_package_books = DjangoPaginatedListObjectField(
+    institution_courier_package_books = DataLoaderPaginatedListObjectField(
         InstitutionPackageBookListType,
         pagination=PageGraphqlPagination(
             page_size_query_param='pageSize'
-        )
+        ),
+        related_field='school_package__courier_package',
     )
     related_orders = CustomDjangoListField(OrderType, required=False)
 
@@ -330,30 +346,8 @@ class CourierPackageType(DjangoObjectType):
         return courier_package_qs(info)
 
     @staticmethod
-    def resolve_logs(root, info, **kwargs) -> QuerySet:
-        return root.courier_package_logs
-
-    @staticmethod
-    def resolve_school_courier_package_books(root, info, **kwargs) -> QuerySet:
-        # TODO: Use dataloader
-        return SchoolPackageBook.objects.filter(school_package__courier_package=root.id)
-
-    @staticmethod
-    def resolve_related_orders(root, info, **kwargs) -> QuerySet:
-        # TODO: use dataloader
-        school_package_ids = SchoolPackage.objects.filter(courier_package=root.id).values_list('id', flat=True)
-        if root.type == CourierPackage.Type.SCHOOL.value:
-            return Order.objects.filter(
-                school_related_orders__in=school_package_ids
-            )
-            # return root.courier_package.first().related_orders.all()
-        elif root.type == CourierPackage.Type.INSTITUTION.value:
-            institution_package_ids = InstitutionPackage.objects.filter(courier_package=root.id).values_list('id', flat=True)
-            return root.institution_courier_package.first().related_orders.all()
-            return Order.objects.filter(
-                institution_related_orders__in=institution_package_ids
-            )
-        return CourierPackage.objects.none()
+    def resolve_related_orders(root, info, **kwargs):
+        return info.context.dl.package.courier_package_related_orders.load(root.pk)
 
     class Meta:
         model = CourierPackage
@@ -369,6 +363,31 @@ class CourierPackageListType(CustomDjangoListObjectType):
         filterset_class = CourierPackageFilterSet
 
 
+class PackageGenerationJobType(DjangoObjectType):
+    status = graphene.Field(PackageGenerationJobStatusEnum, required=True)
+    status_display = EnumDescription(source='get_status_display')
+    stage = graphene.Field(PackageGenerationJobStageEnum)
+    stage_display = EnumDescription(source='get_stage_display')
+    eta = graphene.DateTime()
+
+    @staticmethod
+    def get_custom_queryset(queryset, info):
+        return package_generation_job_qs(info)
+
+    class Meta:
+        model = PackageGenerationJob
+        fields = (
+            'id', 'order_window', 'status', 'stage', 'stage_total_rows', 'stage_done_rows', 'errors',
+            'created_at', 'started_at', 'stage_started_at', 'finished_at',
+        )
+
+
+class PackageGenerationJobListType(CustomDjangoListObjectType):
+    class Meta:
+        model = PackageGenerationJob
+        filterset_class = PackageGenerationJobFilterSet
+
+
 class Query(graphene.ObjectType):
     publisher_package = DjangoObjectField(PublisherPackageType)
     publisher_packages = DjangoPaginatedListObjectField(
@@ -398,6 +417,13 @@ class Query(graphene.ObjectType):
             page_size_query_param='pageSize'
         )
     )
+    package_generation_job = DjangoObjectField(PackageGenerationJobType)
+    package_generation_jobs = DjangoPaginatedListObjectField(
+        PackageGenerationJobListType,
+        pagination=PageGraphqlPagination(
+            page_size_query_param='pageSize'
+        )
+    )
 
     @staticmethod
     def resolve_publisher_packages(root, info, **kwargs) -> QuerySet:
@@ -414,3 +440,55 @@ class Query(graphene.ObjectType):
     @staticmethod
     def resolve_institution_packages(root, info, **kwargs) -> QuerySet:
         return institution_package_qs(info)
+
+    @staticmethod
+    def resolve_package_generation_jobs(root, info, **kwargs) -> QuerySet:
+        return package_generation_job_qs(info)
+
+
+class PackagePlanPublisherType(graphene.ObjectType):
+    id = graphene.ID(required=True)
+    name = graphene.String()
+    total_quantity = graphene.Int(required=True)
+    total_price = graphene.Int(required=True)
+    book_count = graphene.Int(required=True)
+    incentive = graphene.Int(required=True)
+
+
+class PackagePlanMunicipalityType(graphene.ObjectType):
+    id = graphene.ID()
+    name = graphene.String()
+    total_quantity = graphene.Int(required=True)
+    total_price = graphene.Int(required=True)
+    is_eligible_for_incentive = graphene.Boolean(required=True)
+
+
+class PackagePlanUserType(graphene.ObjectType):
+    id = graphene.ID(required=True)
+    name = graphene.String()
+    municipality_id = graphene.ID()
+    total_quantity = graphene.Int(required=True)
+    total_price = graphene.Int(required=True)
+    order_count = graphene.Int(required=True)
+    is_eligible_for_incentive = graphene.Boolean(required=True)
+
+
+class PackagePlanType(graphene.ObjectType):
+    order_window_id = graphene.ID(required=True)
+    book_order_count = graphene.Int(required=True)
+    total_quantity = graphene.Int(required=True)
+    total_price = graphene.Int(required=True)
+    publishers = graphene.List(graphene.NonNull(PackagePlanPublisherType), required=True)
+    municipalities = graphene.List(graphene.NonNull(PackagePlanMunicipalityType), required=True)
+    users = graphene.List(graphene.NonNull(PackagePlanUserType), required=True)
+
+
+class PackagePlanQuery(graphene.ObjectType):
+    package_plan = graphene.Field(PackagePlanType, order_window_id=graphene.ID(required=True))
+
+    @staticmethod
+    def resolve_package_plan(root, info, order_window_id, **kwargs):
+        order_window = OrderWindow.objects.filter(id=order_window_id).first()
+        if order_window is None:
+            return None
+        return PackageGenerator(order_window).plan
@@ -1,5 +1,7 @@
 from rest_framework import serializers
-from django.utils.translation import gettext_lazy as _
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _, gettext
 
 from apps.package.models import (
     PublisherPackage,
@@ -10,9 +12,15 @@ from apps.package.models import (
     CourierPackageLog,
     InstitutionPackage,
     InstitutionPackageLog,
+    PackageGenerationJob,
 )
-from apps.order.models import Order
-from config.serializers import CreatedUpdatedBaseSerializer
+from apps.package.tasks import run_package_generation_job
+from apps.package.cascade import cascade_package_status
+from apps.order.models import Order, BookOrderFact
+from apps.order.tasks import schedule_order_daily_stat_refresh
+from apps.common.tasks import schedule_report_snapshot_refresh, schedule_school_report_snapshot_refresh
+from apps.payment.models import UserLedger
+from config.serializers import CreatedUpdatedBaseSerializer, IntegerIDField
 
 
 class SnapshotSerializer(CreatedUpdatedBaseSerializer, serializers.ModelSerializer):
@@ -64,6 +72,18 @@ class UpdateLogMixin(metaclass=serializers.SerializerMetaclass):
         return files
 
 
+def cascade_status_update(package_model, instance, validated_data):
+    status = validated_data.get('status')
+    if status is None:
+        return
+    order_ids = cascade_package_status(package_model, [instance.pk], status)
+    BookOrderFact.sync_status(order_ids)
+    UserLedger.refresh_for_orders(Order.objects.filter(id__in=order_ids))
+    schedule_order_daily_stat_refresh(Order.objects.filter(id__in=order_ids))
+    schedule_report_snapshot_refresh()
+    schedule_school_report_snapshot_refresh(Order.objects.filter(id__in=order_ids))
+
+
 class PublisherPackageUpdateSerializer(UpdateLogMixin, serializers.ModelSerializer):
 
     class Meta:
@@ -84,17 +104,7 @@ class SchoolPackageUpdateSerializer(UpdateLogMixin, serializers.ModelSerializer)
         raise Exception('Not allowed')
 
     def update(self, instance, validated_data):
-        status = validated_data.get('status')
-        instance.related_orders.update(status=status)
-        _order_status_map = {
-            SchoolPackage.Status.PENDING.value: Order.Status.PENDING.value,
-            SchoolPackage.Status.IN_TRANSIT.value: Order.Status.IN_TRANSIT.value,
-            SchoolPackage.Status.ISSUE.value: Order.Status.PENDING.value,
-            SchoolPackage.Status.DELIVERED.value: Order.Status.COMPLETED.value,
-        }
-        Order.objects.filter(
-            order_code__in=instance.related_orders.all().values_list('order_code', flat=True)
-        ).update(status=_order_status_map.get(status))
+        cascade_status_update(SchoolPackage, instance, validated_data)
         return super().update(instance, validated_data)
 
 
@@ -108,50 +118,60 @@ class CourierPackageUpdateSerializer(UpdateLogMixin, serializers.ModelSerializer
         raise Exception('Not allowed')
 
     def update(self, instance, validated_data):
-        status = validated_data.get('status')
-        _order_status_map = {
-            CourierPackage.Status.PENDING.value: Order.Status.PENDING.value,
-            CourierPackage.Status.IN_TRANSIT.value: Order.Status.IN_TRANSIT.value,
-            CourierPackage.Status.ISSUE.value: Order.Status.PENDING.value,
-            CourierPackage.Status.DELIVERED.value: Order.Status.COMPLETED.value,
-        }
+        cascade_status_update(CourierPackage, instance, validated_data)
+        return super().update(instance, validated_data)
 
-        _school_packages_status_map = {
-            CourierPackage.Status.PENDING.value: SchoolPackage.Status.PENDING.value,
-            CourierPackage.Status.IN_TRANSIT.value: SchoolPackage.Status.IN_TRANSIT.value,
-            CourierPackage.Status.ISSUE.value: SchoolPackage.Status.ISSUE.value,
-            CourierPackage.Status.DELIVERED.value: SchoolPackage.Status.DELIVERED.value,
-        }
 
-        _update_institution_package_status_map = {
-            CourierPackage.Status.PENDING.value: InstitutionPackage.Status.PENDING.value,
-            CourierPackage.Status.IN_TRANSIT.value: InstitutionPackage.Status.IN_TRANSIT.value,
-            CourierPackage.Status.ISSUE.value: InstitutionPackage.Status.ISSUE.value,
-            CourierPackage.Status.DELIVERED.value: InstitutionPackage.Status.DELIVERED.value,
+class BulkCourierPackageStatusUpdateSerializer(serializers.ModelSerializer):
+    '''
+    This serializer is used to update status of multiple courier packages at once
+    '''
+    courier_packages = serializers.ListField(child=IntegerIDField(), allow_empty=False)
+    comment = serializers.CharField(required=False)
+
+    class Meta:
+        model = CourierPackage
+        fields = ('courier_packages', 'status', 'comment')
+        extra_kwargs = {
+            'status': {'required': True},
         }
 
-        # Update school packages and orders
-        school_courier_package_ids = instance.courier_package.all().values_list('id', flat=True)
-        SchoolPackage.objects.filter(
-            id__in=school_courier_package_ids
-        ).update(
-            status=_school_packages_status_map.get(status),
-        )
-        Order.objects.filter(school_related_orders__in=school_courier_package_ids).update(
-            status=_order_status_map.get(status)
+    def validate_courier_packages(self, courier_package_ids):
+        courier_package_ids = set(courier_package_ids)
+        existing_ids = set(
+            CourierPackage.objects.filter(id__in=courier_package_ids).values_list('id', flat=True)
         )
+        if missing_ids := courier_package_ids - existing_ids:
+            raise serializers.ValidationError(
+                gettext('Courier packages not found: %(ids)s' % dict(ids=', '.join(map(str, sorted(missing_ids)))))
+            )
+        return list(courier_package_ids)
 
-        # Update institution packages and orders
-        institution_courier_package_ids = instance.institution_courier_package.all().values_list('id', flat=True)
-        InstitutionPackage.objects.filter(
-            id__in=institution_courier_package_ids
-        ).update(
-            status=_update_institution_package_status_map.get(status),
-        )
-        Order.objects.filter(institution_related_orders__in=institution_courier_package_ids).update(
-            status=_order_status_map.get(status)
-        )
-        return super().update(instance, validated_data)
+    def create(self, data):
+        status = data['status']
+        comment = data.get('comment')
+        courier_package_ids = data['courier_packages']
+        with transaction.atomic():
+            order_ids = cascade_package_status(CourierPackage, courier_package_ids, status)
+            BookOrderFact.sync_status(order_ids)
+            UserLedger.refresh_for_orders(Order.objects.filter(id__in=order_ids))
+            schedule_order_daily_stat_refresh(Order.objects.filter(id__in=order_ids))
+            schedule_report_snapshot_refresh()
+            schedule_school_report_snapshot_refresh(Order.objects.filter(id__in=order_ids))
+            if comment:
+                CourierPackageLog.objects.bulk_create([
+                    CourierPackageLog(
+                        courier_package_id=courier_package_id,
+                        snapshot=dict(status=status),
+                        comment=comment,
+                        created_by=self.context['request'].user,
+                    )
+                    for courier_package_id in courier_package_ids
+                ])
+        return CourierPackage.objects.filter(id__in=courier_package_ids)
+
+    def update(self, instance, validated_data):
+        raise Exception('Not allowed')
 
 
 class InstitutionPackageUpdateSerializer(UpdateLogMixin, serializers.ModelSerializer):
@@ -164,15 +184,40 @@ class InstitutionPackageUpdateSerializer(UpdateLogMixin, serializers.ModelSerial
         raise Exception('Not allowed')
 
     def update(self, instance, validated_data):
-        status = validated_data.get('status')
-        instance.related_orders.update(status=status)
-        _order_status_map = {
-            InstitutionPackage.Status.PENDING.value: Order.Status.PENDING.value,
-            InstitutionPackage.Status.IN_TRANSIT.value: Order.Status.IN_TRANSIT.value,
-            InstitutionPackage.Status.ISSUE.value: Order.Status.PENDING.value,
-            InstitutionPackage.Status.DELIVERED.value: Order.Status.COMPLETED.value,
-        }
-        Order.objects.filter(
-            order_code__in=instance.related_orders.all().values_list('order_code', flat=True)
-        ).update(status=_order_status_map.get(status))
+        cascade_status_update(InstitutionPackage, instance, validated_data)
         return super().update(instance, validated_data)
+
+
+class PackageGenerationJobSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = PackageGenerationJob
+        fields = ('order_window',)
+
+    def create(self, validated_data):
+        order_window = validated_data['order_window']
+        # Only one active job per order window, failed job is resumed from it's checkpoint
+        job = PackageGenerationJob.objects.filter(
+            order_window=order_window,
+        ).exclude(
+            status=PackageGenerationJob.Status.SUCCESS.value,
+        ).order_by('-id').first()
+        if job is None:
+            job = PackageGenerationJob.objects.create(
+                order_window=order_window,
+                created_by=self.context['request'].user,
+            )
+        elif job.status == PackageGenerationJob.Status.FAILED.value or job.is_stale:
+            # Failed job or Pending/Started job lost by the worker (No heartbeat) is re-queued
+            job.status = PackageGenerationJob.Status.PENDING.value
+            job.finished_at = None
+            job.heartbeat_at = timezone.now()
+            job.save(update_fields=('status', 'finished_at', 'heartbeat_at'))
+        else:
+            # Pending/Started job is already queued
+            return job
+        transaction.on_commit(lambda: run_package_generation_job.delay(job.pk))
+        return job
+
+    def update(self, instance, validated_data):
+        raise Exception('Not allowed')
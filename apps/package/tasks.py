@@ -0,0 +1,238 @@
+import logging
+import tempfile
+
+from celery import shared_task, group
+from django.conf import settings
+from django.core.files.base import File
+from django.contrib.postgres.aggregates import StringAgg, ArrayAgg
+from django.db import transaction
+from django.db.models import Sum, F, OuterRef, Subquery, CharField
+from django.utils import timezone
+from openpyxl import Workbook
+
+from apps.book.models import Book
+from apps.order.models import BookOrder, OrderWindow
+from apps.package.models import PublisherPackage, PackageGenerationJob
+
+logger = logging.getLogger(__name__)
+
+
+def get_publisher_book_orders_qs(book_order_qs):
+    """
+    Publisher-by-book aggregates of the book orders (Single grouped query)
+    """
+    book_authors = Book.objects.filter(id=OuterRef('book')).annotate(
+        names=StringAgg('authors__name', distinct=True, delimiter=", ")
+    ).values('names')[:1]
+    return book_order_qs.order_by().values('publisher', 'book').annotate(
+        total_quantity=Sum('quantity'),
+        total_price=Sum(F('quantity') * F('price')),
+        # NOTE: Using subquery, joining authors here will multiply the sums
+        book_authors=Subquery(book_authors, output_field=CharField()),
+        related_order_ids=ArrayAgg('order', distinct=True),
+        book__id=F('book__id'),
+        book__title=F('book__title'),
+        book__grade=F('book__grade'),
+        book__language=F('book__language'),
+        book__isbn=F('book__isbn'),
+        book__price=F('book__price'),
+        book__edition=F('book__edition'),
+    ).order_by('publisher', 'book')
+
+
+def generate_publisher_package_export_file(package, related_book_orders, for_school):
+    filename = f'{package.publisher.name}book_orders.xlsx'
+    # Write-only workbook, rows are written to temporary files instead of memory
+    wb = Workbook(write_only=True)
+    ws1 = wb.create_sheet("Book orders")
+    ws1.append([
+        "Package Id", "Book Name", "Book Author/Authors", "Book Grade", "Book ISBN",
+        "Book Edition", "Book Language", "Book Quantity", "Unit Book price",
+        "Sub Total Book price"
+    ])
+
+    # To add sum formula at bottom
+    book_grand_total = 0
+    for book_order in related_book_orders:
+        ws1.append([
+            str(package.package_id),
+            book_order['book__title'] if book_order['book__title'] else "",
+            book_order['book_authors'] if book_order['book_authors'] else "",
+            book_order['book__grade'] if book_order['book__grade'] else "",
+            book_order['book__isbn'] if book_order['book__isbn'] else "",
+            book_order['book__edition'] if book_order['book__edition'] else "",
+            book_order['book__language'] if book_order['book__language'] else "",
+            book_order['total_quantity'] if book_order['total_quantity'] else 0,
+            book_order['book__price'] if book_order['total_quantity'] else 0,
+            book_order['total_price'] if book_order['total_price'] else 0
+        ])
+        book_grand_total += book_order['total_quantity'] * book_order['book__price']
+
+    if for_school:
+        # XXX: Why is ws1 Grand total price here?
+        ws1.append([
+            "", "", "", "", "", "", "", "", "Grand Total Price", book_grand_total
+        ])
+        ws2 = wb.create_sheet("Incentive Orders")
+        ws2.append([
+            "Book Name", "Unit Price", "Quantity", "Sub Total Price"
+        ])
+
+        # To add sum formula at bottom
+        book_incentive_grand_total = 0
+        # Allocated while generating packages (apps.package.incentive.allocate_incentives)
+        for incentive in package.incentive_books:
+            sub_total = incentive['price'] * incentive['quantity']
+            ws2.append(
+                [
+                    incentive['book_name'], incentive['price'],
+                    incentive['quantity'], sub_total
+                ]
+            )
+            book_incentive_grand_total += sub_total
+        ws2.append([
+            "", "", "Grand Total Price", book_incentive_grand_total
+        ])
+
+    with tempfile.TemporaryFile(dir=settings.TEMP_DIR) as export_file:
+        wb.save(export_file)
+        export_file.seek(0)
+        package.orders_export_file.save(filename, File(export_file), save=False)
+
+
+@shared_task(name="publisher_package_export_generator")
+def generate_publisher_package_export(publisher_package_id):
+    package = PublisherPackage.objects.select_related('publisher', 'order_window').get(id=publisher_package_id)
+    PublisherPackage.objects.filter(id=package.id).update(
+        orders_export_status=PublisherPackage.ExportStatus.STARTED.value
+    )
+    try:
+        related_book_orders = get_publisher_book_orders_qs(
+            BookOrder.objects.filter(
+                order__in=package.related_orders.values('id'),
+                publisher=package.publisher_id,
+            )
+        )
+        generate_publisher_package_export_file(
+            package,
+            related_book_orders.iterator(),
+            package.order_window.type == OrderWindow.OrderWindowType.SCHOOL.value,
+        )
+    except Exception:
+        logger.error(f'Failed to generate export for publisher package: {package.id}', exc_info=True)
+        PublisherPackage.objects.filter(id=package.id).update(
+            orders_export_status=PublisherPackage.ExportStatus.FAILED.value
+        )
+        return False
+    package.orders_export_status = PublisherPackage.ExportStatus.SUCCESS.value
+    package.save(update_fields=('orders_export_file', 'orders_export_status'))
+    return True
+
+
+def schedule_publisher_package_exports(publisher_package_ids):
+    """
+    Generate exports (one task per package) after current transaction is committed
+    """
+    publisher_package_ids = list(publisher_package_ids)
+    if publisher_package_ids:
+        transaction.on_commit(
+            lambda: group(
+                generate_publisher_package_export.s(publisher_package_id)
+                for publisher_package_id in publisher_package_ids
+            ).apply_async()
+        )
+
+
+@shared_task(name="package_generation_job")
+def run_package_generation_job(job_id):
+    """
+    Process package generation job stage by stage, chunk by chunk.
+    Each chunk is processed in its own transaction along with the job checkpoint,
+    so a crashed/failed job can be resumed from the last committed chunk.
+    """
+    # NOTE: Imported here to avoid circular import (generator uses helpers from this module)
+    from apps.package.generator import PackageGenerator
+
+    with transaction.atomic():
+        # Claim the job, a re-queued job can't be processed by two workers at once
+        job = PackageGenerationJob.objects.select_for_update(of=('self',)).select_related('order_window').get(id=job_id)
+        if job.status == PackageGenerationJob.Status.SUCCESS:
+            return True
+        if job.status == PackageGenerationJob.Status.STARTED and not job.is_stale:
+            logger.warning(f'Package generation job is already being processed: {job.id}')
+            return False
+        job.status = PackageGenerationJob.Status.STARTED.value
+        job.errors = ''
+        job.started_at = job.started_at or timezone.now()
+        job.heartbeat_at = timezone.now()
+        job.save(update_fields=('status', 'errors', 'started_at', 'heartbeat_at'))
+    generator = PackageGenerator(job.order_window, order_ids=job.order_ids)
+    try:
+        errors = generator.get_errors()
+        if errors:
+            PackageGenerationJob.objects.filter(id=job.id).update(
+                status=PackageGenerationJob.Status.FAILED.value,
+                errors='\n'.join(errors),
+                finished_at=timezone.now(),
+            )
+            return False
+        if job.order_ids is None:
+            # Freeze the orders, orders added later are not mixed into the remaining stages/chunks
+            job.order_ids = generator.get_order_ids()
+            job.save(update_fields=('order_ids',))
+            generator = PackageGenerator(job.order_window, order_ids=job.order_ids)
+        # Resume from the stage of the checkpoint (Previous stages are already completed)
+        stages = generator.stages
+        if job.stage in stages:
+            stages = stages[stages.index(job.stage):]
+        for stage in stages:
+            keys = generator.get_stage_keys(stage)
+            with transaction.atomic():
+                job = PackageGenerationJob.objects.select_for_update().get(id=job.id)
+                if job.stage != stage:
+                    job.stage = stage
+                    job.last_processed_key = None
+                    job.stage_done_rows = 0
+                    job.stage_started_at = timezone.now()
+                if job.last_processed_key is not None:
+                    keys = [key for key in keys if key > job.last_processed_key]
+                job.stage_total_rows = job.stage_done_rows + len(keys)
+                job.heartbeat_at = timezone.now()
+                job.save(update_fields=(
+                    'stage', 'last_processed_key', 'stage_total_rows', 'stage_done_rows', 'stage_started_at',
+                    'heartbeat_at',
+                ))
+            for index in range(0, len(keys), PackageGenerationJob.CHUNK_SIZE):
+                with transaction.atomic():
+                    # Lock the job row and continue from it's committed checkpoint, only one worker can process the chunk
+                    job = PackageGenerationJob.objects.select_for_update().get(id=job.id)
+                    if job.stage != stage:
+                        # NOTE: Stage is already completed by another worker
+                        break
+                    chunk_keys = [
+                        key
+                        for key in keys[index:index + PackageGenerationJob.CHUNK_SIZE]
+                        if job.last_processed_key is None or key > job.last_processed_key
+                    ]
+                    if not chunk_keys:
+                        continue
+                    generator.run_stage(stage, chunk_keys)
+                    job.last_processed_key = chunk_keys[-1]
+                    job.stage_done_rows += len(chunk_keys)
+                    job.heartbeat_at = timezone.now()
+                    job.save(update_fields=('last_processed_key', 'stage_done_rows', 'heartbeat_at'))
+        with transaction.atomic():
+            generator.finalize()
+    except Exception as e:
+        logger.error(f'Failed to process package generation job: {job.id}', exc_info=True)
+        PackageGenerationJob.objects.filter(id=job.id).update(
+            status=PackageGenerationJob.Status.FAILED.value,
+            errors=str(e),
+            finished_at=timezone.now(),
+        )
+        return False
+    PackageGenerationJob.objects.filter(id=job.id).update(
+        status=PackageGenerationJob.Status.SUCCESS.value,
+        finished_at=timezone.now(),
+    )
+    return True
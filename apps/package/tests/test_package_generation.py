@@ -1,3 +1,8 @@
+from io import StringIO
+from unittest import mock
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.core.management import call_command
 
@@ -16,8 +21,14 @@ from apps.order.factories import (
     OrderWindowFactory,
 )
 from apps.package.models import (
-    SchoolPackage, PublisherPackage, CourierPackage, InstitutionPackage
+    SchoolPackage, PublisherPackage, CourierPackage, InstitutionPackage, PackageGenerationJob, CourierPackageLog
 )
+from apps.package.tasks import generate_publisher_package_export, run_package_generation_job
+from apps.package.generator import PackageGenerator
+from apps.package.plan import PackagePlan
+from apps.package.incentive import incentive_catalogue
+from apps.publisher.models import Publisher
+from apps.school.models import School
 from apps.school.factories import SchoolFactory
 from apps.institution.factories import InstitutionFactory
 from apps.common.factories import MunicipalityFactory
@@ -94,6 +105,56 @@ class TestPackageGeneration(GraphQLTestCase):
         }
     '''
 
+    COURIER_PACKAGE_RELATIONS_QUERY = '''
+        query MyQuery($pageSize: Int) {
+          courierPackages(pageSize: $pageSize, ordering: "id") {
+            results {
+              id
+              logs {
+                totalCount
+                results {
+                  id
+                  comment
+                }
+              }
+              schoolPackages {
+                totalCount
+                results {
+                  id
+                  logs {
+                    results {
+                      id
+                    }
+                  }
+                  schoolPackageBooks {
+                    results {
+                      id
+                    }
+                  }
+                }
+              }
+              institutionPackages {
+                totalCount
+              }
+              schoolCourierPackageBooks(pageSize: 2) {
+                totalCount
+                results {
+                  id
+                  quantity
+                }
+              }
+              institutionCourierPackageBooks {
+                totalCount
+              }
+              relatedOrders {
+                id
+                orderCode
+              }
+            }
+          }
+        }
+    '''
+
     INSTITUTION_PACKAGE_QUERY = '''
         query MyQuery {
           institutionPackages {
@@ -140,6 +201,80 @@ class TestPackageGeneration(GraphQLTestCase):
         }
     '''
 
+    GENERATE_PACKAGES_MUTATION = '''
+        mutation Mutation($input: PackageGenerationJobInputType!) {
+          moderatorMutation {
+            generatePackages(data: $input) {
+              ok
+              errors
+              result {
+                id
+                status
+              }
+            }
+          }
+        }
+    '''
+
+    PACKAGE_GENERATION_JOB_QUERY = '''
+        query MyQuery($id: ID!) {
+          packageGenerationJob(id: $id) {
+            id
+            status
+            stage
+            stageTotalRows
+            stageDoneRows
+            eta
+          }
+        }
+    '''
+
+    PACKAGE_PLAN_QUERY = '''
+        query MyQuery($orderWindowId: ID!) {
+          moderatorQuery {
+            packagePlan(orderWindowId: $orderWindowId) {
+              bookOrderCount
+              totalQuantity
+              totalPrice
+              publishers {
+                id
+                totalQuantity
+                totalPrice
+                bookCount
+                incentive
+              }
+              municipalities {
+                id
+                totalQuantity
+                isEligibleForIncentive
+              }
+              users {
+                id
+                totalQuantity
+                totalPrice
+                orderCount
+                isEligibleForIncentive
+              }
+            }
+          }
+        }
+    '''
+
+    BULK_UPDATE_COURIER_PACKAGE_STATUS_MUTATION = '''
+        mutation Mutation($input: BulkCourierPackageStatusUpdateInputType!) {
+          moderatorMutation {
+            bulkUpdateCourierPackageStatus(data: $input) {
+              ok
+              errors
+              result {
+                id
+                status
+              }
+            }
+          }
+        }
+    '''
+
     def setUp(self):
         self.p_1, self.p_2 = PublisherFactory.create_batch(2)
         self.u1_p1 = UserFactory.create(publisher=self.p_1, user_type=User.UserType.PUBLISHER, is_verified=True)
@@ -290,6 +425,17 @@ class TestPackageGeneration(GraphQLTestCase):
         self.assertEqual(content['publisherPackages']['results'][0]['totalPrice'], 8000)
         self.assertEqual(content['publisherPackages']['results'][0]['totalQuantity'], 80)
 
+    def test_publisher_package_exports(self):
+        call_command('generate_packages', self.school_order_window.id)
+        publisher_package = PublisherPackage.objects.get(publisher=self.p_1, order_window=self.school_order_window)
+        # Exports are generated by celery after commit
+        self.assertEqual(publisher_package.orders_export_status, PublisherPackage.ExportStatus.PENDING)
+
+        self.assertTrue(generate_publisher_package_export(publisher_package.id))
+        publisher_package.refresh_from_db()
+        self.assertEqual(publisher_package.orders_export_status, PublisherPackage.ExportStatus.SUCCESS)
+        self.assertTrue(bool(publisher_package.orders_export_file))
+
     def test_courier_packages(self):
         call_command('generate_packages', self.school_order_window.id)
         # Test publisher 1
@@ -311,6 +457,35 @@ class TestPackageGeneration(GraphQLTestCase):
         self.assertEqual(content['courierPackages']['results'][1]['totalPrice'], 8000)
         self.assertEqual(content['courierPackages']['results'][1]['totalQuantity'], 80)
 
+    def test_courier_package_relations(self):
+        call_command('generate_packages', self.school_order_window.id)
+        courier_packages = list(CourierPackage.objects.filter(order_window=self.school_order_window).order_by('id'))
+        CourierPackageLog.objects.create(
+            courier_package=courier_packages[0], comment='Dispatched', created_by=self.moderator,
+        )
+        self.force_login(self.moderator)
+
+        query_counts = []
+        for page_size in [1, 2]:
+            with CaptureQueriesContext(connection) as queries:
+                content = self.query_check(self.COURIER_PACKAGE_RELATIONS_QUERY, variables={'pageSize': page_size})
+            results = content['data']['courierPackages']['results']
+            self.assertEqual(len(results), page_size)
+            query_counts.append(len(queries))
+        # Nested relations are batched, so query count doesn't depend on the number of courier packages
+        self.assertEqual(query_counts[0], query_counts[1])
+
+        self.assertEqual([item['comment'] for item in results[0]['logs']['results']], ['Dispatched'])
+        self.assertEqual(results[1]['logs']['totalCount'], 0)
+        self.assertEqual(results[0]['schoolPackages']['totalCount'], courier_packages[0].courier_package.count())
+        self.assertEqual(results[0]['institutionPackages']['totalCount'], 0)
+        # Paginated in memory
+        self.assertEqual(results[0]['schoolCourierPackageBooks']['totalCount'], 3)
+        self.assertEqual(len(results[0]['schoolCourierPackageBooks']['results']), 2)
+        self.assertEqual(results[1]['schoolCourierPackageBooks']['totalCount'], 2)
+        self.assertEqual(len(results[0]['relatedOrders']), 3)
+        self.assertEqual(len(results[1]['relatedOrders']), 2)
+
     def test_institution_packages(self):
         call_command('generate_packages', self.institution_order_window.id)
 
@@ -384,3 +559,227 @@ class TestPackageGeneration(GraphQLTestCase):
         self.assertEqual(content['courierPackages']['results'][0]['totalQuantity'], 40)
         self.assertEqual(content['courierPackages']['results'][1]['totalPrice'], 4000)
         self.assertEqual(content['courierPackages']['results'][1]['totalQuantity'], 40)
+
+    def test_package_generation_job(self):
+        def _query_check(**kwargs):
+            return self.query_check(
+                self.GENERATE_PACKAGES_MUTATION,
+                minput={'orderWindow': str(self.school_order_window.pk)},
+                **kwargs,
+            )
+
+        # Only moderator is allowed
+        self.force_login(self.s_1)
+        _query_check(assert_for_error=True)
+
+        self.force_login(self.moderator)
+        content = _query_check(okay=True, mnested=['moderatorMutation'])
+        job_id = content['data']['moderatorMutation']['generatePackages']['result']['id']
+        # Same job is returned until it is completed
+        content = _query_check(okay=True, mnested=['moderatorMutation'])
+        self.assertEqual(content['data']['moderatorMutation']['generatePackages']['result']['id'], job_id)
+
+        # Job is already being processed by another worker
+        PackageGenerationJob.objects.filter(pk=job_id).update(
+            status=PackageGenerationJob.Status.STARTED,
+            heartbeat_at=timezone.now(),
+        )
+        self.assertFalse(run_package_generation_job(job_id))
+        content = _query_check(okay=True, mnested=['moderatorMutation'])
+        self.assertEqual(
+            content['data']['moderatorMutation']['generatePackages']['result']['status'],
+            self.genum(PackageGenerationJob.Status.STARTED),
+        )
+        # Started job without a heartbeat is re-queued
+        PackageGenerationJob.objects.filter(pk=job_id).update(
+            heartbeat_at=timezone.now() - PackageGenerationJob.STALE_TIMEOUT * 2,
+        )
+        content = _query_check(okay=True, mnested=['moderatorMutation'])
+        self.assertEqual(content['data']['moderatorMutation']['generatePackages']['result']['id'], job_id)
+        self.assertEqual(
+            content['data']['moderatorMutation']['generatePackages']['result']['status'],
+            self.genum(PackageGenerationJob.Status.PENDING),
+        )
+
+        # Simulate crash after the first school chunk, job should resume from the checkpoint
+        generator = PackageGenerator(self.school_order_window)
+        generator.run_stage(PackageGenerationJob.Stage.PUBLISHER_PACKAGE)
+        generator.run_stage(PackageGenerationJob.Stage.COURIER_PACKAGE)
+        generator.run_stage(PackageGenerationJob.Stage.SCHOOL_PACKAGE, [self.s_1.pk])
+        PackageGenerationJob.objects.filter(pk=job_id).update(
+            status=PackageGenerationJob.Status.FAILED,
+            stage=PackageGenerationJob.Stage.SCHOOL_PACKAGE,
+            last_processed_key=self.s_1.pk,
+            stage_done_rows=1,
+            stage_total_rows=2,
+        )
+        content = _query_check(okay=True, mnested=['moderatorMutation'])
+        self.assertEqual(content['data']['moderatorMutation']['generatePackages']['result']['id'], job_id)
+
+        self.assertTrue(run_package_generation_job(job_id))
+        content = self.query_check(self.PACKAGE_GENERATION_JOB_QUERY, variables={'id': job_id})['data']
+        self.assertEqual(content['packageGenerationJob']['status'], self.genum(PackageGenerationJob.Status.SUCCESS))
+        self.assertEqual(content['packageGenerationJob']['stage'], self.genum(PackageGenerationJob.Stage.SCHOOL_PACKAGE))
+        self.assertEqual(content['packageGenerationJob']['stageDoneRows'], 2)
+        # Existing packages are not duplicated
+        self.assertEqual(SchoolPackage.objects.filter(order_window=self.school_order_window).count(), 2)
+        self.assertEqual(PublisherPackage.objects.filter(order_window=self.school_order_window).count(), 2)
+        self.assertEqual(CourierPackage.objects.filter(order_window=self.school_order_window).count(), 2)
+        # Orders are frozen at the job start
+        self.assertEqual(
+            sorted(PackageGenerationJob.objects.get(pk=job_id).order_ids),
+            sorted(PackageGenerator(self.school_order_window).get_order_ids()),
+        )
+
+        # Rerun is a no-op
+        call_command('generate_packages', self.school_order_window.id)
+        self.assertEqual(SchoolPackage.objects.filter(order_window=self.school_order_window).count(), 2)
+        self.assertEqual(PublisherPackage.objects.filter(order_window=self.school_order_window).count(), 2)
+
+    def test_package_plan(self):
+        self.force_login(self.moderator)
+        content = self.query_check(
+            self.PACKAGE_PLAN_QUERY, variables={'orderWindowId': self.school_order_window.pk}
+        )['data']['moderatorQuery']['packagePlan']
+        self.assertEqual(content['bookOrderCount'], 5)
+        self.assertEqual(content['totalQuantity'], 170)
+        self.assertEqual(content['totalPrice'], 17000)
+        self.assertEqual(
+            [
+                (item['id'], item['totalQuantity'], item['totalPrice'], item['bookCount'], item['incentive'])
+                for item in content['publishers']
+            ],
+            [
+                (str(self.p_1.pk), 90, 9000, 3, 1),
+                (str(self.p_2.pk), 80, 8000, 2, 1),
+            ],
+        )
+        self.assertEqual(
+            [
+                (item['id'], item['totalQuantity'], item['totalPrice'], item['orderCount'], item['isEligibleForIncentive'])
+                for item in content['users']
+            ],
+            [
+                (str(self.s_1.pk), 90, 9000, 3, True),
+                (str(self.s_2.pk), 80, 8000, 2, True),
+            ],
+        )
+        self.assertEqual(len(content['municipalities']), 2)
+
+        # Change in the incentive settings isn't served from the cached plan
+        OrderWindow.objects.filter(pk=self.school_order_window.pk).update(enable_incentive=False)
+        users = self.query_check(
+            self.PACKAGE_PLAN_QUERY, variables={'orderWindowId': self.school_order_window.pk}
+        )['data']['moderatorQuery']['packagePlan']['users']
+        self.assertEqual([item['isEligibleForIncentive'] for item in users], [False, False])
+        OrderWindow.objects.filter(pk=self.school_order_window.pk).update(enable_incentive=True)
+
+        # Dry run shouldn't create anything
+        call_command('generate_packages', self.school_order_window.id, dry_run=True)
+        self.assertFalse(PublisherPackage.objects.filter(order_window=self.school_order_window).exists())
+        self.assertFalse(CourierPackage.objects.filter(order_window=self.school_order_window).exists())
+
+        # Change in the user locations isn't served from the cached plan
+        school_2 = self.s_2.school
+        School.objects.filter(pk=school_2.pk).update(municipality=self.s_1.school.municipality)
+        self.assertEqual(len(PackageGenerator(self.school_order_window).plan['municipalities']), 1)
+        School.objects.filter(pk=school_2.pk).update(municipality=school_2.municipality)
+
+        # Generation reuses the cached plan and matches it
+        with mock.patch.object(PackagePlan, 'compute', side_effect=AssertionError('Plan is recomputed')):
+            call_command('generate_packages', self.school_order_window.id)
+        courier_packages = CourierPackage.objects.filter(order_window=self.school_order_window).order_by('municipality')
+        self.assertEqual(
+            [(str(package.municipality_id), package.total_quantity) for package in courier_packages],
+            [(item['id'], item['totalQuantity']) for item in content['municipalities']],
+        )
+
+    def test_school_bills(self):
+        call_command('generate_packages', self.school_order_window.id)
+        # Second school is below the incentive threshold
+        SchoolPackage.objects.filter(school=self.s_2).update(incentive_quantity=0)
+
+        out = StringIO()
+        call_command('generate_bill_for_schools', self.school_order_window.id, workers=1, stdout=out)
+        self.assertIn('2 School bills generated.', out.getvalue())
+        self.assertIn('Download link:', out.getvalue())
+
+    def test_incentive_allocation(self):
+        self.p_1.internal_code = Publisher.InternalCodeType.ENGLISH
+        self.p_1.save()
+        call_command('generate_packages', self.school_order_window.id)
+
+        # min(90 * 3, 120) and min(80 * 3, 120)
+        self.assertEqual(
+            list(
+                SchoolPackage.objects.filter(
+                    order_window=self.school_order_window
+                ).order_by('school').values_list('incentive_quantity', 'incentive_price')
+            ),
+            [(120, incentive_catalogue.get_total_price(120))] * 2,
+        )
+        incentive_books = incentive_catalogue.get_books_by_publisher(120)[Publisher.InternalCodeType.ENGLISH.value]
+        p_1_package = PublisherPackage.objects.get(publisher=self.p_1, order_window=self.school_order_window)
+        self.assertEqual(p_1_package.incentive_quantity, 2 * sum(book['quantity'] for book in incentive_books))
+        self.assertEqual(
+            p_1_package.incentive_price, int(2 * sum(book['quantity'] * book['price'] for book in incentive_books))
+        )
+        # Publisher without internal code doesn't get incentive books
+        p_2_package = PublisherPackage.objects.get(publisher=self.p_2, order_window=self.school_order_window)
+        self.assertEqual(p_2_package.incentive_books, [])
+        self.assertEqual(p_2_package.incentive_quantity, 0)
+
+    def test_incentive_catalogue_unknown_tier(self):
+        # Incentive quantity without a tier uses the nearest lower tier
+        self.assertEqual(incentive_catalogue.get_tier(42), 40)
+        self.assertEqual(incentive_catalogue.get_books(42), incentive_catalogue.get_books(40))
+        self.assertEqual(incentive_catalogue.get_total_price(42), incentive_catalogue.get_total_price(40))
+        self.assertEqual(incentive_catalogue.get_tier(500), 120)
+        # Below the lowest tier
+        self.assertEqual(incentive_catalogue.get_tier(10), None)
+        self.assertEqual(incentive_catalogue.get_books(10), [])
+        self.assertEqual(incentive_catalogue.get_total_price(10), 0)
+
+    def test_bulk_courier_package_status_update(self):
+        call_command('generate_packages', self.school_order_window.id)
+        courier_packages = list(CourierPackage.objects.filter(order_window=self.school_order_window))
+
+        def _query_check(courier_package_ids, status, **kwargs):
+            return self.query_check(
+                self.BULK_UPDATE_COURIER_PACKAGE_STATUS_MUTATION,
+                minput={
+                    'courierPackages': [str(_id) for _id in courier_package_ids],
+                    'status': self.genum(status),
+                    'comment': 'Dispatched',
+                },
+                **kwargs,
+            )
+
+        # Only moderator is allowed
+        self.force_login(self.s_1)
+        _query_check([package.pk for package in courier_packages], CourierPackage.Status.IN_TRANSIT, assert_for_error=True)
+
+        self.force_login(self.moderator)
+        # Unknown courier package
+        _query_check([0], CourierPackage.Status.IN_TRANSIT, okay=False, mnested=['moderatorMutation'])
+
+        content = _query_check(
+            [package.pk for package in courier_packages], CourierPackage.Status.DELIVERED,
+            okay=True, mnested=['moderatorMutation'],
+        )
+        result = content['data']['moderatorMutation']['bulkUpdateCourierPackageStatus']['result']
+        self.assertEqual({item['status'] for item in result}, {self.genum(CourierPackage.Status.DELIVERED)})
+        # Cascaded to school packages and orders
+        self.assertEqual(
+            set(SchoolPackage.objects.filter(order_window=self.school_order_window).values_list('status', flat=True)),
+            {SchoolPackage.Status.DELIVERED.value},
+        )
+        self.assertEqual(
+            set(Order.objects.filter(created_by__in=[self.s_1, self.s_2]).values_list('status', flat=True)),
+            {Order.Status.COMPLETED.value},
+        )
+        # Institution orders are untouched
+        self.assertEqual(
+            set(Order.objects.filter(created_by__in=[self.i_1, self.i_2]).values_list('status', flat=True)),
+            {Order.Status.PENDING.value},
+        )
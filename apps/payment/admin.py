@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from apps.payment.models import Payment, PaymentLog
+from apps.payment.models import Payment, PaymentLog, UserLedger
 
 
 class PaymentLogAdmin(admin.TabularInline):
@@ -11,3 +11,14 @@ class PaymentLogAdmin(admin.TabularInline):
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     inlines = [PaymentLogAdmin]
+
+
+@admin.register(UserLedger)
+class UserLedgerAdmin(admin.ModelAdmin):
+    list_display = [
+        'user', 'payment_credit_sum', 'payment_debit_sum', 'total_order_pending_price', 'outstanding_balance', 'updated_at',
+    ]
+    autocomplete_fields = ['user']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
@@ -0,0 +1,76 @@
+# Generated by Django 3.2.16 on 2026-10-19 16:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BACKFILL_SQL = '''
+INSERT INTO payment_userledger (
+    user_id, payment_credit_sum, payment_debit_sum, total_unverified_payment,
+    total_unverified_payment_count, total_verified_payment_count, total_order_pending_price,
+    outstanding_balance, updated_at
+)
+SELECT
+    "user".id,
+    COALESCE(payment.payment_credit_sum, 0),
+    COALESCE(payment.payment_debit_sum, 0),
+    COALESCE(payment.total_unverified_payment, 0),
+    COALESCE(payment.total_unverified_payment_count, 0),
+    COALESCE(payment.total_verified_payment_count, 0),
+    COALESCE(order_value.value, 0),
+    COALESCE(payment.payment_credit_sum, 0) - COALESCE(payment.payment_debit_sum, 0) - COALESCE(order_value.value, 0),
+    NOW()
+FROM user_user AS "user"
+    LEFT OUTER JOIN (
+        SELECT
+            paid_by_id,
+            SUM(amount) FILTER (WHERE transaction_type = 'credit' AND status = 'verified') AS payment_credit_sum,
+            SUM(amount) FILTER (WHERE transaction_type = 'debit' AND status = 'verified') AS payment_debit_sum,
+            SUM(amount) FILTER (WHERE transaction_type = 'credit' AND status = 'pending') AS total_unverified_payment,
+            COUNT(*) FILTER (WHERE transaction_type = 'credit' AND status = 'pending') AS total_unverified_payment_count,
+            COUNT(*) FILTER (WHERE transaction_type = 'credit' AND status = 'verified') AS total_verified_payment_count
+        FROM payment_payment
+        GROUP BY paid_by_id
+    ) AS payment ON payment.paid_by_id = "user".id
+    LEFT OUTER JOIN (
+        SELECT
+            "order".created_by_id,
+            SUM(book_order.price * book_order.quantity) AS value
+        FROM order_order AS "order"
+            INNER JOIN order_bookorder AS book_order ON book_order.order_id = "order".id
+        WHERE "order".status IN ('pending', 'completed')
+        GROUP BY "order".created_by_id
+    ) AS order_value ON order_value.created_by_id = "user".id
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('order', '0015_order_location'),
+        ('payment', '0004_alter_payment_paid_by'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserLedger',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ledger', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='User')),
+                ('payment_credit_sum', models.FloatField(default=0, verbose_name='Verified credit')),
+                ('payment_debit_sum', models.FloatField(default=0, verbose_name='Verified debit')),
+                ('total_unverified_payment', models.FloatField(default=0, verbose_name='Pending credit')),
+                ('total_unverified_payment_count', models.PositiveIntegerField(default=0, verbose_name='Pending credit count')),
+                ('total_verified_payment_count', models.PositiveIntegerField(default=0, verbose_name='Verified credit count')),
+                ('total_order_pending_price', models.FloatField(default=0, verbose_name='Order value')),
+                ('outstanding_balance', models.FloatField(db_index=True, default=0, verbose_name='Outstanding balance')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+            ],
+            options={
+                'verbose_name': 'User ledger',
+                'verbose_name_plural': 'User ledgers',
+            },
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -1,8 +1,13 @@
-from django.db import models
+import time
+
+from django.core.cache import cache
+from django.db import models, transaction
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from apps.common.models import BaseActivityLog
 from apps.user.models import User
+from apps.order.models import Order, BookOrder
 
 
 class Payment(models.Model):
@@ -62,6 +67,20 @@ class Payment(models.Model):
         verbose_name = _('Payment')
         verbose_name_plural = _('Payment')
 
+    # Payment summary is cached per viewer, all entries are invalidated together by changing the version
+    SUMMARY_CACHE_KEY = 'payment-summary-{version}-{user}'
+    SUMMARY_CACHE_VERSION_KEY = 'payment-summary-version'
+    SUMMARY_CACHE_TIMEOUT = 60 * 60  # Seconds
+
+    @classmethod
+    def get_summary_cache_key(cls, user):
+        version = cache.get_or_set(cls.SUMMARY_CACHE_VERSION_KEY, time.time_ns, timeout=None)
+        return cls.SUMMARY_CACHE_KEY.format(version=version, user=user.pk)
+
+    @classmethod
+    def clear_summary_cache(cls):
+        cache.set(cls.SUMMARY_CACHE_VERSION_KEY, time.time_ns(), timeout=None)
+
 
 class PaymentLog(BaseActivityLog):
     payment = models.ForeignKey(
@@ -75,3 +94,147 @@ class PaymentLog(BaseActivityLog):
     class Meta:
         verbose_name = _('Payment log')
         verbose_name_plural = _('Payment log')
+
+
+class UserLedger(models.Model):
+    """
+    Payment and order balance of the user, maintained by payment/order mutations (See refresh)
+    Used by the moderator user list and package generation instead of computing it per user row.
+    """
+    # Orders counted as payable
+    ORDER_STATUSES = [Order.Status.PENDING.value, Order.Status.COMPLETED.value]
+    BALANCE_FIELDS = (
+        'payment_credit_sum',
+        'payment_debit_sum',
+        'total_unverified_payment',
+        'total_unverified_payment_count',
+        'total_verified_payment_count',
+        'total_order_pending_price',
+        'outstanding_balance',
+    )
+    # Number of users compared per reconcile iteration
+    RECONCILE_CHUNK_SIZE = 1000
+
+    user = models.OneToOneField(
+        User, verbose_name=_('User'), related_name='ledger',
+        on_delete=models.CASCADE, primary_key=True
+    )
+    payment_credit_sum = models.FloatField(default=0, verbose_name=_('Verified credit'))
+    payment_debit_sum = models.FloatField(default=0, verbose_name=_('Verified debit'))
+    total_unverified_payment = models.FloatField(default=0, verbose_name=_('Pending credit'))
+    total_unverified_payment_count = models.PositiveIntegerField(default=0, verbose_name=_('Pending credit count'))
+    total_verified_payment_count = models.PositiveIntegerField(default=0, verbose_name=_('Verified credit count'))
+    total_order_pending_price = models.FloatField(default=0, verbose_name=_('Order value'))
+    outstanding_balance = models.FloatField(default=0, db_index=True, verbose_name=_('Outstanding balance'))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Updated at'))
+
+    class Meta:
+        verbose_name = _('User ledger')
+        verbose_name_plural = _('User ledgers')
+
+    def __str__(self):
+        return str(self.user_id)
+
+    @classmethod
+    def refresh(cls, user_ids):
+        """
+        Recompute ledger of provided users (Use after creating/changing payments or orders)
+        """
+        user_ids = sorted(set(user_ids))
+        if not user_ids:
+            return
+        with transaction.atomic():
+            # Serialize refreshes of the same ledgers (Locked in id order to avoid deadlocks), missing ledgers are
+            # created first so that they can be locked as well.
+            # Ledgers are computed after the lock so that changes committed by the previous holder are included.
+            cls.objects.bulk_create([cls(user_id=user_id) for user_id in user_ids], ignore_conflicts=True)
+            list(cls.objects.select_for_update().filter(user__in=user_ids).order_by('user').values_list('user', flat=True))
+            cls.objects.bulk_update(cls.compute(user_ids), fields=(*cls.BALANCE_FIELDS, 'updated_at'))
+        # Payment summary uses the same payments/orders
+        Payment.clear_summary_cache()
+        # Clear again after commit, value can be cached from old state by other requests in between
+        transaction.on_commit(Payment.clear_summary_cache)
+
+    @classmethod
+    def compute(cls, user_ids):
+        """
+        Return (unsaved) ledgers of provided users computed from the payments/orders
+        """
+        verified_credit = models.Q(
+            transaction_type=Payment.TransactionType.CREDIT.value,
+            status=Payment.Status.VERIFIED.value,
+        )
+        pending_credit = models.Q(
+            transaction_type=Payment.TransactionType.CREDIT.value,
+            status=Payment.Status.PENDING.value,
+        )
+        verified_debit = models.Q(
+            transaction_type=Payment.TransactionType.DEBIT.value,
+            status=Payment.Status.VERIFIED.value,
+        )
+        payment_stat_by_user = {
+            row['paid_by']: row
+            for row in Payment.objects.filter(paid_by__in=user_ids).order_by().values('paid_by').annotate(
+                payment_credit_sum=models.Sum('amount', filter=verified_credit),
+                payment_debit_sum=models.Sum('amount', filter=verified_debit),
+                total_unverified_payment=models.Sum('amount', filter=pending_credit),
+                total_unverified_payment_count=models.Count('id', filter=pending_credit),
+                total_verified_payment_count=models.Count('id', filter=verified_credit),
+            )
+        }
+        order_value_by_user = dict(
+            BookOrder.objects.filter(
+                order__created_by__in=user_ids,
+                order__status__in=cls.ORDER_STATUSES,
+            ).order_by().values('order__created_by').annotate(
+                value=models.Sum(models.F('price') * models.F('quantity')),
+            ).values_list('order__created_by', 'value')
+        )
+        now = timezone.now()
+        ledgers = []
+        for user_id in user_ids:
+            payment_stat = payment_stat_by_user.get(user_id, {})
+            ledger = cls(
+                user_id=user_id,
+                # NOTE: bulk_update doesn't set auto_now fields
+                updated_at=now,
+                payment_credit_sum=payment_stat.get('payment_credit_sum') or 0,
+                payment_debit_sum=payment_stat.get('payment_debit_sum') or 0,
+                total_unverified_payment=payment_stat.get('total_unverified_payment') or 0,
+                total_unverified_payment_count=payment_stat.get('total_unverified_payment_count') or 0,
+                total_verified_payment_count=payment_stat.get('total_verified_payment_count') or 0,
+                total_order_pending_price=order_value_by_user.get(user_id) or 0,
+            )
+            ledger.outstanding_balance = (
+                ledger.payment_credit_sum - ledger.payment_debit_sum - ledger.total_order_pending_price
+            )
+            ledgers.append(ledger)
+        return ledgers
+
+    @classmethod
+    def refresh_for_orders(cls, order_qs):
+        cls.refresh(order_qs.order_by().values_list('created_by', flat=True).distinct())
+
+    @classmethod
+    def reconcile(cls):
+        """
+        Refresh ledgers which are out of sync (Changes made outside of the mutations, eg: admin, shell)
+        Ledgers are compared without any lock, only the out of sync ones are locked and refreshed.
+        """
+        default_balance = {field: cls._meta.get_field(field).default for field in cls.BALANCE_FIELDS}
+        user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+        out_of_sync_user_ids = []
+        for index in range(0, len(user_ids), cls.RECONCILE_CHUNK_SIZE):
+            chunk_user_ids = user_ids[index: index + cls.RECONCILE_CHUNK_SIZE]
+            current_balance_by_user = {
+                row.pop('user'): row
+                for row in cls.objects.filter(user__in=chunk_user_ids).values('user', *cls.BALANCE_FIELDS)
+            }
+            for ledger in cls.compute(chunk_user_ids):
+                # Users without ledger have the default (0) balance
+                current_balance = current_balance_by_user.get(ledger.user_id, default_balance)
+                if any(current_balance[field] != getattr(ledger, field) for field in cls.BALANCE_FIELDS):
+                    out_of_sync_user_ids.append(ledger.user_id)
+        for index in range(0, len(out_of_sync_user_ids), cls.RECONCILE_CHUNK_SIZE):
+            cls.refresh(out_of_sync_user_ids[index: index + cls.RECONCILE_CHUNK_SIZE])
+        return len(out_of_sync_user_ids)
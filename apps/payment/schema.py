@@ -2,7 +2,8 @@ import graphene
 from graphene_django import DjangoObjectType
 from graphene_django_extras import PageGraphqlPagination, DjangoObjectField
 
-from django.db.models import QuerySet, Sum, F
+from django.core.cache import cache
+from django.db.models import QuerySet, Sum, Count, F, Q
 
 from utils.graphene.types import CustomDjangoListObjectType
 from utils.graphene.fields import DjangoPaginatedListObjectField, CustomDjangoListField
@@ -18,7 +19,7 @@ from .enums import (
     PaymentTypeEnum,
 )
 from apps.common.schema import ActivityFileType
-from apps.order.models import Order
+from apps.order.models import Order, BookOrder
 
 
 def get_payment_qs(info):
@@ -34,6 +35,47 @@ def get_payment_qs(info):
     return Payment.objects.none()
 
 
+def get_payment_summary(info):
+    """
+    Totals of the visible payments (Single scan using conditional aggregates)
+    """
+    verified_credit = Q(transaction_type=Payment.TransactionType.CREDIT.value, status=Payment.Status.VERIFIED.value)
+    verified_debit = Q(transaction_type=Payment.TransactionType.DEBIT.value, status=Payment.Status.VERIFIED.value)
+    pending_credit = Q(transaction_type=Payment.TransactionType.CREDIT.value, status=Payment.Status.PENDING.value)
+    payment_summary = get_payment_qs(info).aggregate(
+        payment_credit_sum=Sum('amount', filter=verified_credit),
+        payment_debit_sum=Sum('amount', filter=verified_debit),
+        total_verified_payment_count=Count('id', filter=verified_credit),
+        total_unverified_payment=Sum('amount', filter=pending_credit),
+        total_unverified_payment_count=Count('id', filter=pending_credit),
+    )
+
+    total_order_pending_price = BookOrder.objects.filter(
+        order__status=Order.Status.PENDING.value,
+        order__created_by=info.context.user,
+    ).aggregate(total_price=Sum(F('price') * F('quantity')))['total_price'] or 0
+
+    payment_credit_sum = payment_summary['payment_credit_sum'] or 0
+    payment_debit_sum = payment_summary['payment_debit_sum'] or 0
+
+    outstanding_balance = (
+        payment_credit_sum -
+        payment_debit_sum -
+        total_order_pending_price
+    )
+
+    return {
+        'payment_credit_sum': payment_credit_sum,
+        'payment_debit_sum': payment_debit_sum,
+        'total_verified_payment': payment_credit_sum,
+        'total_verified_payment_count': payment_summary['total_verified_payment_count'],
+        'total_unverified_payment': payment_summary['total_unverified_payment'] or 0,
+        'total_unverified_payment_count': payment_summary['total_unverified_payment_count'],
+        'total_order_pending_price': total_order_pending_price,
+        'outstanding_balance': outstanding_balance
+    }
+
+
 class PaymentLogType(DjangoObjectType):
     files = CustomDjangoListField(ActivityFileType, required=False)
 
@@ -112,40 +154,9 @@ class Query(graphene.ObjectType):
 
     @staticmethod
     def resolve_payment_summary(root, info, **kwargs):
-        payment_summary = get_payment_qs(info).annotate(
-            **User.annotate_user_payment_statement()
-        ).aggregate(
-            Sum('payment_credit_sum'),
-            Sum('payment_debit_sum'),
-            Sum('total_verified_payment'),
-            Sum('total_verified_payment_count'),
-            Sum('total_unverified_payment'),
-            Sum('total_unverified_payment_count'),
-        )
-
-        total_order_pending_price = Order.objects.filter(
-            status=Order.Status.PENDING.value,
-            created_by=info.context.user
-        ).annotate(grand_total_price=F('book_order__price') * F('book_order__quantity')).aggregate(
-            Sum('grand_total_price')
-        )['grand_total_price__sum'] or 0
-
-        payment_credit_sum = payment_summary['payment_credit_sum__sum'] or 0
-        payment_debit_sum = payment_summary['payment_debit_sum__sum'] or 0
-
-        outstanding_balance = (
-            payment_credit_sum -
-            payment_debit_sum -
-            total_order_pending_price
-        )
-
-        return {
-            'payment_credit_sum': payment_summary['payment_credit_sum__sum'] or 0,
-            'payment_debit_sum': payment_summary['payment_debit_sum__sum'] or 0,
-            'total_verified_payment': payment_summary['total_verified_payment__sum'] or 0,
-            'total_verified_payment_count': payment_summary['total_verified_payment_count__sum'] or 0,
-            'total_unverified_payment': payment_summary['total_unverified_payment__sum'] or 0,
-            'total_unverified_payment_count': payment_summary['total_unverified_payment_count__sum'] or 0,
-            'total_order_pending_price': total_order_pending_price,
-            'outstanding_balance': outstanding_balance
-        }
+        cache_key = Payment.get_summary_cache_key(info.context.user)
+        payment_summary = cache.get(cache_key)
+        if payment_summary is None:
+            payment_summary = get_payment_summary(info)
+            cache.set(cache_key, payment_summary, timeout=Payment.SUMMARY_CACHE_TIMEOUT)
+        return payment_summary
@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from django.utils.translation import gettext_lazy as _
 
-from apps.payment.models import Payment, PaymentLog
+from apps.payment.models import Payment, PaymentLog, UserLedger
 from config.serializers import CreatedUpdatedBaseSerializer
 
 
@@ -45,6 +45,7 @@ class PaymentSerializer(CreatedUpdatedBaseSerializer, serializers.ModelSerialize
             )
             if files:
                 payment_log.files.add(*files)
+        UserLedger.refresh([payment.paid_by_id])
         return payment
 
 
@@ -69,4 +70,5 @@ class PaymentUpdateSerializer(CreatedUpdatedBaseSerializer, serializers.ModelSer
             )
             if files:
                 payment_log.files.add(*files)
+        UserLedger.refresh([payment.paid_by_id])
         return payment
@@ -0,0 +1,16 @@
+import logging
+
+from celery import shared_task
+
+from apps.payment.models import UserLedger
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(name="user_ledger_reconcile")
+def reconcile_user_ledgers():
+    """
+    Fixes any drift of the ledgers from changes made outside of the mutations (admin, shell)
+    """
+    user_count = UserLedger.reconcile()
+    logger.info(f'User ledger: {user_count} users reconciled')
@@ -4,7 +4,7 @@ from apps.user.factories import UserFactory
 from apps.payment.factories import PaymentFactory
 from apps.user.models import User
 from apps.payment.filter_set import PaymentFilterSet
-from apps.payment.models import Payment
+from apps.payment.models import Payment, UserLedger
 
 
 class TestPaymentQuery(GraphQLTestCase):
@@ -188,6 +188,9 @@ class TestPaymentQuery(GraphQLTestCase):
         self.assertTrue(content['data']['moderatorMutation']['createPayment']['ok'], content)
         self.assertTrue(content['data']['moderatorMutation']['createPayment']['result']['paidBy']['id'], other_user.id)
         response_id = content['data']['moderatorMutation']['createPayment']['result']['id']
+        # Ledger is updated with the payment
+        ledger = UserLedger.objects.get(user=other_user)
+        self.assertEqual((ledger.total_unverified_payment, ledger.total_unverified_payment_count), (123.72, 1))
 
         minput = dict(
             amount=123.72,
@@ -208,3 +211,5 @@ class TestPaymentQuery(GraphQLTestCase):
             content['data']['moderatorMutation']['updatePayment']['result']['status'],
             self.genum(Payment.Status.CANCELLED)
         )
+        ledger.refresh_from_db()
+        self.assertEqual((ledger.total_unverified_payment, ledger.total_unverified_payment_count), (0, 0))
@@ -48,3 +48,13 @@ class School(models.Model):
 
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        is_new = self.pk is None
+        resp = super().save(*args, **kwargs)
+        if not is_new:
+            # NOTE: Imported here to avoid circular import
+            from apps.user.models import User
+            # Keep the denormalized location of the users in sync
+            User.sync_location(User.objects.filter(school=self.pk))
+        return resp
@@ -36,34 +36,23 @@ class UserFilter(django_filters.FilterSet):
         ).distinct()
 
     def filter_order_mismatch_users(self, queryset, name, value):
+        # NOTE: Filter using the ledger directly (indexed), users without ledger have 0 balance
         if not value:
-            return queryset.filter(outstanding_balance__gte=0)
+            return queryset.exclude(ledger__outstanding_balance__lt=0)
 
-        return queryset.filter(outstanding_balance__lt=0).distinct()
+        return queryset.filter(ledger__outstanding_balance__lt=0)
 
     def filter_provinces(self, queryset, name, value):
         if not value:
             return queryset
-        return queryset.filter(
-            Q(school__province__in=value) |
-            Q(institution__province__in=value) |
-            Q(publisher__province__in=value)
-        )
+        return queryset.filter(province__in=value)
 
     def filter_districts(self, queryset, name, value):
         if not value:
             return queryset
-        return queryset.filter(
-            Q(school__district__in=value) |
-            Q(institution__district__in=value) |
-            Q(publisher__district__in=value)
-        )
+        return queryset.filter(district__in=value)
 
     def filter_municipalities(self, queryset, name, value):
         if not value:
             return queryset
-        return queryset.filter(
-            Q(school__municipality__in=value) |
-            Q(institution__municipality__in=value) |
-            Q(publisher__municipality__in=value)
-        )
+        return queryset.filter(municipality__in=value)
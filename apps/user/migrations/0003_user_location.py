@@ -0,0 +1,47 @@
+# Generated by Django 3.2.16 on 2026-10-19 15:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BACKFILL_SQL = '''
+UPDATE user_user AS "user" SET
+    province_id = COALESCE(school.province_id, institution.province_id, publisher.province_id),
+    district_id = COALESCE(school.district_id, institution.district_id, publisher.district_id),
+    municipality_id = COALESCE(school.municipality_id, institution.municipality_id, publisher.municipality_id)
+FROM user_user AS profile_user
+    LEFT OUTER JOIN school_school AS school ON school.id = profile_user.school_id
+    LEFT OUTER JOIN institution_institution AS institution ON institution.id = profile_user.institution_id
+    LEFT OUTER JOIN publisher_publisher AS publisher ON publisher.id = profile_user.publisher_id
+WHERE profile_user.id = "user".id
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0004_auto_20220302_1008'),
+        ('institution', '0002_auto_20220331_1509'),
+        ('publisher', '0002_publisher_internal_code'),
+        ('school', '0002_auto_20220627_2055'),
+        ('user', '0002_auto_20220311_1106'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='district',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='common.district', verbose_name='District'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='municipality',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='common.municipality', verbose_name='Municipality'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='province',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='common.province', verbose_name='Province'),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -111,6 +111,19 @@ class User(AbstractUser):
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='is_deactivated_by_user',
         null=True, blank=True, verbose_name=_('Deactivated by')
     )
+    # Canonical location, denormalized from the profile (school/institution/publisher). See sync_location
+    province = models.ForeignKey(
+        'common.Province', verbose_name=_('Province'), related_name='+',
+        on_delete=models.SET_NULL, null=True, blank=True
+    )
+    district = models.ForeignKey(
+        'common.District', verbose_name=_('District'), related_name='+',
+        on_delete=models.SET_NULL, null=True, blank=True
+    )
+    municipality = models.ForeignKey(
+        'common.Municipality', verbose_name=_('Municipality'), related_name='+',
+        on_delete=models.SET_NULL, null=True, blank=True
+    )
 
     class Meta:
         verbose_name = _("User")
@@ -119,6 +132,28 @@ class User(AbstractUser):
     # Use the model manager with no username
     objects = UserManager()
 
+    LOCATION_FIELDS = ('province', 'district', 'municipality')
+
+    @classmethod
+    def sync_location(cls, user_qs):
+        """
+        Copy location of the profile (school/institution/publisher) to the users (Used by the profile save)
+        """
+        return user_qs.update(**{
+            field: Coalesce(
+                *(
+                    models.Subquery(
+                        cls._meta.get_field(profile_field).related_model.objects.filter(
+                            pk=models.OuterRef(profile_field),
+                        ).values(field)[:1]
+                    )
+                    for profile_field in ['school', 'institution', 'publisher']
+                ),
+                output_field=models.IntegerField(),
+            )
+            for field in cls.LOCATION_FIELDS
+        })
+
     def __str__(self):
 
         # Get name
@@ -161,148 +196,45 @@ class User(AbstractUser):
     def _login_attempt_cache_key(email: str) -> str:
         return f'{email}_lga'
 
+    def set_location(self):
+        """
+        Copy location of the profile (Same as sync_location, for a single user instance)
+        """
+        profile = next(
+            (
+                getattr(self, profile_field)
+                for profile_field in ['school', 'institution', 'publisher']
+                if getattr(self, f'{profile_field}_id') is not None
+            ),
+            None,
+        )
+        for field in self.LOCATION_FIELDS:
+            setattr(self, f'{field}_id', getattr(profile, f'{field}_id', None))
+
     def save(self, *args, **kwargs):
         self.full_name = self.get_full_name()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(update_fields) & {'school', 'institution', 'publisher'}:
+            self.set_location()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *self.LOCATION_FIELDS}
         super().save(*args, **kwargs)
 
-    @classmethod
-    def annotate_user_payment_statement(cls):
-        from apps.payment.models import Payment
-        return {
-            'payment_credit_sum': Coalesce(models.Subquery(
-                User.objects.filter(
-                    payment_paid_by=models.OuterRef('pk'),
-                    payment_paid_by__transaction_type=Payment.TransactionType.CREDIT.value,
-                    payment_paid_by__status=Payment.Status.VERIFIED.value
-                ).order_by().values('id').annotate(
-                    payment_credit_sum=models.Sum('payment_paid_by__amount')
-                ).values('payment_credit_sum')
-            ), 0, output_field=models.FloatField()),
-
-            'payment_debit_sum': Coalesce(models.Subquery(
-                User.objects.filter(
-                    payment_paid_by=models.OuterRef('pk'),
-                    payment_paid_by__transaction_type=Payment.TransactionType.DEBIT.value,
-                    payment_paid_by__status=Payment.Status.VERIFIED.value
-                ).order_by().values('id').annotate(
-                    payment_debit_sum=models.Sum('payment_paid_by__amount')
-                ).values('payment_debit_sum')
-            ), 0, output_field=models.FloatField()),
-
-            'total_verified_payment': Coalesce(models.Subquery(
-                User.objects.filter(
-                    payment_paid_by=models.OuterRef('pk'),
-                    payment_paid_by__transaction_type=Payment.TransactionType.CREDIT.value,
-                    payment_paid_by__status=Payment.Status.VERIFIED.value
-                ).order_by().values('id').annotate(
-                    payment_credit_sum=models.Sum('payment_paid_by__amount')
-                ).values('payment_credit_sum')
-            ), 0, output_field=models.FloatField()),
-
-            'total_unverified_payment': Coalesce(models.Subquery(
-                User.objects.filter(
-                    payment_paid_by=models.OuterRef('pk'),
-                    payment_paid_by__transaction_type=Payment.TransactionType.CREDIT.value,
-                    payment_paid_by__status=Payment.Status.PENDING.value
-                ).order_by().values('id')[:1].annotate(
-                    total_unverified_payment=models.Sum('payment_paid_by__amount')
-                ).values('total_unverified_payment')
-            ), 0, output_field=models.FloatField()),
-
-            'total_unverified_payment_count': Coalesce(models.Subquery(
-                User.objects.filter(
-                    payment_paid_by=models.OuterRef('pk'),
-                    payment_paid_by__transaction_type=Payment.TransactionType.CREDIT.value,
-                    payment_paid_by__status=Payment.Status.PENDING.value
-                ).order_by().values('id').annotate(
-                    total_count=models.Count('payment_paid_by')).values('total_count')
-            ), 0, output_field=models.FloatField()),
-
-            'total_verified_payment_count': Coalesce(models.Subquery(
-                User.objects.filter(
-                    payment_paid_by=models.OuterRef('pk'),
-                    payment_paid_by__transaction_type=Payment.TransactionType.CREDIT.value,
-                    payment_paid_by__status=Payment.Status.VERIFIED.value
-                ).order_by().values('id').annotate(
-                    total_count=models.Count('payment_paid_by')).values('total_count')
-            ), 0, output_field=models.FloatField()),
-        }
-
     @classmethod
     def annotate_mismatch_order_statements(cls):
-        # NOTE: Try to move this login in dataloaders
-        from apps.payment.models import Payment
-        from apps.order.models import Order
+        """
+        Payment/order balance from the maintained ledger (payment.UserLedger), 0 for users without any
+        """
         return {
-            'payment_credit_sum': Coalesce(models.Subquery(
-                Payment.objects.filter(
-                    paid_by=models.OuterRef('pk'),
-                    transaction_type=Payment.TransactionType.CREDIT.value,
-                    status=Payment.Status.VERIFIED.value
-                ).order_by().values('paid_by').annotate(
-                    payment_credit_sum=models.Sum('amount')
-                ).values('payment_credit_sum')
-            ), 0, output_field=models.FloatField()),
-
-            'payment_debit_sum': Coalesce(models.Subquery(
-                Payment.objects.filter(
-                    paid_by=models.OuterRef('pk'),
-                    transaction_type=Payment.TransactionType.DEBIT.value,
-                    status=Payment.Status.VERIFIED.value
-                ).order_by().values('paid_by').annotate(
-                    payment_debit_sum=models.Sum('amount')
-                ).values('payment_debit_sum')
-            ), 0, output_field=models.FloatField()),
-
-            'total_verified_payment': Coalesce(models.Subquery(
-                Payment.objects.filter(
-                    paid_by=models.OuterRef('pk'),
-                    transaction_type=Payment.TransactionType.CREDIT.value,
-                    status=Payment.Status.VERIFIED.value
-                ).order_by().values('paid_by').annotate(
-                    payment_credit_sum=models.Sum('amount')
-                ).values('payment_credit_sum')
-            ), 0, output_field=models.FloatField()),
-
-            'total_unverified_payment': Coalesce(models.Subquery(
-                Payment.objects.filter(
-                    paid_by=models.OuterRef('pk'),
-                    transaction_type=Payment.TransactionType.CREDIT.value,
-                    status=Payment.Status.PENDING.value
-                ).order_by().values('paid_by')[:1].annotate(
-                    payment_credit_sum=models.Sum('amount')
-                ).values('payment_credit_sum')
-            ), 0, output_field=models.FloatField()),
-
-            'total_unverified_payment_count': Coalesce(models.Subquery(
-                Payment.objects.filter(
-                    paid_by=models.OuterRef('pk'),
-                    transaction_type=Payment.TransactionType.CREDIT.value,
-                    status=Payment.Status.PENDING.value
-                ).order_by().values('paid_by').annotate(total_count=models.Count('paid_by')).values('total_count')
-            ), 0, output_field=models.FloatField()),
-
-            'total_verified_payment_count': Coalesce(models.Subquery(
-                Payment.objects.filter(
-                    paid_by=models.OuterRef('pk'),
-                    transaction_type=Payment.TransactionType.CREDIT.value,
-                    status=Payment.Status.VERIFIED.value
-                ).order_by().values('paid_by').annotate(total_count=models.Count('paid_by')).values('total_count')
-            ), 0, output_field=models.FloatField()),
-
-            'total_order_pending_price': Coalesce(models.Subquery(
-                Order.objects.filter(
-                    created_by=models.OuterRef('pk'),
-                    status__in=[Order.Status.PENDING.value, Order.Status.COMPLETED.value]
-                ).order_by().values('created_by').annotate(
-                    grand_total_price=models.ExpressionWrapper(
-                        models.Sum(models.F('book_order__price') * models.F('book_order__quantity')),
-                        output_field=models.FloatField()
-                    )
-                ).values('grand_total_price')
-            ), 0, output_field=models.FloatField()),
-
-            'outstanding_balance': (
-                models.F('payment_credit_sum') - models.F('payment_debit_sum') - models.F('total_order_pending_price')
-            )
+            field: Coalesce(models.F(f'ledger__{ledger_field}'), 0, output_field=models.FloatField())
+            for field, ledger_field in [
+                ('payment_credit_sum', 'payment_credit_sum'),
+                ('payment_debit_sum', 'payment_debit_sum'),
+                ('total_verified_payment', 'payment_credit_sum'),
+                ('total_unverified_payment', 'total_unverified_payment'),
+                ('total_unverified_payment_count', 'total_unverified_payment_count'),
+                ('total_verified_payment_count', 'total_verified_payment_count'),
+                ('total_order_pending_price', 'total_order_pending_price'),
+                ('outstanding_balance', 'outstanding_balance'),
+            ]
         }
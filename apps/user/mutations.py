@@ -15,6 +15,8 @@ from config.exceptions import PermissionDeniedException
 
 from apps.payment.mutations import Mutation as PaymentMutation
 from apps.package.mutations import Mutation as PackageMutation
+from apps.order.mutations import ModeratorMutation as OrderModeratorMutation
+from apps.common.mutations import ModeratorMutation as CommonModeratorMutation
 
 from .schema import ModeratorQueryUserType, UserMeType
 from .models import User
@@ -271,6 +273,8 @@ class UserDeactivateToggle(CreateUpdateGrapheneMutation):
 
 class ModeratorMutationType(
     # --- Start scopped entities
+    OrderModeratorMutation,
+    CommonModeratorMutation,
     PaymentMutation,
     # --- End scopped entities
     graphene.Mutation,
@@ -10,6 +10,7 @@ from utils.graphene.enums import EnumDescription
 from apps.payment.schema import Query as PaymentQuery
 from apps.order.schema import OrderActivityLogQuery
 from apps.common.schema import ReportQuery
+from apps.package.schema import PackagePlanQuery
 
 from .models import User
 from .filters import UserFilter
@@ -144,6 +145,7 @@ class ModeratorQueryType(
     ModeratorUserQueryType,
     PaymentQuery,
     ReportQuery,
+    PackagePlanQuery,
     # ---End --Moderator scopped entities
     OrderActivityLogQuery,
     graphene.ObjectType
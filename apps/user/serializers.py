@@ -356,6 +356,7 @@ class UpdateProfileSerializer(serializers.ModelSerializer):
         instance = self.context['request'].user
         # NOTE: Individual user don't have profile
         if instance.user_type != User.UserType.INDIVIDUAL_USER.value:
+            # NOTE: Location of the user is copied from the profile on save
             self._save_profile_data(instance, self.validated_data)
         return super().update(instance, self.validated_data)
 
@@ -196,6 +196,12 @@ class TestUser(GraphQLTestCase):
         self.assertEqual(str(content['school']['wardNumber']), minput['school']['wardNumber'])
         self.assertEqual(content['publisher'], None)
         self.assertEqual(content['institution'], None)
+        # Test location is synced from the profile
+        user.refresh_from_db()
+        self.assertEqual(
+            (user.province_id, user.district_id, user.municipality_id),
+            (self.municipality.province_id, self.municipality.district_id, self.municipality.id),
+        )
         # Test can update multiple times
         self.query_check(self.update_profile, minput=minput, okay=True)
 
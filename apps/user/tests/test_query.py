@@ -24,6 +24,18 @@ class UserQueryTest(GraphQLTestCase):
         }
     '''
 
+    USERS_BY_LOCATION_QUERY = '''
+        query MyQuery($districts: [ID!], $municipalities: [ID!]) {
+          moderatorQuery {
+            users(ordering: "id", districts: $districts, municipalities: $municipalities) {
+              results {
+                id
+              }
+            }
+          }
+        }
+    '''
+
     def test_user_canonical_name(self):
         user = UserFactory.create(first_name='', last_name='', user_type=User.UserType.MODERATOR)
         publisher_user = UserFactory.create(
@@ -62,3 +74,29 @@ class UserQueryTest(GraphQLTestCase):
                 (individual_user, individual_user.full_name),
             ]
         ])
+
+    def test_user_location_filter(self):
+        school = SchoolFactory.create()
+        institution = InstitutionFactory.create()
+        school_user = UserFactory.create(user_type=User.UserType.SCHOOL_ADMIN, school=school)
+        institution_user = UserFactory.create(user_type=User.UserType.INSTITUTIONAL_USER, institution=institution)
+        self.force_login(UserFactory.create(user_type=User.UserType.MODERATOR))
+
+        def _query_user_ids(**filters):
+            content = self.query_check(self.USERS_BY_LOCATION_QUERY, variables=filters)
+            return [int(user['id']) for user in content['data']['moderatorQuery']['users']['results']]
+
+        self.assertEqual(_query_user_ids(districts=[school.district_id]), [school_user.pk])
+        self.assertEqual(_query_user_ids(municipalities=[institution.municipality_id]), [institution_user.pk])
+        self.assertEqual(
+            _query_user_ids(districts=[school.district_id, institution.district_id]),
+            [school_user.pk, institution_user.pk],
+        )
+
+        # Location follows the profile changes
+        institution.district = school.district
+        institution.save()
+        self.assertEqual(_query_user_ids(districts=[school.district_id]), [school_user.pk, institution_user.pk])
+        school_user.school = None
+        school_user.save()
+        self.assertEqual(_query_user_ids(districts=[school.district_id]), [institution_user.pk])
@@ -1,6 +1,6 @@
 from utils.graphene.tests import GraphQLTestCase
 from apps.user.models import User
-from apps.payment.models import Payment
+from apps.payment.models import Payment, UserLedger
 from apps.user.factories import UserFactory
 from apps.order.models import Order
 from apps.book.models import Book
@@ -115,6 +115,10 @@ class UserPaymentTest(GraphQLTestCase):
             transaction_type=Payment.TransactionType.CREDIT,
             status=Payment.Status.PENDING, payment_type=Payment.PaymentType.CASH
         )
+        # NOTE: Ledger is maintained by the mutations, factories don't use them (Drift is fixed by the reconcile job)
+        self.assertEqual(UserLedger.reconcile(), 1)
+        # Only out of sync ledgers are refreshed
+        self.assertEqual(UserLedger.reconcile(), 0)
         self.force_login(self.moderator)
         content = self.query_check(self.PAYMENT_QUERY)['data']
         self.assertEqual(content['moderatorQuery']['users']['results'][0]['id'], str(self.school_1.id))
@@ -147,3 +151,51 @@ class UserPaymentTest(GraphQLTestCase):
         self.assertEqual(content['totalUnverifiedPaymentCount'], 4)
         self.assertEqual(content['totalVerifiedPayment'], 40000)
         self.assertEqual(content['totalVerifiedPaymentCount'], 2)
+
+    def test_payment_summary_cache(self):
+        def _create_payment(paid_by, amount):
+            PaymentFactory.create(
+                created_by=self.moderator, modified_by=self.moderator,
+                paid_by=paid_by, amount=amount,
+                transaction_type=Payment.TransactionType.CREDIT,
+                status=Payment.Status.VERIFIED, payment_type=Payment.PaymentType.CASH
+            )
+
+        def _query_payment_summary(query, user):
+            self.force_login(user)
+            return self.query_check(query)['data']
+
+        moderator_payment_summary = '''
+            query MyQuery {
+              moderatorQuery {
+                paymentSummary {
+                  paymentCreditSum
+                  totalVerifiedPaymentCount
+                }
+              }
+            }
+        '''
+        school_2 = UserFactory.create(user_type=User.UserType.SCHOOL_ADMIN)
+        _create_payment(self.school_1, 1000)
+        _create_payment(school_2, 2000)
+
+        # Each payment is counted once
+        content = _query_payment_summary(moderator_payment_summary, self.moderator)
+        self.assertEqual(
+            content['moderatorQuery']['paymentSummary'],
+            dict(paymentCreditSum=3000, totalVerifiedPaymentCount=2),
+        )
+        content = _query_payment_summary(self.PAYMENT_SUMMARY, self.school_1)
+        self.assertEqual(content['schoolQuery']['paymentSummary']['paymentCreditSum'], 1000)
+
+        # Cached per viewer
+        _create_payment(self.school_1, 500)
+        content = _query_payment_summary(self.PAYMENT_SUMMARY, self.school_1)
+        self.assertEqual(content['schoolQuery']['paymentSummary']['paymentCreditSum'], 1000)
+
+        # Invalidated when balances change
+        UserLedger.refresh([self.school_1.pk])
+        content = _query_payment_summary(self.PAYMENT_SUMMARY, self.school_1)
+        self.assertEqual(content['schoolQuery']['paymentSummary']['paymentCreditSum'], 1500)
+        content = _query_payment_summary(moderator_payment_summary, self.moderator)
+        self.assertEqual(content['moderatorQuery']['paymentSummary']['paymentCreditSum'], 3500)
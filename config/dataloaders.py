@@ -6,6 +6,7 @@ from apps.user.dataloaders import DataLoaders as UserDataloader
 from apps.order.dataloaders import DataLoaders as OrderDataloader
 from apps.book.dataloaders import DataLoaders as BookDataloader
 from apps.notification.dataloaders import DataLoaders as NotificationDataloader
+from apps.package.dataloaders import DataLoaders as PackageDataloader
 
 
 class GlobalDataLoaders(WithContextMixin):
@@ -24,3 +25,7 @@ class GlobalDataLoaders(WithContextMixin):
     @cached_property
     def notification(self):
         return NotificationDataloader(context=self.context)
+
+    @cached_property
+    def package(self):
+        return PackageDataloader(context=self.context)
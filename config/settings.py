@@ -29,6 +29,7 @@ env = environ.Env(
     DB_HOST=(str, 'db'),
     DB_PORT=(int, 5432),
     REDIS_URL=(str, 'redis://redis:6379/0'),
+    DJANGO_CACHE_REDIS_URL=(str, 'redis://redis:6379/2'),
     CORS_ORIGIN_REGEX_WHITELIST=(str, 'r\"^https://\w+\.togglecorp\.com$\"'), # noqa W605
     TIME_ZONE=(str, 'Asia/Kathmandu'),
     CLIENT_URL=(str, 'http://localhost:3080'),
@@ -224,12 +225,50 @@ else:
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache settings (Test cases use locmem cache, see utils.graphene.tests.TEST_CACHES)
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': env('DJANGO_CACHE_REDIS_URL'),
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+        },
+    }
+}
+
 # Celery settings
 BROKER_URL = env("REDIS_URL")
 BROKER_TRANSPORT_OPTIONS = {"visibility_timeout": 3600}
 CELERY_TIMEZONE = env('TIME_ZONE')
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
+CELERYBEAT_SCHEDULE = {
+    'order-daily-stat-sync': {
+        'task': 'order_daily_stat_sync',
+        'schedule': 5 * 60,  # Seconds
+    },
+    'report-snapshot-refresh': {
+        'task': 'report_snapshot_refresh',
+        'schedule': 15 * 60,  # Seconds
+    },
+    # Catch up school snapshots with changes which don't schedule a refresh (eg: Book/category updates)
+    'school-report-snapshot-refresh': {
+        'task': 'school_report_snapshot_refresh',
+        'schedule': 60 * 60,  # Seconds
+    },
+    'data-export': {
+        'task': 'data_export',
+        'schedule': 24 * 60 * 60,  # Seconds
+    },
+    'user-ledger-reconcile': {
+        'task': 'user_ledger_reconcile',
+        'schedule': 60 * 60,  # Seconds
+    },
+    'book-order-fact-reconcile': {
+        'task': 'book_order_fact_reconcile',
+        'schedule': 60 * 60,  # Seconds
+    },
+}
 
 
 # CORS CONFIGS
@@ -60,6 +60,7 @@ urlpatterns += [
     # tinymce urls
     path('tinymce/', include('tinymce.urls')),
     path('user/', include('apps.user.urls')),
+    path('order/', include('apps.order.urls')),
 ]
 
 # Static and media file urls
@@ -3,5 +3,5 @@ python manage.py collectstatic --noinput &
 python manage.py migrate --noinput &
 # start server
 gunicorn config.wsgi:application --timeout=40 --bind 0.0.0.0:8020 &
-# celery
-celery -A config worker --loglevel=INFO
+# celery (with embedded beat). NOTE: Run a single instance of this script, each beat schedules the periodic tasks again
+celery -A config worker -B --loglevel=INFO
@@ -1,3 +1,8 @@
+from collections import defaultdict
+
+from django.db import connections, models
+from django.db.models.functions import RowNumber
+from promise import Promise
 from promise.dataloader import DataLoader
 
 
@@ -10,3 +15,87 @@ class WithContextMixin():
 class DataLoaderWithContext(WithContextMixin, DataLoader):
     # def batch_load_fn  TODO: Add logging for errors traceback (for graphene v3)
     pass
+
+
+class OneToManyLoader(DataLoaderWithContext):
+    """
+    Load rows of the queryset grouped by the parent (`related_field` lookup) using a single query
+    """
+    def __init__(self, *args, queryset=None, related_field=None, **kwargs):
+        self.queryset = queryset
+        self.related_field = related_field
+        super().__init__(*args, **kwargs)
+
+    def batch_load_fn(self, keys):
+        qs = self.queryset.filter(
+            **{f'{self.related_field}__in': keys}
+        ).annotate(
+            dataloader_key=models.F(self.related_field),
+        )
+        _map = defaultdict(list)
+        for item in qs:
+            _map[item.dataloader_key].append(item)
+        return Promise.resolve([_map[key] for key in keys])
+
+
+class PaginatedOneToManyLoader(OneToManyLoader):
+    """
+    Same as OneToManyLoader but only loads a page (`offset`/`limit`) of rows per parent using window functions.
+    Each key resolves to (count, rows)
+    """
+    def __init__(self, *args, offset=0, limit=None, **kwargs):
+        self.offset = offset
+        self.limit = limit
+        super().__init__(*args, **kwargs)
+
+    def get_window_ordering(self):
+        ordering = [*(self.queryset.query.order_by or self.queryset.model._meta.ordering), 'pk']
+        return [
+            models.F(field[1:]).desc() if field.startswith('-') else models.F(field).asc()
+            for field in ordering
+        ]
+
+    def batch_load_fn(self, keys):
+        partition_by = [models.F(self.related_field)]
+        page_qs = self.queryset.filter(
+            **{f'{self.related_field}__in': keys}
+        ).annotate(
+            dataloader_key=models.F(self.related_field),
+            dataloader_row_number=models.Window(
+                expression=RowNumber(),
+                partition_by=partition_by,
+                order_by=self.get_window_ordering(),
+            ),
+            dataloader_count=models.Window(
+                expression=models.Count('pk'),
+                partition_by=partition_by,
+            ),
+        ).order_by().values_list('pk', 'dataloader_key', 'dataloader_row_number', 'dataloader_count')
+        # Window annotations can't be filtered directly, so the page is selected from a subquery.
+        # First row of each parent is always selected to get the count for out of range pages.
+        sql, params = page_qs.query.sql_with_params()
+        with connections[page_qs.db].cursor() as cursor:
+            cursor.execute(
+                f'SELECT * FROM ({sql}) AS dataloader_rows'
+                ' WHERE dataloader_row_number = 1 OR'
+                ' (dataloader_row_number > %s AND dataloader_row_number <= %s)',
+                (*params, self.offset, self.offset + self.limit),
+            )
+            rows = cursor.fetchall()
+
+        count_map = {}
+        page_map = defaultdict(list)
+        for pk, key, row_number, count in rows:
+            count_map[key] = count
+            if self.offset < row_number <= self.offset + self.limit:
+                page_map[key].append((row_number, pk))
+        items = self.queryset.order_by().in_bulk([
+            pk for page in page_map.values() for _, pk in page
+        ])
+        return Promise.resolve([
+            (
+                count_map.get(key, 0),
+                [items[pk] for _, pk in sorted(page_map[key]) if pk in items],
+            )
+            for key in keys
+        ])
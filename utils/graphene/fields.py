@@ -18,6 +18,7 @@ from django.core.files.storage import get_storage_class
 from rest_framework import serializers
 
 
+from utils.graphene.dataloaders import PaginatedOneToManyLoader
 from utils.graphene.pagination import OrderingOnlyArgumentPagination, NoOrderingPageGraphqlPagination
 
 StorageClass = get_storage_class()
@@ -241,6 +242,68 @@ class DjangoPaginatedListObjectField(DjangoFilterPaginateListField):
         )
 
 
+class DataLoaderPaginatedListObjectField(DjangoPaginatedListObjectField):
+    """
+    DjangoPaginatedListObjectField for the child list of each item in a list (reverse fk, eg: logs).
+    Requested page and count for all the parent items are fetched using a single query
+    (per filter/ordering/pagination arguments).
+    `related_field`: Lookup from the child model to the parent (eg: school_package__courier_package)
+    """
+    def __init__(self, _type, *args, related_field=None, **kwargs):
+        assert related_field is not None, 'related_field is required for DataLoaderPaginatedListObjectField'
+        self.related_field = related_field
+        super().__init__(_type, *args, **kwargs)
+
+    def get_loader(self, manager, filterset_class, filter_kwargs, ordering, offset, limit, info):
+        loader_key = (
+            manager.model._meta.label, self.related_field, repr(sorted(filter_kwargs.items())), tuple(ordering),
+            offset, limit,
+        )
+        if loader_key not in info.context.one_to_many_dataloaders:
+            qs = filterset_class(data=filter_kwargs, queryset=manager.all(), request=info.context).qs
+            if ordering:
+                qs = qs.order_by(*ordering)
+            info.context.one_to_many_dataloaders[loader_key] = PaginatedOneToManyLoader(
+                context=info.context,
+                queryset=qs,
+                related_field=self.related_field,
+                offset=offset,
+                limit=limit,
+            )
+        return info.context.one_to_many_dataloaders[loader_key]
+
+    def list_resolver(
+            self, manager, filterset_class, filtering_args, root, info, **kwargs
+    ):
+        filter_kwargs = {k: v for k, v in kwargs.items() if k in filtering_args}
+        ordering = kwargs.get(self.pagination.ordering_param) or self.pagination.ordering
+        if not ordering or isinstance(self.pagination, NoOrderingPageGraphqlPagination):
+            ordering = []
+        else:
+            ordering = [to_snake_case(each) for each in ordering.strip(',').replace(' ', '').split(',')]
+        page = kwargs.get('page') or 1
+        page_size = min(
+            kwargs.get('pageSize') or graphql_api_settings.DEFAULT_PAGE_SIZE,
+            graphql_api_settings.MAX_PAGE_SIZE,
+        )
+
+        offset = (page - 1) * page_size
+
+        def _paginate(count_and_results):
+            count, results = count_and_results
+            return CustomDjangoListObjectBase(
+                count=count,
+                results=results,
+                results_field_name=self.type._meta.results_field_name,
+                page=page,
+                pageSize=page_size,
+            )
+
+        return self.get_loader(
+            manager, filterset_class, filter_kwargs, ordering, offset, page_size, info,
+        ).load(root.pk).then(_paginate)
+
+
 def get_filtering_args_from_non_model_filterset(filterset_class):
     from graphene_django.forms.converter import convert_form_field
 
@@ -12,6 +12,7 @@ from django.test import override_settings
 from django.core.cache import cache
 
 from config.celery import app as celery_app
+from apps.order.models import OrderWindow
 from graphene_django.utils import GraphQLTestCase as BaseGraphQLTestCase
 from rest_framework import status
 
@@ -71,6 +72,9 @@ class GraphQLTestCase(CommonSetupClassMixin, BaseGraphQLTestCase):
             self.now_datetime_str = self.now_datetime.isoformat()
             self.now_patcher.start().return_value = self.now_datetime
 
+        # Make sure cached values from previous test cases are not used
+        cache.clear()
+        OrderWindow.clear_active_window_cache()
         # Disable captcha in test cases
         cache.set('enable_captcha', False)
 